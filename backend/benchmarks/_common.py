@@ -0,0 +1,245 @@
+"""
+效能測試共用工具
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+# 添加 src 目錄到 Python 路徑
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+if TYPE_CHECKING:
+    from models import ProcessedMapData
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """計算百分位數（最近排名法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """彙整延遲樣本（輸入為秒，輸出為毫秒）"""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+    }
+
+
+def create_temp_db(user_count: int, score_count: int, seed: int = 42) -> str:
+    """建立含合成用戶與分數的暫存資料庫檔案，回傳檔案路徑"""
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    users = [
+        {
+            "id": user_id,
+            "google_id": f"bench-{user_id}",
+            "email": f"bench{user_id}@example.com",
+            "name": f"玩家{user_id}",
+            "picture": None,
+            "created_at": str(now),
+            "last_login": None,
+            "is_active": True,
+        }
+        for user_id in range(1, user_count + 1)
+    ]
+    db_dir = tempfile.mkdtemp(prefix="pacmap-bench-")
+    db_file = os.path.join(db_dir, "bench_db.json")
+    # 逐筆寫出分數，避免一次在記憶體中建立大量 dict
+    with open(db_file, "w", encoding="utf-8") as f:
+        f.write('{"users": ' + json.dumps(users, ensure_ascii=False) + ', "scores": [')
+        for score_id in range(1, score_count + 1):
+            score = {
+                "id": score_id,
+                "user_id": rng.randint(1, user_count),
+                "score": rng.randint(0, 20000),
+                "level": rng.randint(1, 5),
+                "map_index": rng.randint(0, 2),
+                "survival_time": rng.randint(0, 600),
+                "dots_collected": rng.randint(0, 500),
+                "ghosts_eaten": rng.randint(0, 20),
+                "created_at": str(now - timedelta(seconds=rng.randint(0, 30 * 86400))),
+            }
+            f.write(("," if score_id > 1 else "") + json.dumps(score))
+        f.write(f'], "next_user_id": {user_count + 1}, "next_score_id": {score_count + 1}}}')
+    return db_file
+
+
+def generate_event_stream(count: int, map_index: int = 0, interval: float = 0.25, start: float = 1000.0) -> List[dict]:
+    """產生合理的遊戲事件序列（開始事件後以吃豆子為主，穿插能量豆與吃鬼）"""
+    events: List[dict] = []
+    score = 0
+    timestamp = start
+
+    def make_event(event_type: str, points: int) -> dict:
+        nonlocal score
+        event = {
+            "event_type": event_type,
+            "timestamp": timestamp,
+            "game_time_remaining": max(0, 600 - int(timestamp - start)),
+            "player_position": [25.03 + len(events) * 1e-5, 121.56],
+            "score_before": score,
+            "score_after": score + points,
+            "lives_before": 3,
+            "lives_after": 3,
+            "health_before": 100,
+            "health_after": 100,
+            "level": 1,
+            "map_index": map_index,
+        }
+        score += points
+        return event
+
+    events.append(make_event("game_start", 0))
+    while len(events) < count:
+        timestamp += interval
+        position = len(events)
+        if position % 60 == 0:
+            events.append(make_event("power_pellet_collected", 50))
+        elif position % 60 == 5:
+            events.append(make_event("ghost_eaten", 150))
+        else:
+            events.append(make_event("dot_collected", 10))
+    return events
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+    return port
+
+
+def start_server(
+    port: int, env: Dict[str, str], workers: int = 1, backlog: Optional[int] = None, cwd: Optional[str] = None
+) -> subprocess.Popen:
+    """以子行程啟動 uvicorn 伺服器（會話開始時的日誌輸出量很大，直接丟棄）
+
+    cwd 為伺服器的工作目錄（地圖磁碟快取位於其下的 cache/maps）
+    """
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "main:app",
+        "--app-dir",
+        SRC_DIR,
+        "--port",
+        str(port),
+        "--log-level",
+        "warning",
+        "--workers",
+        str(workers),
+    ]
+    if backlog is not None:
+        command += ["--backlog", str(backlog)]
+    return subprocess.Popen(command, env={**os.environ, **env}, stdout=subprocess.DEVNULL, cwd=cwd)
+
+
+async def wait_for_server(http, base_url: str, timeout: float = 30):
+    """等待伺服器的 /health 回應（http 為 aiohttp.ClientSession）"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(f"{base_url}/health") as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("伺服器未在時限內啟動")
+
+
+def generate_osm_grid(rows: int, cols: int, spacing_m: float = 40.0, origin: tuple = (25.03, 121.55)) -> dict:
+    """產生 Overpass API 格式的棋盤狀路網（rows × cols 個路口，相鄰路口以道路相連）"""
+    lat_step = spacing_m / 111000
+    lng_step = spacing_m / (111000 * math.cos(math.radians(origin[0])))
+    elements: List[dict] = []
+
+    def node_id(row: int, col: int) -> int:
+        return row * cols + col + 1
+
+    for row in range(rows):
+        for col in range(cols):
+            elements.append(
+                {
+                    "type": "node",
+                    "id": node_id(row, col),
+                    "lat": origin[0] + row * lat_step,
+                    "lon": origin[1] + col * lng_step,
+                }
+            )
+    way_id = rows * cols + 1
+    for row in range(rows):
+        elements.append({"type": "way", "id": way_id, "nodes": [node_id(row, col) for col in range(cols)]})
+        way_id += 1
+    for col in range(cols):
+        elements.append({"type": "way", "id": way_id, "nodes": [node_id(row, col) for row in range(rows)]})
+        way_id += 1
+    return {"elements": elements}
+
+
+def build_map_data(map_service, map_index: int, osm_data: dict):
+    """以 MapService 的路網處理流程建立地圖數據並放入其記憶體快取（不連網）"""
+    from models import ProcessedMapData
+
+    config = map_service.map_configs[map_index]
+    road_network, valid_positions, adjacency_list = map_service._generate_road_network(osm_data)
+    data = ProcessedMapData(
+        map_index=map_index,
+        map_name=config.name,
+        center=config.center,
+        zoom=config.zoom,
+        bounds=config.bounds,
+        road_network=road_network,
+        valid_positions=valid_positions,
+        adjacency_list=adjacency_list,
+        pois=[],
+        ghost_spawn_points=[],
+        scatter_points=[],
+        processed_at=datetime.now(),
+    )
+    map_service.cache[map_index] = data
+    return data
+
+
+def grid_walk(valid_positions: List[List[float]], rows: int, cols: int) -> List[List[float]]:
+    """沿 generate_osm_grid 路網蛇行走過所有路口的座標序列（路口間距需小於路段細分長度）"""
+    walk: List[List[float]] = []
+    for row in range(rows):
+        columns = range(cols) if row % 2 == 0 else range(cols - 1, -1, -1)
+        walk.extend(valid_positions[row * cols + col] for col in columns)
+    return walk
+
+
+def seed_map_cache(
+    directory: str, map_service, map_indexes: List[int], osm_data: dict
+) -> Dict[int, "ProcessedMapData"]:
+    """以合成路網建立地圖數據並寫入 directory/cache/maps，以此為工作目錄的伺服器不需連網即可載入地圖"""
+    cache_dir = os.path.join(directory, "cache", "maps")
+    os.makedirs(cache_dir, exist_ok=True)
+    maps: Dict[int, ProcessedMapData] = {}
+    for map_index in map_indexes:
+        data = build_map_data(map_service, map_index, osm_data)
+        with open(os.path.join(cache_dir, f"map_{map_index}.json"), "w", encoding="utf-8") as f:
+            f.write(data.model_dump_json())
+        maps[map_index] = data
+    return maps
@@ -0,0 +1,110 @@
+"""
+已驗證 token 快取效能測試
+量測每個請求的認證成本（JWT 驗證 + 用戶查詢）在開啟與關閉快取時的差異：
+直接呼叫 get_current_user 相依函式，以及透過 ASGI 呼叫 GET /auth/me；
+並確認用戶記錄變更後快取會重新讀取、token 到期後不再被接受
+
+用法:
+    uv run benchmarks/auth_token_cache.py --users 10000 --requests 5000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import timedelta
+
+from _common import create_temp_db
+
+
+async def _per_call(get_current_user, credentials, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        await get_current_user(credentials)
+    return (time.perf_counter() - start) / count
+
+
+async def _per_request(client, headers: dict, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        response = await client.get("/auth/me", headers=headers)
+        response.raise_for_status()
+    return (time.perf_counter() - start) / count
+
+
+async def _check_invalidation(get_current_user, credentials, db):
+    """用戶記錄變更（更新最後登入時間）後應取得新的資料"""
+    before = await get_current_user(credentials)
+    db.update_user_last_login(before.id)
+    after = await get_current_user(credentials)
+    assert after.last_login is not None and after.last_login != before.last_login, (before, after)
+
+
+async def _check_expiry(get_current_user, user_id: int):
+    """token 到期後即使仍在快取中也不再被接受"""
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from auth import create_access_token
+
+    token = create_access_token(data={"sub": user_id}, expires_delta=timedelta(seconds=2))
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    await get_current_user(credentials)
+    # jose 以整數秒比較 exp，多等一秒
+    await asyncio.sleep(3.1)
+    try:
+        await get_current_user(credentials)
+    except HTTPException as e:
+        assert e.status_code == 401
+    else:
+        raise AssertionError("過期的 token 仍被接受")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="已驗證 token 快取效能測試")
+    parser.add_argument("--users", type=int, default=10000, help="資料庫用戶數（用戶查詢為線性搜尋）")
+    parser.add_argument("--requests", type=int, default=5000, help="每種情境的請求數")
+    args = parser.parse_args()
+
+    os.environ["DB_FILE_PATH"] = create_temp_db(args.users, 0)
+
+    import httpx
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from auth import create_access_token, get_current_user, token_cache
+    from database import db
+    from main import app
+
+    # 最後一位用戶：線性查詢的最壞情況
+    user_id = args.users
+    token = create_access_token(data={"sub": user_id})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    headers = {"Authorization": f"Bearer {token}"}
+    max_size = token_cache.max_size
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/auth/me", headers=headers)  # 載入資料庫
+        for name, size in (("無快取", 0), ("快取", max_size)):
+            token_cache.max_size = size
+            token_cache.clear()
+            results[name] = (
+                await _per_call(get_current_user, credentials, args.requests),
+                await _per_request(client, headers, args.requests),
+            )
+
+    await _check_invalidation(get_current_user, credentials, db)
+    await _check_expiry(get_current_user, user_id)
+
+    print(f"{args.users} 位用戶，每種情境 {args.requests} 次")
+    print(f"{'':<8}{'get_current_user µs':>22}{'GET /auth/me µs':>18}")
+    for name, (call, request) in results.items():
+        print(f"{name:<8}{call * 1e6:>22.1f}{request * 1e6:>18.1f}")
+    baseline, cached = results["無快取"], results["快取"]
+    print(f"{'加速':<8}{baseline[0] / cached[0]:>21.1f}x{baseline[1] / cached[1]:>17.1f}x")
+    print("用戶記錄變更後重新讀取、token 到期後拒絕: 通過")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
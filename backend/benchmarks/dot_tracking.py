@@ -0,0 +1,96 @@
+"""
+豆子收集位置驗證效能測試
+以不同大小的合成棋盤路網建立地圖，模擬玩家依序收集路網上的豆子，比較開啟位置比對前後的每事件驗證成本
+（應與地圖大小無關），並與逐一掃描所有位置的做法對照；同時確認重複收集與遠離豆子的事件會被拒絕
+
+用法:
+    uv run benchmarks/dot_tracking.py --grids 20,50,100 --events 2000
+"""
+
+import argparse
+import math
+import time
+
+from _common import build_map_data, generate_event_stream, generate_osm_grid, grid_walk
+
+from game_validation_service import GameValidationService
+from map_service import MapService
+from models import GameEvent, GameSessionStartRequest
+
+
+def _collect_events(walk: list, count: int) -> list[GameEvent]:
+    """沿路網依序收集地圖上的位置（每個事件都落在一個不同的有效位置上，移動速度合理）"""
+    events = generate_event_stream(count, interval=0.5)
+    for event, position in zip(events, walk[: len(events)], strict=True):
+        event["player_position"] = position
+    return [GameEvent(**event) for event in events]
+
+
+def _time_per_event(service: GameValidationService, events: list[GameEvent]) -> tuple[float, int]:
+    session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+    start = time.perf_counter()
+    results = service.validate_game_events(session_id, events)
+    elapsed = (time.perf_counter() - start) / len(events)
+    return elapsed, sum(1 for result in results if not result.is_valid)
+
+
+def _linear_scan_per_event(valid_positions: list, events: list[GameEvent]) -> float:
+    """對照組：每個事件都掃描所有位置找最近的豆子"""
+    start = time.perf_counter()
+    for event in events:
+        assert event.player_position is not None
+        lat, lng = event.player_position
+        min(
+            range(len(valid_positions)),
+            key=lambda i: math.hypot(valid_positions[i][0] - lat, valid_positions[i][1] - lng),
+        )
+    return (time.perf_counter() - start) / len(events)
+
+
+def _check_cheats(service: GameValidationService, events: list[GameEvent]):
+    """重複收集同一個豆子與在遠離路網處收集都應被拒絕"""
+    session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+    results = service.validate_game_events(session_id, events[:3])
+    assert all(result.is_valid for result in results), results
+
+    duplicate = events[3].model_copy(update={"player_position": events[2].player_position})
+    result = service.validate_game_event(session_id, duplicate)
+    assert not result.is_valid and "重複收集同一位置的豆子" in result.errors, result
+
+    assert events[3].player_position is not None
+    lat, lng = events[3].player_position
+    far_away = events[3].model_copy(update={"player_position": [lat - 0.01, lng - 0.01]})
+    result = service.validate_game_event(session_id, far_away)
+    assert not result.is_valid and any("沒有豆子" in error for error in result.errors), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="豆子收集位置驗證效能測試")
+    parser.add_argument("--grids", default="20,50,100", help="棋盤路網邊長（路口數），逗號分隔")
+    parser.add_argument("--events", type=int, default=2000, help="每個會話的事件數")
+    args = parser.parse_args()
+
+    print(f"{'路網':>10}{'位置數':>10}{'不檢查 µs':>12}{'格網索引 µs':>14}{'線性掃描 µs':>14}{'被拒':>6}")
+    for size in (int(value) for value in args.grids.split(",")):
+        map_service = MapService()
+        data = build_map_data(map_service, 0, generate_osm_grid(size, size, spacing_m=19))
+        events = _collect_events(grid_walk(data.valid_positions, size, size), min(args.events, size * size))
+
+        baseline, _ = _time_per_event(GameValidationService(), events)
+        service = GameValidationService(map_service=map_service)
+        # 索引在第一次查詢時建立，先建好再計時
+        map_service.get_position_index(0)
+        map_service.get_road_graph(0)
+        checked, rejected = _time_per_event(service, events)
+        linear = _linear_scan_per_event(data.valid_positions, events[: max(1, len(events) // 10)])
+        _check_cheats(service, events)
+
+        print(
+            f"{f'{size}x{size}':>10}{len(data.valid_positions):>10}"
+            f"{baseline * 1e6:>12.1f}{checked * 1e6:>14.1f}{linear * 1e6:>14.1f}{rejected:>6}"
+        )
+    print("重複收集與遠離豆子的事件: 皆被拒絕")
+
+
+if __name__ == "__main__":
+    main()
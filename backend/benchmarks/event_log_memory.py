@@ -0,0 +1,84 @@
+"""
+會話事件記錄記憶體比較
+比較以 GameEvent 列表與 EventLog 欄式儲存保存長會話事件時的記憶體用量（每 1,000 個事件），
+以及壓縮寫入磁碟後的大小，並確認還原後的事件與重播結果和原始事件一致
+
+用法:
+    uv run benchmarks/event_log_memory.py --events 20000
+"""
+
+import argparse
+import os
+import tempfile
+import tracemalloc
+
+from _common import generate_event_stream
+
+import event_log
+from event_log import EventLog, read_event_log, write_event_log
+from game_validation_service import GameValidationService
+from models import GameEvent, GameSessionStartRequest
+
+
+def _measure(build) -> tuple:
+    """回傳 (建立的物件, 配置的位元組數)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def _replay(events: list[GameEvent]) -> list[dict]:
+    service = GameValidationService()
+    session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+    return [response.model_dump() for response in service.validate_game_events(session_id, events)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="會話事件記錄記憶體比較")
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    raw_events = generate_event_stream(args.events)
+    # 每 50 個事件帶一筆 additional_data，模擬關卡完成等事件
+    for index in range(0, len(raw_events), 50):
+        raw_events[index]["additional_data"] = {"dots_remaining": 0, "dots_collected_this_level": index}
+
+    def build_models():
+        return [GameEvent(**event) for event in raw_events]
+
+    def build_log():
+        log = EventLog()
+        for event in models:
+            log.append(event)
+        return log
+
+    models, model_bytes = _measure(build_models)
+    log, log_bytes = _measure(build_log)
+    per_thousand = 1000 / len(models)
+
+    print(f"{'儲存方式':<22}{'每 1,000 事件 (KB)':>20}")
+    print(f"{'GameEvent 列表':<22}{model_bytes * per_thousand / 1024:>20.1f}")
+    print(f"{'EventLog 欄式':<22}{log_bytes * per_thousand / 1024:>20.1f}")
+    print(f"{'  其中固定寬度欄位':<22}{log.nbytes() * per_thousand / 1024:>20.1f}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        codecs = [("zlib", False)] + ([("zstd", True)] if event_log.HAS_ZSTD else [])
+        for name, use_zstd in codecs:
+            event_log.HAS_ZSTD = use_zstd
+            path = os.path.join(temp_dir, f"session.{name}.evlog")
+            write_event_log(path, log)
+            size = os.path.getsize(path)
+            print(f"{f'磁碟 ({name})':<22}{size * per_thousand / 1024:>20.1f}")
+
+            restored = read_event_log(path)
+            assert restored is not None and list(restored) == models, f"{name} 還原後事件不一致"
+
+    assert _replay(list(log)) == _replay(models), "重播結果不一致"
+    print("還原與重播結果: 一致")
+
+
+if __name__ == "__main__":
+    main()
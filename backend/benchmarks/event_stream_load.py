@@ -0,0 +1,126 @@
+"""
+事件串流負載測試
+啟動本機 uvicorn 伺服器，以上千個同時進行的模擬會話透過 WebSocket 串流事件，
+量測事件從送出到收到驗證結果的延遲與整體吞吐量
+
+用法:
+    uv run benchmarks/event_stream_load.py --sessions 2000 --events 100 --interval 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from _common import create_temp_db, free_port, generate_event_stream, start_server, summarize_latencies, wait_for_server
+
+
+async def _run_session(http, base_url: str, token: str, args, stats: dict):
+    """一個模擬會話：開始會話、連上串流、依固定間隔送出事件並等待所有結果"""
+    headers = {"Authorization": f"Bearer {token}"}
+    async with http.post(f"{base_url}/game/session/start", json={"map_index": 0}, headers=headers) as response:
+        response.raise_for_status()
+        session_id = (await response.json())["session_id"]
+
+    events = [json.dumps(event) for event in generate_event_stream(args.events)]
+    sent_at: list[float] = []
+
+    start = time.perf_counter()
+    ws_url = f"{base_url.replace('http', 'ws', 1)}/game/session/{session_id}/stream?token={token}"
+    async with http.ws_connect(ws_url, max_msg_size=0) as ws:
+        stats["connect"].append(time.perf_counter() - start)
+
+        async def send_all():
+            for event in events:
+                sent_at.append(time.perf_counter())
+                await ws.send_str(event)
+                await asyncio.sleep(args.interval)
+
+        sender = asyncio.create_task(send_all())
+        received = 0
+        while received < len(events):
+            frame = await ws.receive_json()
+            if frame["type"] != "results":
+                stats["errors"] += 1
+                continue
+            now = time.perf_counter()
+            for offset, result in enumerate(frame["results"]):
+                stats["latency"].append(now - sent_at[frame["seq"] + offset])
+                if not result["is_valid"]:
+                    stats["rejected"] += 1
+            received += len(frame["results"])
+        await sender
+    stats["events"] += received
+    stats["completed"] += 1
+
+
+async def _run_load(base_url: str, tokens: list[str], args) -> dict:
+    import aiohttp
+
+    stats: dict = {"connect": [], "latency": [], "events": 0, "completed": 0, "rejected": 0, "errors": 0, "failed": 0}
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        await wait_for_server(http, base_url)
+
+        async def ramped(index: int):
+            # 在 ramp 秒內平均展開連線，並打散每個會話的起始相位
+            await asyncio.sleep(args.ramp * index / len(tokens) + random.random() * args.interval)
+            try:
+                await _run_session(http, base_url, tokens[index], args, stats)
+            except Exception as e:
+                stats["failed"] += 1
+                if stats["failed"] <= 3:
+                    print(f"會話失敗: {e!r}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(ramped(i) for i in range(len(tokens))))
+        stats["elapsed"] = time.perf_counter() - start
+
+        async with http.get(f"{base_url}/metrics/json") as response:
+            stats["server_metrics"] = await response.json()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="事件串流負載測試")
+    parser.add_argument("--sessions", type=int, default=2000, help="同時進行的會話數")
+    parser.add_argument("--events", type=int, default=100, help="每個會話送出的事件數")
+    parser.add_argument("--interval", type=float, default=0.2, help="每個會話送出事件的間隔（秒）")
+    parser.add_argument("--ramp", type=float, default=5.0, help="在幾秒內建立所有連線")
+    parser.add_argument("--port", type=int, default=0, help="伺服器埠號（0 表示自動選擇）")
+    args = parser.parse_args()
+
+    db_file = create_temp_db(args.sessions, 0)
+    port = args.port or free_port()
+    server = start_server(port, {"DB_FILE_PATH": db_file}, backlog=4096)
+    try:
+        # 伺服器與負載產生器共用 SECRET_KEY 設定，在本地簽發每位模擬玩家的 token
+        from auth import create_access_token
+
+        tokens = [create_access_token(data={"sub": user_id}) for user_id in range(1, args.sessions + 1)]
+        stats = asyncio.run(_run_load(f"http://127.0.0.1:{port}", tokens, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    connect = summarize_latencies(stats["connect"])
+    latency = summarize_latencies(stats["latency"])
+    server_metrics = stats["server_metrics"]
+    frame_sizes = server_metrics["event_stream_results_per_frame"]
+    print(f"會話: 完成 {stats['completed']} / 失敗 {stats['failed']}，耗時 {stats['elapsed']:.1f} 秒")
+    print(f"事件: {stats['events']} 筆，{stats['events'] / stats['elapsed']:.0f} 事件/秒，被拒 {stats['rejected']} 筆")
+    print(f"連線建立 (ms):  p50 {connect['p50_ms']:8.2f}  p95 {connect['p95_ms']:8.2f}  p99 {connect['p99_ms']:8.2f}")
+    print(
+        f"事件往返 (ms):  p50 {latency['p50_ms']:8.2f}  p95 {latency['p95_ms']:8.2f}  p99 {latency['p99_ms']:8.2f}"
+        f"  max {latency['max_ms']:8.2f}"
+    )
+    print(
+        f"伺服器: 背壓暫停 {server_metrics['event_stream_backpressure_total']['value']:.0f} 次，"
+        f"平均每訊框 {frame_sizes['sum'] / max(1, frame_sizes['count']):.2f} 筆結果"
+    )
+
+
+if __name__ == "__main__":
+    main()
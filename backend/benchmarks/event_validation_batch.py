@@ -0,0 +1,75 @@
+"""
+批次事件驗證吞吐量測試
+比較逐一 POST /game/event/validate 與 POST /game/events/validate-batch 的每秒事件數
+
+用法:
+    uv run benchmarks/event_validation_batch.py --events 2000 --batch-size 50
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from _common import create_temp_db, generate_event_stream
+
+
+async def _start_session(client, headers: dict) -> str:
+    response = await client.post("/game/session/start", json={"map_index": 0}, headers=headers)
+    response.raise_for_status()
+    session_id: str = response.json()["session_id"]
+    return session_id
+
+
+async def _per_event(client, headers: dict, events: list[dict]) -> float:
+    session_id = await _start_session(client, headers)
+    start = time.perf_counter()
+    for event in events:
+        response = await client.post(
+            "/game/event/validate", json={"session_id": session_id, "event": event}, headers=headers
+        )
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def _batched(client, headers: dict, events: list[dict], batch_size: int) -> float:
+    session_id = await _start_session(client, headers)
+    start = time.perf_counter()
+    for i in range(0, len(events), batch_size):
+        response = await client.post(
+            "/game/events/validate-batch",
+            json={"session_id": session_id, "events": events[i : i + batch_size]},
+            headers=headers,
+        )
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="批次事件驗證吞吐量測試")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["DB_FILE_PATH"] = create_temp_db(1, 0)
+
+    import httpx
+
+    from auth import create_access_token
+    from main import app
+
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 1})}"}
+    events = generate_event_stream(args.events)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        per_event = await _per_event(client, headers, events)
+        batched = await _batched(client, headers, events, args.batch_size)
+
+    print(f"逐一驗證:            {len(events) / per_event:10.0f} 事件/秒")
+    print(f"批次驗證 (每批 {args.batch_size:>3}): {len(events) / batched:10.0f} 事件/秒")
+    print(f"加速倍數:            {per_event / batched:10.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,188 @@
+"""
+Google ID token 本地驗證測試
+以自行產生的 RSA 金鑰簽發 ID token，並以 httpx.MockTransport 提供本地的 JWKS 與 tokeninfo 端點（不連網），
+比較本地驗證與 tokeninfo（模擬往返延遲）每次登入的驗證時間，並確認：
+- 金鑰依 Cache-Control max-age 快取、過期後重新取得
+- 金鑰輪替（新的 kid）時重新取得，偽造的 kid 不會造成重複請求
+- audience、issuer、到期時間與簽章不符的 token 都被拒絕
+- 無法取得金鑰時改用 tokeninfo 驗證
+
+用法:
+    uv run benchmarks/google_token_verify.py --logins 2000 --rtt-ms 80
+"""
+
+import argparse
+import asyncio
+import time
+
+import _common  # noqa: F401  (將 src 加入匯入路徑)
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from google_id_token import GOOGLE_CERTS_URL, GOOGLE_TOKENINFO_URL, GoogleIDTokenVerifier, InvalidGoogleTokenError
+
+CLIENT_ID = "bench-client.apps.googleusercontent.com"
+
+
+def _new_key(kid: str) -> tuple[bytes, dict]:
+    """產生 RSA 私鑰（PEM）與對應的公開 JWK"""
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public = jwk.construct(pem, "RS256").public_key().to_dict()
+    return pem, {**public, "kid": kid, "use": "sig", "alg": "RS256"}
+
+
+def _sign(pem: bytes, kid: str, **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "player@example.com",
+        "email_verified": True,
+        "name": "測試玩家",
+        "iat": now,
+        "exp": now + 3600,
+        **overrides,
+    }
+    token: str = jwt.encode(claims, pem, algorithm="RS256", headers={"kid": kid})
+    return token
+
+
+class FakeGoogle:
+    """本地的 JWKS 與 tokeninfo 端點"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.jwks: list[dict] = []
+        self.max_age = 3600
+        self.no_cache = False
+        self.certs_available = True
+        self.requests = {"certs": 0, "tokeninfo": 0}
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.rtt)
+        url = str(request.url.copy_with(query=None))
+        if url == GOOGLE_CERTS_URL:
+            self.requests["certs"] += 1
+            if not self.certs_available:
+                return httpx.Response(500)
+            cache_control = (
+                "no-cache" if self.no_cache else f"public, max-age={self.max_age}, must-revalidate, no-transform"
+            )
+            headers = {"cache-control": cache_control}
+            return httpx.Response(200, json={"keys": self.jwks}, headers=headers)
+        if url == GOOGLE_TOKENINFO_URL:
+            self.requests["tokeninfo"] += 1
+            # 只模擬延遲與回應格式，不在此重複驗證
+            return httpx.Response(200, json=jwt.get_unverified_claims(request.url.params["id_token"]))
+        return httpx.Response(404)
+
+
+async def _expect_invalid(verifier: GoogleIDTokenVerifier, token: str, reason: str):
+    try:
+        await verifier.verify(token)
+    except InvalidGoogleTokenError:
+        return
+    raise AssertionError(f"應拒絕: {reason}")
+
+
+async def _time_logins(verifier: GoogleIDTokenVerifier, token: str, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        await verifier.verify(token)
+    return (time.perf_counter() - start) / count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Google ID token 本地驗證測試")
+    parser.add_argument("--logins", type=int, default=2000, help="本地驗證的登入次數")
+    parser.add_argument("--rtt-ms", type=float, default=80, help="模擬與 Google 之間的往返延遲")
+    args = parser.parse_args()
+
+    google = FakeGoogle(args.rtt_ms / 1000)
+    pem, public = _new_key("key-1")
+    google.jwks = [public]
+    client = httpx.AsyncClient(transport=httpx.MockTransport(google.handle))
+
+    def verifier(**options) -> GoogleIDTokenVerifier:
+        return GoogleIDTokenVerifier(CLIENT_ID, http_client=client, **options)
+
+    token = _sign(pem, "key-1")
+
+    # 本地驗證：只在第一次取得金鑰（縮短提前重新取得的間隔，讓輪替測試不必等待）
+    local = verifier(min_refresh_interval=0.5)
+    local_time = await _time_logins(local, token, args.logins)
+    assert google.requests == {"certs": 1, "tokeninfo": 0}, google.requests
+
+    remote = verifier(mode="tokeninfo")
+    remote_count = max(1, min(args.logins, int(2 / max(google.rtt, 1e-3))))
+    remote_time = await _time_logins(remote, token, remote_count)
+
+    # 無效的 token
+    other_pem, _ = _new_key("key-1")
+    await _expect_invalid(local, _sign(pem, "key-1", aud="someone-else"), "audience 不符")
+    await _expect_invalid(local, _sign(pem, "key-1", iss="https://evil.example.com"), "issuer 不符")
+    await _expect_invalid(local, _sign(pem, "key-1", exp=int(time.time()) - 60), "已過期")
+    await _expect_invalid(local, _sign(other_pem, "key-1"), "簽章不符")
+
+    # 金鑰輪替：新的 kid 觸發一次重新取得；之後偽造的 kid 不再重新取得
+    new_pem, new_public = _new_key("key-2")
+    google.jwks = [public, new_public]
+    await asyncio.sleep(0.5)
+    await local.verify(_sign(new_pem, "key-2"))
+    assert google.requests["certs"] == 2, google.requests
+    forged = _sign(new_pem, "forged-kid")
+    for _ in range(20):
+        await _expect_invalid(local, forged, "未知的 kid")
+    assert google.requests["certs"] == 2, google.requests
+
+    # Cache-Control max-age 到期後重新取得
+    google.max_age = 1
+    short = verifier(min_refresh_interval=0.5)
+    await short.verify(token)
+    await short.verify(token)
+    fetched = google.requests["certs"]
+    await asyncio.sleep(1.1)
+    await short.verify(token)
+    assert google.requests["certs"] == fetched + 1, google.requests
+
+    # no-cache 的回應仍快取 min_refresh_interval，不會每次登入都重新取得
+    google.no_cache = True
+    no_cache = verifier(min_refresh_interval=0.5)
+    fetched = google.requests["certs"]
+    for _ in range(20):
+        await no_cache.verify(token)
+    assert google.requests["certs"] == fetched + 1, google.requests
+    await asyncio.sleep(0.6)
+    await no_cache.verify(token)
+    assert google.requests["certs"] == fetched + 2, google.requests
+    google.no_cache = False
+
+    # 無法取得金鑰時改用 tokeninfo；關閉備援時回報無法驗證
+    google.certs_available = False
+    tokeninfo_before = google.requests["tokeninfo"]
+    claims = await verifier().verify(token)
+    assert claims["sub"] == "1234567890" and google.requests["tokeninfo"] == tokeninfo_before + 1
+
+    # 透過 auth.verify_google_token 取得 GoogleUserInfo
+    import auth
+
+    google.certs_available = True
+    auth.google_token_verifier = verifier()
+    user = await auth.verify_google_token(token)
+    assert user.id == "1234567890" and user.verified_email
+
+    await client.aclose()
+    print(f"模擬往返延遲 {args.rtt_ms:.0f} ms")
+    print(f"tokeninfo 驗證: {remote_time * 1000:8.2f} ms/次（{remote_count} 次）")
+    print(f"本地 JWKS 驗證: {local_time * 1000:8.2f} ms/次（{args.logins} 次，取得金鑰 1 次）")
+    print("max-age 與 no-cache 快取、金鑰輪替、無效 token、tokeninfo 備援: 通過")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
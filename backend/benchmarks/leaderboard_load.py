@@ -0,0 +1,96 @@
+"""
+排行榜負載測試
+在持續提交分數的同時量測 /game/leaderboard 的延遲
+
+用法:
+    uv run benchmarks/leaderboard_load.py --writers 32 --readers 8 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from _common import create_temp_db, summarize_latencies
+
+
+async def _reader(client, stop: asyncio.Event, latencies: list[float]):
+    """持續讀取排行榜並記錄延遲"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/game/leaderboard", params={"limit": 50})
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        # 快取命中的請求不會讓出事件迴圈，讓計時與寫入工作有機會執行
+        await asyncio.sleep(0)
+
+
+async def _writer(client, token: str, stop: asyncio.Event, counter: list[int]):
+    """持續提交分數"""
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"score": 1234, "level": 1, "map_index": 0, "survival_time": 60, "dots_collected": 50, "ghosts_eaten": 1}
+    while not stop.is_set():
+        response = await client.post("/game/score", json=payload, headers=headers)
+        response.raise_for_status()
+        counter[0] += 1
+
+
+async def _run_phase(app, tokens: list[str], writers: int, readers: int, duration: float) -> dict:
+    """執行一個負載階段"""
+    import httpx
+
+    stop = asyncio.Event()
+    latencies: list[float] = []
+    written = [0]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        tasks = [asyncio.create_task(_reader(client, stop, latencies)) for _ in range(readers)]
+        tasks += [asyncio.create_task(_writer(client, tokens[i % len(tokens)], stop, written)) for i in range(writers)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    result = summarize_latencies(latencies)
+    result["scores_per_sec"] = written[0] / duration
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="排行榜負載測試")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--scores", type=int, default=20000)
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    # 必須在匯入 main 之前指定資料庫路徑
+    os.environ["DB_FILE_PATH"] = create_temp_db(args.users, args.scores)
+
+    from auth import create_access_token
+    from main import app
+    from metrics import metrics
+
+    tokens = [create_access_token(data={"sub": user_id}) for user_id in range(1, min(args.users, 100) + 1)]
+
+    idle = await _run_phase(app, tokens, writers=0, readers=args.readers, duration=args.duration)
+    loaded = await _run_phase(app, tokens, writers=args.writers, readers=args.readers, duration=args.duration)
+
+    print(f"{'階段':<12}{'請求數':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'寫入/秒':>10}")
+    for name, result in (("僅讀取", idle), ("讀寫並行", loaded)):
+        print(
+            f"{name:<12}{result['count']:>8}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['scores_per_sec']:>10.1f}"
+        )
+
+    snapshot = metrics.snapshot()
+    batch, flush = snapshot["db_score_batch_size"], snapshot["db_flush_latency_seconds"]
+    if batch["count"]:
+        print(f"平均批次大小: {batch['sum'] / batch['count']:.1f} 筆, 共 {batch['count']} 次批次寫入")
+    if flush["count"]:
+        print(f"平均 flush 耗時: {flush['sum'] / flush['count'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
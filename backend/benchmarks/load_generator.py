@@ -0,0 +1,316 @@
+"""
+完整遊戲流程負載產生器
+每個虛擬玩家以本地簽發的 JWT 重複執行真實的 API 流程：
+登入（GET /auth/me 確認 token）→ 取得地圖 → 開始會話 → 依遊戲時間節奏分批送出事件 →
+結束會話並等待判定 → 讀取排行榜，並依端點回報吞吐量與延遲百分位數
+
+虛擬玩家數依 --stages 變化（k6 風格：「目標人數:秒數」，每個階段內由前一個目標線性調整），
+例如 "50:30,200:60,200:120,0:30" 為 30 秒增加到 50 人、60 秒增加到 200 人、維持 120 秒、30 秒內降到 0。
+減少人數時，虛擬玩家完成目前的遊戲後才離開。
+--speedup 大於 1 時送出的分數相對實際經過的時間偏高，伺服器會將會話判定為無效（驗證與寫入流程不變）。
+
+未指定 --url 時會啟動本機伺服器：建立含足夠用戶的暫存資料庫，並以合成路網預先寫入地圖快取（不需連網）。
+指定 --url 時，目標伺服器的 SECRET_KEY 需與 --secret-key 相同，資料庫中也需有 id 1..N 的用戶。
+
+用法:
+    uv run benchmarks/load_generator.py --stages 20:10,100:30,100:60,0:10
+    uv run benchmarks/load_generator.py --stages 50:60 --workers 4 --events 300 --speedup 4
+    uv run benchmarks/load_generator.py --url http://127.0.0.1:8000 --secret-key ... --stages 10:30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from _common import (
+    create_temp_db,
+    free_port,
+    generate_event_stream,
+    generate_osm_grid,
+    grid_walk,
+    seed_map_cache,
+    start_server,
+    summarize_latencies,
+    wait_for_server,
+)
+
+# 合成地圖：路口間距需小於路段細分長度，沿路網行走的每一步都落在有效位置上
+GRID_SIZE = 30
+GRID_SPACING_M = 19
+
+
+class RequestFailedError(Exception):
+    """請求失敗（連線錯誤或 4xx/5xx 回應）"""
+
+
+class LoadStats:
+    """依端點彙整的請求延遲、錯誤與遊戲結果"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.sessions = {"completed": 0, "failed": 0, "valid": 0, "invalid": 0}
+        self.active_players = 0
+        self.peak_players = 0
+
+    def record(self, endpoint: str, latency: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(latency)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, samples in self.latencies.items():
+            endpoints[endpoint] = {
+                **summarize_latencies(samples),
+                "errors": self.errors.get(endpoint, 0),
+                "requests_per_s": len(samples) / elapsed,
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "requests_per_s": total / elapsed,
+            "peak_players": self.peak_players,
+            "sessions": self.sessions,
+            "endpoints": endpoints,
+        }
+
+
+def parse_stages(text: str) -> List[Tuple[int, float]]:
+    """解析 "目標人數:秒數,..." """
+    stages = []
+    for part in text.split(","):
+        target, duration = part.split(":")
+        stages.append((int(target), float(duration)))
+    return stages
+
+
+def target_players(stages: List[Tuple[int, float]], elapsed: float) -> Optional[int]:
+    """目前時間點的目標虛擬玩家數，所有階段結束後回傳 None"""
+    previous = 0
+    for target, duration in stages:
+        if elapsed < duration:
+            return round(previous + (target - previous) * elapsed / duration) if duration else target
+        elapsed -= duration
+        previous = target
+    return None
+
+
+class Player:
+    """一個虛擬玩家，重複進行完整的遊戲流程直到被要求離開"""
+
+    def __init__(self, http, base_url: str, token: str, walks: Dict[int, list], stats: LoadStats, args):
+        self.http = http
+        self.base_url = base_url
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.walks = walks
+        self.stats = stats
+        self.args = args
+        self.stopping = asyncio.Event()
+
+    async def _request(self, endpoint: str, method: str, path: str, **kwargs) -> dict:
+        start = time.perf_counter()
+        try:
+            async with self.http.request(method, f"{self.base_url}{path}", headers=self.headers, **kwargs) as response:
+                body = await response.read()
+                ok = response.status < 400
+        except (OSError, TimeoutError) as e:
+            self.stats.record(endpoint, time.perf_counter() - start, False)
+            raise RequestFailedError(f"{endpoint}: {e!r}") from e
+        self.stats.record(endpoint, time.perf_counter() - start, ok)
+        if not ok:
+            raise RequestFailedError(f"{endpoint}: HTTP {response.status} {body[:200]!r}")
+        return json.loads(body) if body else {}
+
+    async def run(self):
+        self.stats.active_players += 1
+        self.stats.peak_players = max(self.stats.peak_players, self.stats.active_players)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    await self.play_game()
+                except RequestFailedError as e:
+                    self.stats.sessions["failed"] += 1
+                    if self.stats.sessions["failed"] <= 3:
+                        print(f"遊戲流程失敗: {e}")
+                    await asyncio.sleep(1)
+        finally:
+            self.stats.active_players -= 1
+
+    async def play_game(self):
+        args = self.args
+        map_index = random.choice(args.maps)
+        await self._request("GET /auth/me", "GET", "/auth/me")
+        await self._request("GET /maps/{map_index}/data", "GET", f"/maps/{map_index}/data")
+        session = await self._request(
+            "POST /game/session/start", "POST", "/game/session/start", json={"map_index": map_index}
+        )
+        session_id = session["session_id"]
+
+        # 沿路網收集豆子，事件時間戳以 --event-interval 遞增，實際送出的節奏依 --speedup 加速
+        events = generate_event_stream(args.events, map_index=map_index, interval=args.event_interval)
+        for event, position in zip(events, self.walks[map_index], strict=False):
+            event["player_position"] = position
+        for i in range(0, len(events), args.batch_size):
+            batch = events[i : i + args.batch_size]
+            await self._request(
+                "POST /game/events/validate-batch",
+                "POST",
+                "/game/events/validate-batch",
+                json={"session_id": session_id, "events": batch},
+            )
+            await asyncio.sleep(len(batch) * args.event_interval / args.speedup)
+
+        last = events[-1]
+        end_request = {
+            "session_id": session_id,
+            "final_score": last["score_after"],
+            "victory": False,
+            "survival_time": 0,
+            "dots_collected": sum(1 for event in events if event["event_type"] == "dot_collected"),
+            "ghosts_eaten": sum(1 for event in events if event["event_type"] == "ghost_eaten"),
+        }
+        result = await self._request("POST /game/session/end", "POST", "/game/session/end", json=end_request)
+        if result.get("status") == "pending":
+            result = await self._request(
+                "GET /game/session/{session_id}/result", "GET", f"/game/session/{session_id}/result?wait=30"
+            )
+        self.stats.sessions["completed"] += 1
+        self.stats.sessions["valid" if result.get("is_valid") else "invalid"] += 1
+
+        await self._request(
+            "GET /game/leaderboard", "GET", "/game/leaderboard", params={"limit": 10, "map_index": map_index}
+        )
+
+
+async def run_load(base_url: str, tokens: List[str], walks: Dict[int, list], args) -> dict:
+    import aiohttp
+
+    stats = LoadStats()
+    stages = parse_stages(args.stages)
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        await wait_for_server(http, base_url)
+
+        players: List[Tuple[Player, asyncio.Task]] = []
+        next_token = 0
+        start = time.monotonic()
+        last_report = start
+        while True:
+            now = time.monotonic()
+            target = target_players(stages, now - start)
+            if target is None:
+                break
+            players = [(player, task) for player, task in players if not task.done()]
+            running = [entry for entry in players if not entry[0].stopping.is_set()]
+            for _ in range(target - len(running)):
+                player = Player(http, base_url, tokens[next_token % len(tokens)], walks, stats, args)
+                next_token += 1
+                players.append((player, asyncio.create_task(player.run())))
+            for player, _ in running[target:]:
+                player.stopping.set()
+            if now - last_report >= args.report_interval:
+                last_report = now
+                requests = sum(len(samples) for samples in stats.latencies.values())
+                print(
+                    f"[{now - start:6.1f}s] 玩家 {stats.active_players:4d}（目標 {target}）"
+                    f"  請求 {requests}  完成遊戲 {stats.sessions['completed']}  失敗 {stats.sessions['failed']}"
+                )
+            await asyncio.sleep(0.1)
+
+        # 所有階段結束：讓進行中的遊戲完成，超過 --drain 秒則中止
+        for player, _ in players:
+            player.stopping.set()
+        tasks = [task for _, task in players]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=args.drain)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        return stats.report(time.monotonic() - start)
+
+
+def _print_report(report: dict):
+    print(
+        f"\n{report['elapsed_s']:.1f} 秒，尖峰 {report['peak_players']} 位玩家，"
+        f"{report['requests']} 個請求（{report['requests_per_s']:.1f} req/s）"
+    )
+    sessions = report["sessions"]
+    print(
+        f"遊戲: 完成 {sessions['completed']}（有效 {sessions['valid']} / 無效 {sessions['invalid']}），"
+        f"失敗 {sessions['failed']}"
+    )
+    print(f"\n{'端點':<40}{'請求數':>8}{'錯誤':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, result in report["endpoints"].items():
+        print(
+            f"{endpoint:<40}{result['count']:>8}{result['errors']:>6}{result['requests_per_s']:>9.1f}"
+            f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="完整遊戲流程負載產生器")
+    parser.add_argument("--stages", default="20:10,50:20,50:30,0:10", help="虛擬玩家數變化「目標人數:秒數,...」")
+    parser.add_argument("--url", help="目標伺服器（未指定時啟動本機伺服器）")
+    parser.add_argument("--secret-key", help="簽發 JWT 的 SECRET_KEY（需與目標伺服器相同）")
+    parser.add_argument("--workers", type=int, default=1, help="本機伺服器的 worker 數")
+    parser.add_argument("--scores", type=int, default=10000, help="本機伺服器資料庫既有的分數筆數")
+    parser.add_argument("--maps", default="0", help="玩家隨機選擇的地圖索引（逗號分隔）")
+    parser.add_argument("--events", type=int, default=200, help="每場遊戲的事件數")
+    parser.add_argument("--batch-size", type=int, default=10, help="每次送出的事件數")
+    parser.add_argument("--event-interval", type=float, default=0.5, help="事件之間的遊戲時間（秒）")
+    parser.add_argument("--speedup", type=float, default=1.0, help="送出事件的節奏相對遊戲時間的加速倍數")
+    parser.add_argument("--drain", type=float, default=60, help="階段結束後等待進行中遊戲完成的秒數")
+    parser.add_argument("--report-interval", type=float, default=5, help="進度輸出間隔（秒）")
+    parser.add_argument("--output", help="將結果寫入 JSON 檔案")
+    args = parser.parse_args()
+    args.maps = [int(index) for index in args.maps.split(",")]
+
+    if args.secret_key:
+        os.environ["SECRET_KEY"] = args.secret_key
+    # 伺服器與負載產生器共用 SECRET_KEY 設定，在本地簽發每位虛擬玩家的 token
+    from auth import create_access_token
+    from map_service import MapService
+
+    peak = max(target for target, _ in parse_stages(args.stages))
+    tokens = [create_access_token(data={"sub": user_id}) for user_id in range(1, max(1, peak) + 1)]
+
+    workdir = tempfile.mkdtemp(prefix="pacmap-load-")
+    maps = seed_map_cache(
+        workdir, MapService(), args.maps, generate_osm_grid(GRID_SIZE, GRID_SIZE, spacing_m=GRID_SPACING_M)
+    )
+    walks = {index: grid_walk(data.valid_positions, GRID_SIZE, GRID_SIZE) for index, data in maps.items()}
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        port = free_port()
+        env = {"DB_FILE_PATH": create_temp_db(max(1, peak), args.scores)}
+        if args.workers > 1:
+            # 多個 worker 需要共用的會話儲存區
+            env.update({"SESSION_STORE": "sqlite", "SESSION_STORE_DIR": os.path.join(workdir, "session_store")})
+        server = start_server(port, env, workers=args.workers, backlog=4096, cwd=workdir)
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        report = asyncio.run(run_load(base_url.rstrip("/"), tokens, walks, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), **report}, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+登入風暴測試
+模擬活動開始時大量玩家同時以 Google 登入（POST /auth/google/login），比較最後登入時間：
+- 立即寫入：每次登入都重寫整個資料庫檔案
+- 延遲合併：只更新記憶體，定期與關閉時合併成一次寫入
+並確認延遲的最後登入時間在關閉時落盤（重新載入檔案後仍在）
+
+Google ID token 的驗證以本地的假驗證器代替（驗證成本另見 google_token_verify.py）
+
+用法:
+    uv run benchmarks/login_storm.py --users 5000 --scores 100000 --logins 400
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from _common import create_temp_db, summarize_latencies
+
+from google_id_token import GoogleIDTokenVerifier
+
+
+class LocalVerifier(GoogleIDTokenVerifier):
+    """以 token 內容（bench-<用戶 id>）直接回傳 claims 的假驗證器"""
+
+    def __init__(self):
+        super().__init__(client_id=None)
+
+    async def verify(self, token: str) -> dict:
+        user_id = token.removeprefix("bench-")
+        return {
+            "sub": token,
+            "email": f"bench{user_id}@example.com",
+            "name": f"玩家{user_id}",
+            "email_verified": True,
+        }
+
+
+async def _storm(client, user_ids: list) -> dict:
+    latencies: list[float] = []
+
+    async def login(user_id: int):
+        start = time.perf_counter()
+        response = await client.post("/auth/google/login", json={"id_token": f"bench-{user_id}"})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - start
+    return {"latency": summarize_latencies(latencies), "elapsed": elapsed, "logins_per_s": len(user_ids) / elapsed}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="登入風暴測試")
+    parser.add_argument("--users", type=int, default=5000, help="資料庫用戶數")
+    parser.add_argument("--scores", type=int, default=100000, help="資料庫既有的分數筆數（影響每次寫檔的成本）")
+    parser.add_argument("--logins", type=int, default=400, help="同時登入的玩家數")
+    args = parser.parse_args()
+
+    os.environ["DB_FILE_PATH"] = create_temp_db(args.users, args.scores)
+
+    import httpx
+
+    import auth
+    from database import DB_FLUSH_LATENCY, SimpleFileDB, async_db, db
+    from main import app
+
+    auth.google_token_verifier = LocalVerifier()
+    half = args.logins // 2
+    groups = {
+        "立即寫入": (False, list(range(1, half + 1))),
+        "延遲合併": (True, list(range(half + 1, args.logins + 1))),
+    }
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        await client.get("/game/leaderboard")  # 先觸發資料庫載入
+        for name, (deferred, user_ids) in groups.items():
+            db.defer_user_activity = deferred
+            flushes = DB_FLUSH_LATENCY.count
+            result = await _storm(client, user_ids)
+            result["flushes"] = DB_FLUSH_LATENCY.count - flushes
+            results[name] = result
+
+    # 關閉時寫入延遲的更新
+    pending = db._deferred_writes
+    flushes = DB_FLUSH_LATENCY.count
+    await async_db.close()
+    assert db._deferred_writes == 0 and DB_FLUSH_LATENCY.count == flushes + 1, (db._deferred_writes, pending)
+
+    reloaded = SimpleFileDB(db.db_path)
+    for user_id in range(1, args.logins + 1):
+        user = reloaded.get_user_by_id(user_id)
+        assert user is not None and user.last_login is not None, user_id
+
+    print(f"{args.users} 位用戶、{args.scores} 筆分數，每種模式 {half} 人同時登入")
+    print(f"{'模式':<8}{'p50 ms':>10}{'p95 ms':>10}{'登入/s':>10}{'寫檔次數':>10}")
+    for name, result in results.items():
+        latency = result["latency"]
+        print(
+            f"{name:<8}{latency['p50_ms']:>10.1f}{latency['p95_ms']:>10.1f}"
+            f"{result['logins_per_s']:>10.1f}{result['flushes']:>10}"
+        )
+    print(f"關閉時合併寫入 {pending} 筆延遲的最後登入時間，重新載入後皆存在: 通過")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+"""
+地圖數據序列化測試
+- 序列化：FastAPI 預設路徑（response_model 驗證與轉換 + json.dumps）與 Pydantic 序列化器的耗時
+- 磁碟快取：舊格式（json.dump 縮排）與新格式（model_dump_json 精簡）的寫入、載入耗時與檔案大小，
+  並確認舊格式的快取檔仍可載入
+- HTTP：以行程內 ASGI client 比較經過 response_model 的路由與 /maps/{map_index}/data 的吞吐量，
+  並確認兩者回應內容相同
+
+用法:
+    uv run benchmarks/map_data_serialization.py --grid 30 --seconds 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from _common import build_map_data, create_temp_db, generate_osm_grid
+
+
+def _best(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return min(samples)
+
+
+async def _throughput(client, path: str, seconds: float, concurrency: int) -> float:
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    async def worker():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            response = await client.get(path)
+            response.raise_for_status()
+            done += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="地圖數據序列化測試")
+    parser.add_argument("--grid", type=int, default=30, help="路網大小（grid × grid 個路口）")
+    parser.add_argument("--repeat", type=int, default=5, help="序列化與快取讀寫的重複次數（取最小值）")
+    parser.add_argument("--seconds", type=float, default=3, help="每種路由的吞吐量量測秒數")
+    parser.add_argument("--concurrency", type=int, default=4, help="並行請求數")
+    args = parser.parse_args()
+
+    os.environ["DB_FILE_PATH"] = create_temp_db(100, 100)
+
+    import httpx
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import APIRoute, serialize_response
+
+    from main import app
+    from map_service import map_service
+    from models import ProcessedMapData
+
+    data = build_map_data(map_service, 0, generate_osm_grid(args.grid, args.grid))
+    body = await map_service.get_processed_map_json(0)
+    assert body is not None
+
+    # FastAPI 預設路徑：以路由的 response_model 欄位驗證與轉換，再由 JSONResponse 以 json.dumps 編碼
+    route = next(
+        route for route in app.routes if isinstance(route, APIRoute) and route.path == "/maps/{map_index}/data"
+    )
+    samples = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        content = await serialize_response(field=route.response_field, response_content=data)
+        default_body = bytes(JSONResponse(content).body)
+        samples.append(time.perf_counter() - start)
+    serialize = {
+        "FastAPI 預設（response_model + json.dumps）": min(samples),
+        "model_dump_json": _best(lambda: data.model_dump_json().encode(), args.repeat),
+    }
+    assert json.loads(default_body) == json.loads(body)
+
+    # 磁碟快取：舊格式與新格式
+    map_service.cache_dir = Path(tempfile.mkdtemp(prefix="pacmap-map-cache-"))
+    cache_file = map_service.cache_dir / "map_0.json"
+
+    def write_old():
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump(data.model_dump(), f, ensure_ascii=False, indent=2, default=str)
+
+    def read_old() -> ProcessedMapData:
+        with open(cache_file, encoding="utf-8") as f:
+            return ProcessedMapData(**json.load(f))
+
+    write_old()
+    old_size = os.path.getsize(cache_file)
+    cache = {
+        "舊格式寫入（json.dump 縮排）": _best(write_old, args.repeat),
+        "舊格式載入（json.load + ProcessedMapData(**)）": _best(read_old, args.repeat),
+        "舊格式檔案以新流程載入": _best(lambda: map_service._read_cache_file(0), args.repeat),
+    }
+    assert map_service._read_cache_file(0) == data, "舊格式的快取檔應可載入"
+    samples = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        await map_service._save_to_cache(0, data)
+        samples.append(time.perf_counter() - start)
+    cache["新格式寫入（model_dump_json）"] = min(samples)
+    new_size = os.path.getsize(cache_file)
+    cache["新格式載入（model_validate_json）"] = _best(lambda: map_service._read_cache_file(0), args.repeat)
+    assert map_service._read_cache_file(0) == data
+
+    # HTTP：經過 response_model 的路由作為對照
+    async def legacy_map_data():
+        return map_service.cache[0]
+
+    app.add_api_route("/bench/legacy-map-data", legacy_map_data, response_model=ProcessedMapData)
+    transport = httpx.ASGITransport(app=app)
+    throughput = {}
+    latency = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        legacy = await client.get("/bench/legacy-map-data")
+        fast = await client.get("/maps/0/data")
+        assert fast.headers["content-type"] == "application/json"
+        assert legacy.json() == fast.json(), "兩種路由的回應內容應相同"
+        for name, path in (("response_model", "/bench/legacy-map-data"), ("預先序列化", "/maps/0/data")):
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                (await client.get(path)).raise_for_status()
+                samples.append(time.perf_counter() - start)
+            latency[name] = statistics.median(samples)
+            throughput[name] = await _throughput(client, path, args.seconds, args.concurrency)
+
+    print(
+        f"{args.grid}×{args.grid} 路網：{len(data.valid_positions)} 個有效位置、{len(data.road_network)} 個路段，"
+        f"回應 {len(body) / 1024:.0f} KiB"
+    )
+    print(f"\n{'序列化':<52}{'ms':>10}")
+    for name, seconds in serialize.items():
+        print(f"{name:<52}{seconds * 1e3:>10.2f}")
+    print(f"\n{'磁碟快取':<52}{'ms':>10}")
+    for name, seconds in cache.items():
+        print(f"{name:<52}{seconds * 1e3:>10.2f}")
+    print(f"檔案大小: 舊格式 {old_size / 1024:.0f} KiB、新格式 {new_size / 1024:.0f} KiB")
+    print(f"\n{'GET 地圖數據':<20}{'延遲 ms':>10}{'req/s':>10}")
+    for name in throughput:
+        print(f"{name:<20}{latency[name] * 1e3:>10.2f}{throughput[name]:>10.1f}")
+    print("舊格式快取檔可載入、兩種路由的回應內容相同: 通過")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+移動距離驗證效能測試
+以合成棋盤路網模擬玩家沿道路移動，量測開啟沿路網距離檢查前後每秒可驗證的事件數，
+並確認瞬間移動與穿越街廓（直線距離合理、沿道路距離過長）的事件會被拒絕
+
+用法:
+    uv run benchmarks/movement_check.py --grids 20,50,100 --events 5000
+"""
+
+import argparse
+import time
+
+from _common import build_map_data, generate_event_stream, generate_osm_grid, grid_walk
+
+from game_validation_service import GameValidationService
+from map_service import MapService
+from models import GameEvent, GameSessionStartRequest
+
+SPACING_M = 19
+
+
+def _walk_events(walk: list, count: int) -> list[GameEvent]:
+    """沿路網移動的事件，每 0.5 秒前進一個路口（38 公尺/秒）"""
+    events = generate_event_stream(count, interval=0.5)
+    for event, position in zip(events, walk[: len(events)], strict=True):
+        event["player_position"] = position
+    return [GameEvent(**event) for event in events]
+
+
+def _events_per_second(service: GameValidationService, events: list[GameEvent]) -> tuple[float, int]:
+    session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+    start = time.perf_counter()
+    results = service.validate_game_events(session_id, events)
+    elapsed = time.perf_counter() - start
+    return len(events) / elapsed, sum(1 for result in results if not result.is_valid)
+
+
+def _move(service: GameValidationService, start: GameEvent, position: list, elapsed: float) -> bool:
+    """從 start 的位置經過 elapsed 秒後出現在 position，回傳是否被接受"""
+    session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+    service.validate_game_event(session_id, start)
+    moved = start.model_copy(
+        update={
+            "event_type": "health_changed",
+            "timestamp": start.timestamp + elapsed,
+            "player_position": position,
+            "health_after": start.health_after - 1,
+        }
+    )
+    return service.validate_game_event(session_id, moved).is_valid
+
+
+def _check_cheats(service: GameValidationService, valid_positions: list, cols: int):
+    rules = service.game_rules
+    origin = GameEvent(**{**generate_event_stream(1)[0], "player_position": valid_positions[0]})
+
+    # 瞬間移動：0.5 秒內移動到地圖另一角
+    assert not _move(service, origin, valid_positions[cols * cols - 1], 0.5)
+
+    # 穿越街廓：沿對角線到 (10, 10) 路口的直線距離在上限內，沿道路需走 20 個路口
+    diagonal = valid_positions[10 * cols + 10]
+    straight = 10 * SPACING_M * 2**0.5
+    elapsed = (straight * 1.1 - rules["movement_slack"]) / (rules["max_player_speed"] * rules["movement_tolerance"])
+    assert not _move(service, origin, diagonal, elapsed)
+    # 同樣的時間沿道路走到 (0, 10) 路口則合理
+    assert _move(service, origin, valid_positions[10], elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="移動距離驗證效能測試")
+    parser.add_argument("--grids", default="20,50,100", help="棋盤路網邊長（路口數），逗號分隔")
+    parser.add_argument("--events", type=int, default=5000, help="每個會話的事件數")
+    args = parser.parse_args()
+
+    print(f"{'路網':>10}{'節點數':>10}{'不檢查 事件/秒':>16}{'檢查 事件/秒':>14}{'重播 事件/秒':>14}{'被拒':>6}")
+    for size in (int(value) for value in args.grids.split(",")):
+        map_service = MapService()
+        data = build_map_data(map_service, 0, generate_osm_grid(size, size, spacing_m=SPACING_M))
+        events = _walk_events(grid_walk(data.valid_positions, size, size), min(args.events, size * size))
+
+        baseline, _ = _events_per_second(GameValidationService(), events)
+        service = GameValidationService(map_service=map_service)
+        # 索引在第一次查詢時建立，先建好再計時
+        map_service.get_position_index(0)
+        graph = map_service.get_road_graph(0)
+        assert graph is not None
+        checked, rejected = _events_per_second(service, events)
+        # 同一段路線再走一次，節點對的距離直接命中快取
+        replayed, _ = _events_per_second(service, events)
+        _check_cheats(service, data.valid_positions, size)
+
+        print(f"{f'{size}x{size}':>10}{len(graph):>10}{baseline:>16.0f}{checked:>14.0f}{replayed:>14.0f}{rejected:>6}")
+    print("瞬間移動與穿越街廓的事件: 皆被拒絕")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+效能分析額外成本測試
+- 區段計時：關閉時被標記的方法即原本的函式（無額外成本），比較關閉與開啟時熱點方法的每次呼叫時間
+- 取樣分析：比較分析期間與平常的請求吞吐量，並確認 /admin/profile 的輸出為有效的 collapsed stacks
+  且包含請求處理的熱點
+
+用法:
+    uv run benchmarks/profiler_overhead.py --calls 20000 --seconds 3
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import time
+
+from _common import build_map_data, create_temp_db, generate_event_stream, generate_osm_grid
+
+# collapsed stacks 的一行：以分號分隔的堆疊與次數
+COLLAPSED_LINE = re.compile(r"^[^;]+(;[^;]+)* \d+$")
+PROFILING_TOKEN = "bench-profiling-token"
+
+
+def _per_call(func, calls: int, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+async def _throughput(client, seconds: float, concurrency: int, requests: list) -> float:
+    """在 seconds 秒內以 concurrency 個 worker 循環送出 requests，回傳每秒請求數"""
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    async def worker():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            for method, path, kwargs in requests:
+                response = await client.request(method, path, **kwargs)
+                response.raise_for_status()
+                done += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="效能分析額外成本測試")
+    parser.add_argument("--calls", type=int, default=20000, help="區段計時每種方法的呼叫次數")
+    parser.add_argument("--seconds", type=float, default=3, help="取樣分析與吞吐量量測的秒數")
+    parser.add_argument("--concurrency", type=int, default=10, help="吞吐量量測的並行 worker 數")
+    args = parser.parse_args()
+
+    os.environ["DB_FILE_PATH"] = create_temp_db(1000, 10000)
+    os.environ["PROFILING_TOKEN"] = PROFILING_TOKEN
+
+    import httpx
+
+    import spans
+    from auth import create_access_token
+    from database import SimpleFileDB, db
+    from game_validation_service import game_validation_service as service
+    from main import app
+    from map_service import map_service
+    from models import GameEvent, GameSessionStartRequest
+
+    build_map_data(map_service, 0, generate_osm_grid(10, 10))
+    original = SimpleFileDB.get_leaderboard
+    events = [GameEvent(**event) for event in generate_event_stream(20)]
+    session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+
+    cases = {
+        "SimpleFileDB.get_user_by_id": lambda: db.get_user_by_id(1),
+        "SimpleFileDB.get_leaderboard(10)": lambda: db.get_leaderboard(10),
+        "validate_game_events(20)": lambda: service.validate_game_events(session_id, events),
+    }
+    span_results = {}
+    for name, func in cases.items():
+        calls = args.calls // 20 if "validate" in name or "leaderboard" in name else args.calls
+        off = _per_call(func, calls)
+        spans.enable_spans()
+        on = _per_call(func, calls)
+        spans.disable_spans()
+        span_results[name] = (off, on)
+    assert SimpleFileDB.get_leaderboard is original, "關閉後應換回原本的函式"
+
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 1})}"}
+    admin_headers = {"X-Profiling-Token": PROFILING_TOKEN}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        response = await client.post("/game/session/start", json={"map_index": 0}, headers=headers)
+        batch = {"session_id": response.json()["session_id"], "events": generate_event_stream(20)}
+        requests = [
+            ("GET", "/game/leaderboard", {"params": {"limit": 10}}),
+            ("POST", "/game/events/validate-batch", {"json": batch, "headers": headers}),
+        ]
+
+        assert (await client.post("/admin/profile", params={"seconds": 0.1})).status_code == 403
+        baseline = await _throughput(client, args.seconds, args.concurrency, requests)
+        profile_request = asyncio.create_task(
+            client.post("/admin/profile", params={"seconds": args.seconds}, headers=admin_headers)
+        )
+        await asyncio.sleep(0.05)
+        busy = await client.post("/admin/profile", params={"seconds": 0.1}, headers=admin_headers)
+        profiled = await _throughput(client, args.seconds, args.concurrency, requests)
+        response = await profile_request
+        response.raise_for_status()
+        collapsed = response.text
+
+        toggle = await client.put("/admin/spans", params={"enabled": True}, headers=admin_headers)
+        await _throughput(client, 0.5, args.concurrency, requests)
+        metrics_text = (await client.get("/metrics")).text
+        await client.put("/admin/spans", params={"enabled": False}, headers=admin_headers)
+
+    lines = collapsed.splitlines()
+    for line in lines:
+        assert COLLAPSED_LINE.match(line), line
+    samples = sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+    hot = sum(int(line.rsplit(" ", 1)[1]) for line in lines if "validate_game_events" in line)
+    assert busy.status_code == 409, busy.status_code
+    assert (
+        toggle.json()["enabled"] and 'span_seconds_count{span="GameValidationService._validate_event"}' in metrics_text
+    )
+
+    print("區段計時（每次呼叫 µs，取 3 輪最小值）")
+    print(f"{'方法':<36}{'關閉':>10}{'開啟':>10}{'額外':>10}")
+    for name, (off, on) in span_results.items():
+        print(f"{name:<36}{off * 1e6:>10.2f}{on * 1e6:>10.2f}{(on - off) * 1e6:>10.2f}")
+    print("關閉時被標記的方法即原本的函式: 通過")
+    print(f"\n取樣分析 {args.seconds} 秒（間隔 5 ms），並行 {args.concurrency} 個 worker")
+    print(f"平常吞吐量 {baseline:>10.0f} req/s")
+    print(f"分析期間   {profiled:>10.0f} req/s  ({(profiled - baseline) / baseline:+.1%})")
+    print(f"collapsed stacks {len(lines)} 種堆疊、{samples} 個樣本，其中 {hot} 個位於 validate_game_events: 通過")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
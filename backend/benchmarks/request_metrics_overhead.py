@@ -0,0 +1,134 @@
+"""
+請求指標額外成本測試
+比較開啟與關閉 RequestMetricsMiddleware 時的每請求延遲（GET /health 為最輕量的路由，額外成本佔比最高；
+GET /auth/me 與批次事件驗證為一般的請求；兩種設定逐一請求交替送出，避免執行順序與記憶體成長造成的偏差），
+以及驗證規則計時（不計時、預設抽樣、每個事件都計時）對每個事件驗證時間的影響；
+並確認 /metrics 輸出為有效的 Prometheus 文字格式
+
+用法:
+    uv run benchmarks/request_metrics_overhead.py --requests 3000 --events 20000
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import time
+
+from _common import build_map_data, create_temp_db, generate_event_stream, generate_osm_grid
+
+# Prometheus 文字格式的樣本行：名稱、可選的標籤、數值
+LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"'
+SAMPLE_LINE = re.compile(rf"^[a-zA-Z_:][a-zA-Z0-9_:]*(\{{{LABEL}(,{LABEL})*\}})? \S+$")
+
+
+async def _per_request(clients: dict, method: str, path: str, count: int, **kwargs) -> dict:
+    """對每個 client 交替送出同一個請求，回傳各自的平均延遲"""
+    totals = dict.fromkeys(clients, 0.0)
+    for _ in range(count):
+        for name, client in clients.items():
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            totals[name] += time.perf_counter() - start
+            response.raise_for_status()
+    return {name: total / count for name, total in totals.items()}
+
+
+def _per_event(service, session_id: str, events: list, batch_size: int = 100) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(events), batch_size):
+        service.validate_game_events(session_id, events[i : i + batch_size])
+    return (time.perf_counter() - start) / len(events)
+
+
+def _check_prometheus_text(text: str):
+    families = set()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            families.add(line.split()[2])
+        elif not line.startswith("# HELP "):
+            assert SAMPLE_LINE.match(line), line
+    for name in (
+        "http_request_duration_seconds",
+        "http_requests_total",
+        "db_operation_seconds",
+        "validation_rule_seconds",
+    ):
+        assert name in families, name
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="請求指標額外成本測試")
+    parser.add_argument("--requests", type=int, default=3000, help="每種情境的請求數")
+    parser.add_argument("--events", type=int, default=20000, help="直接驗證的事件數")
+    parser.add_argument("--rounds", type=int, default=3, help="驗證規則計時交替執行的輪數（取最小值）")
+    args = parser.parse_args()
+
+    os.environ["DB_FILE_PATH"] = create_temp_db(1000, 0)
+    # 由測試自行包上中介層，以便比較開啟與關閉
+    os.environ["REQUEST_METRICS_ENABLED"] = "false"
+
+    import httpx
+    from starlette.types import ASGIApp
+
+    from auth import create_access_token
+    from config import settings
+    from game_validation_service import game_validation_service as service
+    from main import app
+    from map_service import map_service
+    from models import GameEvent, GameSessionStartRequest
+    from request_metrics import RequestMetricsMiddleware
+
+    build_map_data(map_service, 0, generate_osm_grid(10, 10))
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 1})}"}
+    events = generate_event_stream(50)
+
+    apps: dict[str, ASGIApp] = {"關閉": app, "開啟": RequestMetricsMiddleware(app)}
+    clients = {
+        name: httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://bench")
+        for name, asgi_app in apps.items()
+    }
+    await clients["關閉"].get("/auth/me", headers=headers)  # 載入資料庫
+    response = await clients["關閉"].post("/game/session/start", json={"map_index": 0}, headers=headers)
+    batch = {"session_id": response.json()["session_id"], "events": events}
+    results = {
+        "GET /health": await _per_request(clients, "GET", "/health", args.requests),
+        "GET /auth/me": await _per_request(clients, "GET", "/auth/me", args.requests, headers=headers),
+        "POST validate-batch(50)": await _per_request(
+            clients, "POST", "/game/events/validate-batch", args.requests // 10, json=batch, headers=headers
+        ),
+    }
+    _check_prometheus_text((await clients["開啟"].get("/metrics")).text)
+    for client in clients.values():
+        await client.aclose()
+
+    # 驗證規則計時：直接呼叫驗證服務，排除 HTTP 成本
+    game_events = [GameEvent(**event) for event in generate_event_stream(args.events)]
+    sample_rates = {
+        "不計時": 0,
+        f"每 {settings.VALIDATION_TIMING_SAMPLE_RATE} 個事件抽樣": settings.VALIDATION_TIMING_SAMPLE_RATE,
+        "每個事件": 1,
+    }
+    per_event: dict = {}
+    for _ in range(args.rounds):
+        for name, rate in sample_rates.items():
+            service.timing_sample_rate = rate
+            session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+            value = _per_event(service, session_id, game_events)
+            per_event[name] = min(value, per_event.get(name, value))
+    service.timing_sample_rate = settings.VALIDATION_TIMING_SAMPLE_RATE
+
+    print(f"每種情境 {args.requests} 次請求（validate-batch 為 {args.requests // 10} 次）")
+    print(f"{'請求':<26}{'關閉 µs':>10}{'開啟 µs':>10}{'額外 µs':>10}{'比例':>8}")
+    for route, timings in results.items():
+        off, on = timings["關閉"], timings["開啟"]
+        print(f"{route:<26}{off * 1e6:>10.1f}{on * 1e6:>10.1f}{(on - off) * 1e6:>10.1f}{(on - off) / off:>8.1%}")
+    baseline = per_event["不計時"]
+    print(f"\n驗證規則計時（每事件 µs，{args.events} 個事件）")
+    for name, value in per_event.items():
+        print(f"{name:<20}{value * 1e6:>10.2f}{(value - baseline) / baseline:>8.1%}")
+    print("/metrics Prometheus 文字格式: 通過")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
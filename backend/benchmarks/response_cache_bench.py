@@ -0,0 +1,125 @@
+"""
+回應快取測試
+比較排行榜與地圖配置在關閉與開啟回應快取時的吞吐量（並行請求，行程內 ASGI client），
+以及帶 If-None-Match 重新驗證（304）的吞吐量；讀取期間定期提交分數，確認新分數會讓快取失效。
+並確認兩種模式的回應內容相同
+
+用法:
+    uv run benchmarks/response_cache_bench.py --users 10000 --scores 100000 --seconds 3
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any
+
+from _common import create_temp_db
+
+QUERIES: dict[str, dict[str, Any]] = {
+    "top10": {"limit": 10},
+    "top100": {"limit": 100},
+    "top10_map": {"limit": 10, "map_index": 1},
+    "top10_daily": {"limit": 10, "window": "daily"},
+    "all(1000)": {},
+}
+
+
+async def _throughput(client, path: str, params: dict, seconds: float, concurrency: int, headers=None) -> float:
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    async def worker():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            response = await client.get(path, params=params, headers=headers)
+            assert response.status_code in (200, 304), response.status_code
+            done += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="回應快取測試")
+    parser.add_argument("--users", type=int, default=10000, help="資料庫用戶數")
+    parser.add_argument("--scores", type=int, default=100000, help="資料庫分數筆數")
+    parser.add_argument("--seconds", type=float, default=3, help="每種情境的量測秒數")
+    parser.add_argument("--concurrency", type=int, default=20, help="並行請求數")
+    args = parser.parse_args()
+
+    os.environ["DB_FILE_PATH"] = create_temp_db(args.users, args.scores)
+
+    import httpx
+
+    from auth import create_access_token
+    from main import app, leaderboard_cache, map_configs_cache
+
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 1})}"}
+    cache_size = leaderboard_cache.max_size
+    transport = httpx.ASGITransport(app=app)
+    results: dict[str, dict[str, float]] = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.get("/game/leaderboard", params={"limit": 1})  # 載入資料庫
+
+        cases = {f"GET /game/leaderboard {name}": ("/game/leaderboard", params) for name, params in QUERIES.items()}
+        cases["GET /maps/configs"] = ("/maps/configs", {})
+        for name, (path, params) in cases.items():
+            bodies = {}
+            for mode, size in (("關閉", 0), ("開啟", cache_size)):
+                leaderboard_cache.max_size = map_configs_cache.max_size = size
+                leaderboard_cache.clear()
+                map_configs_cache.clear()
+                bodies[mode] = (await client.get(path, params=params)).json()
+                results.setdefault(name, {})[mode] = await _throughput(
+                    client, path, params, args.seconds, args.concurrency
+                )
+            assert bodies["關閉"] == bodies["開啟"], name
+            # 客戶端以 ETag 重新驗證
+            etag = (await client.get(path, params=params)).headers["etag"]
+            not_modified = await client.get(path, params=params, headers={"If-None-Match": etag})
+            assert not_modified.status_code == 304 and not not_modified.content
+            results[name]["304"] = await _throughput(
+                client, path, params, args.seconds, args.concurrency, headers={"If-None-Match": etag}
+            )
+
+        # 讀取期間提交分數：新分數應立即出現在排行榜上
+        params = {"limit": 10}
+        before = await client.get("/game/leaderboard", params=params)
+        top_score = before.json()["data"][0]["score"] + 1
+        payload = {
+            "score": top_score,
+            "level": 1,
+            "map_index": 0,
+            "survival_time": 600,
+            "dots_collected": 100,
+            "ghosts_eaten": 1,
+        }
+        writes = 0
+        stale = 0
+        deadline = time.perf_counter() + args.seconds
+        reads = asyncio.create_task(_throughput(client, "/game/leaderboard", params, args.seconds, args.concurrency))
+        while time.perf_counter() < deadline:
+            payload["score"] = top_score + writes
+            (await client.post("/game/score", json=payload, headers=headers)).raise_for_status()
+            writes += 1
+            after = await client.get("/game/leaderboard", params=params)
+            stale += after.json()["data"][0]["score"] != payload["score"]
+            await asyncio.sleep(0.2)
+        mixed = await reads
+        assert stale == 0 and after.headers["etag"] != before.headers["etag"], stale
+
+    print(f"{args.users} 位用戶、{args.scores} 筆分數，並行 {args.concurrency} 個請求，每種情境 {args.seconds} 秒")
+    print(f"{'請求':<40}{'關閉 req/s':>12}{'開啟 req/s':>12}{'倍數':>8}{'304 req/s':>12}")
+    for name, result in results.items():
+        print(
+            f"{name:<40}{result['關閉']:>12.0f}{result['開啟']:>12.0f}"
+            f"{result['開啟'] / result['關閉']:>8.1f}{result['304']:>12.0f}"
+        )
+    print(f"\n讀取期間提交 {writes} 筆分數：排行榜 top10 {mixed:.0f} req/s，提交後立即讀取皆為最新: 通過")
+    print("關閉與開啟快取的回應內容相同、If-None-Match 回傳 304: 通過")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
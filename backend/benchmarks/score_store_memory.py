@@ -0,0 +1,93 @@
+"""
+分數儲存記憶體與啟動時間比較
+比較舊版（json.load 成 dict 列表）與欄式 ScoreStore 在大量分數下的 RSS 與載入時間
+
+用法:
+    uv run benchmarks/score_store_memory.py --scores 1000000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from _common import create_temp_db
+
+
+def _current_rss_mb() -> float:
+    """目前常駐記憶體（MB），非 Linux 環境退回峰值"""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(mode: str, db_file: str):
+    """在子行程中載入資料庫並回報量測結果"""
+    import gc
+
+    gc.collect()
+    baseline = _current_rss_mb()
+    start = time.perf_counter()
+    if mode == "dicts":
+        with open(db_file, encoding="utf-8") as f:
+            data = json.load(f)
+        row_count = len(data["scores"])
+    else:
+        from database import SimpleFileDB
+
+        db = SimpleFileDB(db_file)
+        row_count = len(db.scores)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+
+    print(
+        json.dumps(
+            {
+                "mode": mode,
+                "rows": row_count,
+                "load_seconds": elapsed,
+                "rss_mb": _current_rss_mb() - baseline,
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分數儲存記憶體與啟動時間比較")
+    parser.add_argument("--scores", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--child", choices=["dicts", "columns"])
+    parser.add_argument("--db-file")
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.db_file)
+        return
+
+    db_file = create_temp_db(args.users, args.scores)
+    print(f"{'儲存方式':<10}{'列數':>10}{'載入(秒)':>10}{'常駐增量(MB)':>14}{'峰值(MB)':>10}{'每列(bytes)':>12}")
+    for mode in ("dicts", "columns"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--db-file", db_file],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        per_row = result["rss_mb"] * 1024 * 1024 / max(1, result["rows"])
+        print(
+            f"{mode:<10}{result['rows']:>10}{result['load_seconds']:>10.2f}{result['rss_mb']:>14.1f}"
+            f"{result['peak_rss_mb']:>10.1f}{per_row:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
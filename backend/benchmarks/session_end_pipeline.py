@@ -0,0 +1,143 @@
+"""
+會話結束管線延遲測試
+在已有大量分數的資料庫上，模擬多個玩家同時結束遊戲會話，比較：
+- 受理延遲：POST /game/session/end 立即回傳票證（結算畫面可以馬上出現）
+- 判定延遲：從送出結束請求到長輪詢 /game/session/{id}/result 取得結果（含最終驗證與分數落盤）
+- 同步等待：POST /game/session/end?wait=30，等同舊版在請求內完成驗證與寫入
+並確認重送結束請求會取得同一筆分數記錄，不會重複寫入
+
+用法:
+    uv run benchmarks/session_end_pipeline.py --players 200 --scores 100000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from _common import build_map_data, create_temp_db, generate_event_stream, generate_osm_grid, summarize_latencies
+
+
+async def _play(client, headers: dict, wait: float) -> tuple[str, float, dict]:
+    """開始會話、送出開始事件並結束，回傳 (session_id, 結束請求延遲, 回應)"""
+    response = await client.post("/game/session/start", json={"map_index": 0}, headers=headers)
+    response.raise_for_status()
+    session_id = response.json()["session_id"]
+    response = await client.post(
+        "/game/events/validate-batch",
+        json={"session_id": session_id, "events": generate_event_stream(1)},
+        headers=headers,
+    )
+    response.raise_for_status()
+
+    end_request = {
+        "session_id": session_id,
+        "victory": False,
+        "final_score": 0,
+        "survival_time": 0,
+        "dots_collected": 0,
+        "ghosts_eaten": 0,
+    }
+    start = time.perf_counter()
+    response = await client.post(f"/game/session/end?wait={wait}", json=end_request, headers=headers)
+    response.raise_for_status()
+    return session_id, time.perf_counter() - start, response.json()
+
+
+async def _run(client, all_headers: list, wait: float) -> dict:
+    acks: list[float] = []
+    verdicts: list[float] = []
+    statuses: dict = {}
+
+    async def player(headers: dict):
+        start = time.perf_counter()
+        session_id, ack, result = await _play(client, headers, wait)
+        acks.append(ack)
+        if result["status"] == "pending":
+            response = await client.get(f"/game/session/{session_id}/result?wait=30", headers=headers)
+            response.raise_for_status()
+            result = response.json()
+        verdicts.append(time.perf_counter() - start)
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(player(headers) for headers in all_headers))
+    return {
+        "ack": summarize_latencies(acks),
+        "verdict": summarize_latencies(verdicts),
+        "statuses": statuses,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+async def _check_retry(client, headers: dict):
+    """重送結束請求應回傳同一筆分數記錄"""
+    session_id, _, first = await _play(client, headers, 30)
+    end_request = {
+        "session_id": session_id,
+        "victory": False,
+        "final_score": 0,
+        "survival_time": 0,
+        "dots_collected": 0,
+        "ghosts_eaten": 0,
+    }
+    response = await client.post("/game/session/end", json=end_request, headers=headers)
+    response.raise_for_status()
+    retried = response.json()
+    assert first["status"] == "completed" and first["score_id"] is not None, first
+    assert retried["score_id"] == first["score_id"], (first, retried)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="會話結束管線延遲測試")
+    parser.add_argument("--players", type=int, default=200, help="同時結束會話的玩家數")
+    parser.add_argument("--scores", type=int, default=100000, help="資料庫既有的分數筆數")
+    args = parser.parse_args()
+
+    os.environ["DB_FILE_PATH"] = create_temp_db(args.players, args.scores)
+
+    import httpx
+
+    from auth import create_access_token
+    from database import async_db, db
+    from main import app
+    from map_service import map_service
+    from session_finalizer import session_finalizer
+
+    # 開始會話時會載入地圖，以合成路網代替向 OSM 取得
+    build_map_data(map_service, 0, generate_osm_grid(10, 10))
+
+    all_headers = [
+        {"Authorization": f"Bearer {create_access_token(data={'sub': user_id})}"}
+        for user_id in range(1, args.players + 1)
+    ]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # 先觸發資料庫載入
+        await client.get("/game/leaderboard", headers=all_headers[0])
+        results = {
+            "立即回傳": await _run(client, all_headers, 0),
+            "同步等待": await _run(client, all_headers, 30),
+        }
+        scores_before = len(db.get_user_scores(1, limit=1000))
+        await _check_retry(client, all_headers[0])
+        scores_after = len(db.get_user_scores(1, limit=1000))
+        assert scores_after == scores_before + 1, (scores_before, scores_after)
+
+    await session_finalizer.close()
+    await async_db.close()
+
+    print(f"{args.players} 個玩家同時結束會話，資料庫既有 {args.scores} 筆分數")
+    print(f"{'模式':<8}{'結束請求 p50':>14}{'p95':>10}{'取得判定 p50':>14}{'p95':>10}{'總時間 s':>10}  狀態")
+    for name, result in results.items():
+        ack, verdict = result["ack"], result["verdict"]
+        print(
+            f"{name:<8}{ack['p50_ms']:>12.1f}ms{ack['p95_ms']:>8.1f}ms"
+            f"{verdict['p50_ms']:>12.1f}ms{verdict['p95_ms']:>8.1f}ms{result['elapsed']:>10.2f}  {result['statuses']}"
+        )
+    print("重送結束請求: 回傳同一筆分數記錄，未重複寫入")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
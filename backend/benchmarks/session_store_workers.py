@@ -0,0 +1,131 @@
+"""
+多 worker 會話儲存區負載測試
+以 uvicorn --workers N 啟動伺服器，模擬玩家以短連線（每個請求一條連線，由核心分配到不同 worker）
+開始會話、逐一或批次送出事件、結束會話並查詢摘要，統計「會話不存在」的失敗數、事件吞吐量與延遲。
+memory 儲存區在多 worker 下會因請求落在沒有該會話的 worker 而失敗；sqlite 儲存區應為 0
+
+用法:
+    uv run benchmarks/session_store_workers.py --workers 4 --store sqlite --sessions 200 --events 60
+    uv run benchmarks/session_store_workers.py --workers 4 --store memory
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from _common import create_temp_db, free_port, generate_event_stream, start_server, summarize_latencies, wait_for_server
+
+NOT_FOUND_ERROR = "遊戲會話不存在或已結束"
+
+
+async def _run_session(http, base_url: str, token: str, args, stats: dict):
+    """一個模擬玩家：開始會話、送出事件、結束會話"""
+    headers = {"Authorization": f"Bearer {token}"}
+    async with http.post(f"{base_url}/game/session/start", json={"map_index": 0}, headers=headers) as response:
+        response.raise_for_status()
+        session_id = (await response.json())["session_id"]
+
+    events = generate_event_stream(args.events)
+    if args.batch > 1:
+        requests = [
+            ("/game/events/validate-batch", {"session_id": session_id, "events": events[i : i + args.batch]})
+            for i in range(0, len(events), args.batch)
+        ]
+    else:
+        requests = [("/game/event/validate", {"session_id": session_id, "event": event}) for event in events]
+
+    for path, body in requests:
+        start = time.perf_counter()
+        async with http.post(f"{base_url}{path}", json=body, headers=headers) as response:
+            response.raise_for_status()
+            result = await response.json()
+        stats["latency"].append(time.perf_counter() - start)
+        results = result.get("results", [result])
+        stats["events"] += len(results)
+        stats["not_found"] += sum(1 for r in results if NOT_FOUND_ERROR in r["errors"])
+
+    # 最終分數送 0 讓會話驗證失敗、不寫入分數：JSON 檔案資料庫只適用單一行程，不在此測試範圍
+    end_request = {
+        "session_id": session_id,
+        "victory": True,
+        "final_score": 0,
+        "survival_time": 0,
+        "dots_collected": 0,
+        "ghosts_eaten": 0,
+    }
+    async with http.post(f"{base_url}/game/session/end", json=end_request, headers=headers) as response:
+        response.raise_for_status()
+    # 結束後任一 worker 都應查得到會話摘要
+    async with http.get(f"{base_url}/game/session/{session_id}/stats", headers=headers) as response:
+        stats["ended" if response.status == 200 else "summary_missing"] += 1
+
+
+async def _run_load(base_url: str, tokens: list[str], args) -> dict:
+    import aiohttp
+
+    stats: dict = {"latency": [], "events": 0, "not_found": 0, "ended": 0, "summary_missing": 0, "failed": 0}
+    # 不重用連線，讓每個請求由核心重新分配到任一 worker
+    connector = aiohttp.TCPConnector(limit=args.concurrency, force_close=True)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        await wait_for_server(http, base_url)
+
+        async def player(index: int):
+            try:
+                await _run_session(http, base_url, tokens[index], args, stats)
+            except Exception as e:
+                stats["failed"] += 1
+                if stats["failed"] <= 3:
+                    print(f"會話失敗: {e!r}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(player(i) for i in range(len(tokens))))
+        stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 會話儲存區負載測試")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker 數")
+    parser.add_argument("--store", choices=["memory", "sqlite"], default="sqlite")
+    parser.add_argument("--shards", type=int, default=8, help="sqlite 分片數")
+    parser.add_argument("--sessions", type=int, default=200, help="模擬玩家數")
+    parser.add_argument("--events", type=int, default=60, help="每個會話的事件數")
+    parser.add_argument("--batch", type=int, default=1, help="每個請求的事件數（大於 1 時使用批次驗證）")
+    parser.add_argument("--concurrency", type=int, default=64, help="同時進行的請求上限")
+    args = parser.parse_args()
+
+    db_file = create_temp_db(args.sessions, 0)
+    store_dir = tempfile.mkdtemp(prefix="pacmap-sessions-")
+    port = free_port()
+    env = {
+        "DB_FILE_PATH": db_file,
+        "SESSION_STORE": args.store,
+        "SESSION_STORE_DIR": store_dir,
+        "SESSION_STORE_SHARDS": str(args.shards),
+    }
+    server = start_server(port, env, workers=args.workers)
+    try:
+        from auth import create_access_token
+
+        tokens = [create_access_token(data={"sub": user_id}) for user_id in range(1, args.sessions + 1)]
+        stats = asyncio.run(_run_load(f"http://127.0.0.1:{port}", tokens, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    latency = summarize_latencies(stats["latency"])
+    print(f"儲存區 {args.store}，{args.workers} 個 worker，{args.sessions} 個會話 × {args.events} 事件")
+    print(f"會話: 結束後查得到摘要 {stats['ended']} / 查不到 {stats['summary_missing']} / 請求錯誤 {stats['failed']}")
+    print(
+        f"事件: {stats['events']} 筆，{stats['events'] / stats['elapsed']:.0f} 事件/秒，"
+        f"會話不存在 {stats['not_found']} 筆"
+    )
+    print(
+        f"請求延遲 (ms):  p50 {latency['p50_ms']:8.2f}  p95 {latency['p95_ms']:8.2f}  p99 {latency['p99_ms']:8.2f}"
+        f"  max {latency['max_ms']:8.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
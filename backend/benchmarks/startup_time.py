@@ -0,0 +1,120 @@
+"""
+啟動時間測試
+- 匯入 main 的時間（全新的行程，取中位數），並確認只在使用時才需要的套件沒有在啟動時匯入
+- 以子行程啟動 uvicorn，量測從啟動到 /health 回應（開始接受請求）、/ready 回應（資料庫與地圖快取暖機完成）
+  以及第一個排行榜請求完成的時間
+
+用法:
+    uv run benchmarks/startup_time.py --users 10000 --scores 300000 --runs 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from _common import SRC_DIR, create_temp_db, free_port, generate_osm_grid, seed_map_cache, start_server
+
+# 只在建置地圖、Google 登入時需要的套件，不應在啟動時匯入
+DEFERRED_MODULES = ("aiohttp", "httpx")
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def _import_time(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT % (DEFERRED_MODULES,)],
+        cwd=SRC_DIR,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result: dict = json.loads(output.strip().splitlines()[-1])
+    return result
+
+
+async def _wait_for(client, path: str, deadline: float) -> float:
+    """輪詢 path 直到回應 200，回傳完成的時間（perf_counter）"""
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.get(path)
+            if response.status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.01)
+    raise RuntimeError(f"{path} 未在時限內回應")
+
+
+async def _server_startup(env: dict, cwd: str, timeout: float) -> dict:
+    port = free_port()
+    start = time.perf_counter()
+    server = start_server(port, env, cwd=cwd)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            deadline = start + timeout
+            health = await _wait_for(client, "/health", deadline)
+            # 暖機期間送出的請求：第一個排行榜請求需等待資料庫載入
+            response = await client.get("/game/leaderboard", params={"limit": 10})
+            response.raise_for_status()
+            first_request = time.perf_counter()
+            ready = await _wait_for(client, "/ready", deadline)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"health": health - start, "first_leaderboard": first_request - start, "ready": ready - start}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="啟動時間測試")
+    parser.add_argument("--users", type=int, default=10000, help="資料庫用戶數")
+    parser.add_argument("--scores", type=int, default=300000, help="資料庫分數筆數")
+    parser.add_argument("--grid", type=int, default=20, help="地圖快取的路網大小（grid × grid 個路口）")
+    parser.add_argument("--runs", type=int, default=3, help="重複次數（取中位數）")
+    parser.add_argument("--timeout", type=float, default=300, help="每次啟動的時限（秒）")
+    args = parser.parse_args()
+
+    from map_service import map_service
+
+    workdir = tempfile.mkdtemp(prefix="pacmap-startup-")
+    seed_map_cache(
+        workdir, map_service, list(range(len(map_service.map_configs))), generate_osm_grid(args.grid, args.grid)
+    )
+    env = {
+        "DB_FILE_PATH": create_temp_db(args.users, args.scores),
+        "SESSION_STORE_DIR": os.path.join(workdir, "session_store"),
+    }
+
+    imports = [_import_time(env) for _ in range(args.runs)]
+    import_seconds = statistics.median(result["seconds"] for result in imports)
+    loaded = sorted({module for result in imports for module in result["modules"]})
+
+    runs = [await _server_startup(env, workdir, args.timeout) for _ in range(args.runs)]
+
+    print(
+        f"{args.users} 位用戶、{args.scores} 筆分數、{len(map_service.map_configs)} 張地圖快取，{args.runs} 次取中位數"
+    )
+    print(f"匯入 main:                {import_seconds:>8.2f} s")
+    print(f"啟動時匯入的延遲載入套件: {', '.join(loaded) or '無'}")
+    for key, label in (
+        ("health", "開始接受請求（/health）"),
+        ("first_leaderboard", "第一個排行榜請求完成"),
+        ("ready", "暖機完成（/ready）"),
+    ):
+        print(f"{label:<26}{statistics.median(run[key] for run in runs):>8.2f} s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
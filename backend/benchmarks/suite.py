@@ -0,0 +1,287 @@
+"""
+後端熱點效能測試組
+以合成資料量測主要熱點，結果寫成 JSON 以便比較不同版本：
+- road_network：MapService._generate_road_network 處理棋盤狀 OSM 路網
+- leaderboard：SimpleFileDB 載入百萬筆分數與 get_leaderboard 的各種查詢
+- event_validation：GameValidationService.validate_game_event 逐一驗證長事件序列
+- http：以行程內 ASGI client 對 FastAPI 應用送出請求（循序的延遲分布與並行的吞吐量）
+
+每個項目的 value 為每次操作的秒數（越低越好），--compare 以 value 比較兩次結果
+
+用法:
+    uv run benchmarks/suite.py
+    uv run benchmarks/suite.py --quick --only road_network,event_validation
+    uv run benchmarks/suite.py --output before.json
+    uv run benchmarks/suite.py --compare before.json
+"""
+
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from _common import (
+    build_map_data,
+    create_temp_db,
+    generate_event_stream,
+    generate_osm_grid,
+    percentile,
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def measure(func: Callable[[], object], repeat: int = 5, number: int = 1) -> dict:
+    """執行 repeat 輪、每輪 number 次，回傳每次操作的秒數統計（value 取中位數）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "value": statistics.median(samples),
+        "min": min(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def latency_stats(samples: List[float], elapsed: float) -> dict:
+    """請求延遲統計（秒），value 為平均延遲"""
+    return {
+        "value": statistics.fmean(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "requests": len(samples),
+        "requests_per_s": len(samples) / elapsed,
+    }
+
+
+# === 情境 ===
+
+
+def bench_road_network(args) -> Dict[str, dict]:
+    from map_service import map_service
+
+    results = {}
+    for size in args.grid_sizes:
+        osm_data = generate_osm_grid(size, size)
+        result = measure(functools.partial(map_service._generate_road_network, osm_data), repeat=3)
+        _, valid_positions, _ = map_service._generate_road_network(osm_data)
+        result["positions"] = len(valid_positions)
+        results[f"grid_{size}x{size}"] = result
+    return results
+
+
+def bench_leaderboard(args) -> Dict[str, dict]:
+    from database import SimpleFileDB
+    from leaderboard_rollups import LeaderboardWindow
+
+    db_file = create_temp_db(args.users, args.scores)
+    results = {}
+    start = time.perf_counter()
+    db = SimpleFileDB(db_file)
+    results["load"] = {"value": time.perf_counter() - start, "scores": args.scores}
+
+    queries: Dict[str, Tuple[int, Optional[int], Optional[LeaderboardWindow]]] = {
+        "top10": (10, None, None),
+        "top100": (100, None, None),
+        "top10_map": (10, 1, None),
+        "top10_daily": (10, None, "daily"),
+        "top10_weekly_map": (10, 2, "weekly"),
+        "top10_season": (10, None, "season"),
+    }
+    for name, (limit, map_index, window) in queries.items():
+        results[name] = measure(functools.partial(db.get_leaderboard, limit, map_index, window), repeat=5, number=3)
+    return results
+
+
+def bench_event_validation(args) -> Dict[str, dict]:
+    from game_validation_service import GameValidationService
+    from map_service import map_service
+    from models import GameEvent, GameSessionStartRequest
+
+    build_map_data(map_service, 0, generate_osm_grid(10, 10))
+    events = [GameEvent(**event) for event in generate_event_stream(args.events)]
+
+    results = {}
+    for name, service in (
+        ("validate_event", GameValidationService()),
+        ("validate_event_with_map", GameValidationService(map_service=map_service)),
+    ):
+        samples = []
+        for _ in range(3):
+            session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+            start = time.perf_counter()
+            for event in events:
+                service.validate_game_event(session_id, event)
+            samples.append((time.perf_counter() - start) / len(events))
+        results[name] = {"value": statistics.median(samples), "min": min(samples), "events": len(events)}
+    return results
+
+
+async def bench_http(args) -> Dict[str, dict]:
+    import httpx
+
+    from auth import create_access_token
+    from main import app
+    from map_service import map_service
+
+    build_map_data(map_service, 0, generate_osm_grid(10, 10))
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 1})}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.get("/auth/me", headers=headers)  # 載入資料庫
+        response = await client.post("/game/session/start", json={"map_index": 0}, headers=headers)
+        response.raise_for_status()
+        batch = {"session_id": response.json()["session_id"], "events": generate_event_stream(50)}
+
+        scenarios = {
+            "GET /health": ("GET", "/health", {}),
+            "GET /auth/me": ("GET", "/auth/me", {"headers": headers}),
+            "GET /game/leaderboard": ("GET", "/game/leaderboard", {"params": {"limit": 10}}),
+            "GET /maps/0/data": ("GET", "/maps/0/data", {}),
+            "POST /game/events/validate-batch(50)": (
+                "POST",
+                "/game/events/validate-batch",
+                {"json": batch, "headers": headers},
+            ),
+        }
+        results = {}
+        for name, (method, path, kwargs) in scenarios.items():
+            samples: List[float] = []
+
+            async def worker(count: int, method=method, path=path, kwargs=kwargs, samples=samples):
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = await client.request(method, path, **kwargs)
+                    samples.append(time.perf_counter() - start)
+                    response.raise_for_status()
+
+            # 循序請求的延遲分布
+            start = time.perf_counter()
+            await worker(args.requests)
+            results[name] = latency_stats(samples, time.perf_counter() - start)
+
+            # 並行請求的吞吐量
+            samples = []
+            per_worker = max(1, args.requests // args.concurrency)
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(per_worker, samples=samples) for _ in range(args.concurrency)))
+            results[f"{name} x{args.concurrency}"] = latency_stats(samples, time.perf_counter() - start)
+    return results
+
+
+SCENARIOS: Dict[str, Callable[..., Any]] = {
+    "road_network": bench_road_network,
+    "leaderboard": bench_leaderboard,
+    "event_validation": bench_event_validation,
+    "http": bench_http,
+}
+
+
+# === 結果 ===
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_results(results: Dict[str, Dict[str, dict]], baseline: Dict[str, Dict[str, dict]]):
+    for scenario, cases in results.items():
+        print(f"\n[{scenario}]")
+        for name, result in cases.items():
+            line = f"  {name:<44}{_format_seconds(result['value']):>12}"
+            if "requests_per_s" in result:
+                line += f"  p95 {_format_seconds(result['p95']):>10}  {result['requests_per_s']:>8.0f} req/s"
+            previous = baseline.get(scenario, {}).get(name)
+            if previous:
+                line += f"  基準 {_format_seconds(previous['value']):>10}  x{result['value'] / previous['value']:.2f}"
+            print(line)
+
+
+def _format_seconds(value: float) -> str:
+    if value >= 1:
+        return f"{value:.2f} s"
+    if value >= 1e-3:
+        return f"{value * 1e3:.2f} ms"
+    return f"{value * 1e6:.1f} µs"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="後端熱點效能測試組")
+    parser.add_argument("--only", help="只執行指定的情境（逗號分隔）：" + ",".join(SCENARIOS))
+    parser.add_argument("--quick", action="store_true", help="縮小資料量，快速確認")
+    parser.add_argument("--scores", type=int, help="排行榜情境的分數筆數（預設 1000000，--quick 時 100000）")
+    parser.add_argument("--users", type=int, default=10000, help="排行榜情境的用戶數")
+    parser.add_argument("--events", type=int, help="事件驗證情境的事件數（預設 20000，--quick 時 5000）")
+    parser.add_argument("--requests", type=int, help="HTTP 情境每個路由的請求數（預設 2000，--quick 時 300）")
+    parser.add_argument("--concurrency", type=int, default=20, help="HTTP 情境的並行請求數")
+    parser.add_argument("--output", help="結果 JSON 路徑（預設 benchmarks/results/<時間>.json）")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    args = parser.parse_args()
+
+    args.scores = args.scores or (100_000 if args.quick else 1_000_000)
+    args.events = args.events or (5000 if args.quick else 20000)
+    args.requests = args.requests or (300 if args.quick else 2000)
+    args.grid_sizes = [10, 20] if args.quick else [10, 20, 40]
+    selected = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的情境: {', '.join(sorted(unknown))}")
+
+    # HTTP 情境使用全域資料庫，需在匯入任何後端模組前設定
+    if "http" in selected:
+        os.environ["DB_FILE_PATH"] = create_temp_db(1000, 10_000 if args.quick else 100_000)
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results: Dict[str, Dict[str, dict]] = {}
+    for name in selected:
+        print(f"執行 {name} ...", file=sys.stderr)
+        scenario = SCENARIOS[name]
+        results[name] = await scenario(args) if inspect.iscoroutinefunction(scenario) else scenario(args)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    _print_results(results, baseline)
+    print(f"\n結果已寫入 {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+個人分數索引效能測試
+比較全表掃描與每位用戶索引在重度玩家（每人上萬筆）下的查詢速度
+
+用法:
+    uv run benchmarks/user_scores_index.py --users 50 --games-per-user 10000
+"""
+
+import argparse
+import time
+
+from _common import create_temp_db
+
+
+def _full_scan(db, user_id: int, limit: int):
+    """舊版做法：掃描所有分數後排序"""
+    from models import GameScoreInDB
+
+    user_scores = [GameScoreInDB(**s) for s in db.scores.rows() if s["user_id"] == user_id]
+    user_scores.sort(key=lambda x: x.score, reverse=True)
+    return user_scores[:limit]
+
+
+def _time_per_call(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="個人分數索引效能測試")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--games-per-user", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from database import SimpleFileDB
+
+    db_file = create_temp_db(args.users, args.users * args.games_per_user)
+    start = time.perf_counter()
+    db = SimpleFileDB(db_file)
+    print(f"載入並建立索引: {time.perf_counter() - start:.2f} 秒, 共 {len(db.scores)} 筆分數")
+
+    user_id = 1
+    scan = _time_per_call(lambda: _full_scan(db, user_id, args.limit), max(1, args.repeat // 10))
+    first_page = _time_per_call(lambda: db.get_user_scores_page(user_id, limit=args.limit), args.repeat)
+
+    # 逐頁翻到最深處，量測每一頁的平均成本
+    pages = 0
+    cursor = None
+    start = time.perf_counter()
+    while True:
+        _, cursor = db.get_user_scores_page(user_id, limit=args.limit, cursor=cursor, sort="recent")
+        pages += 1
+        if cursor is None:
+            break
+    per_page = (time.perf_counter() - start) / pages
+
+    print(f"全表掃描（舊版）:        {scan * 1000:8.2f} ms/次")
+    print(f"索引第一頁（依分數）:    {first_page * 1000:8.3f} ms/次")
+    print(f"索引逐頁翻閱（依時間）:  {per_page * 1000:8.3f} ms/頁, 共 {pages} 頁")
+
+
+if __name__ == "__main__":
+    main()
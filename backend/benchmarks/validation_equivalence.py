@@ -0,0 +1,264 @@
+"""
+增量驗證狀態對照測試
+以隨機事件序列（含違規事件）同時餵給目前的 GameValidationService 與舊版掃描事件列表的規則，
+確認每個事件的驗證結果與最終驗證完全一致，並比較長會話下的每事件驗證成本；
+--store sqlite 時目前版本改用 SQLite 會話儲存區（每次驗證都經過序列化與寫回）
+
+用法:
+    uv run benchmarks/validation_equivalence.py --sessions 300 --events 400
+    uv run benchmarks/validation_equivalence.py --store sqlite
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from _common import generate_event_stream
+
+from game_validation_service import GameValidationService
+from models import (
+    GameEvent,
+    GameEventType,
+    GameEventValidationResponse,
+    GameSessionEndRequest,
+    GameSessionStartRequest,
+)
+from session_store import create_session_store
+
+
+class LegacyValidationService(GameValidationService):
+    """舊版規則：每個事件都重新掃描會話的事件列表（作為對照組）
+
+    與目前版本共用其餘規則，只把依賴增量狀態的檢查換回掃描事件列表的寫法。
+    傳入 session 取代 state，讓共用的 _validate_score_change / _validate_event_specific 分派到下列舊版方法。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._states = {}  # session_id -> 驗證狀態
+
+    def _events(self, session):
+        return self._states[session.session_id].events
+
+    def _validate_event(self, session, state, event):
+        self._states[session.session_id] = state
+        response = GameEventValidationResponse(is_valid=True, warnings=[], errors=[])
+        self._validate_basic_constraints(session, event, response)
+        self._validate_score_change(session, event, response)
+        self._validate_timing(session, event, response)
+        self._validate_health_and_lives(event, response)
+        self._validate_event_specific(session, event, response)
+        if response.is_valid:
+            state.record(event)
+        else:
+            session.is_valid = False
+            session.validation_errors.extend(response.errors)
+        return response
+
+    def _validate_score_growth_rate(self, session, event, response):
+        if not self._events(session):
+            return
+        recent_events = [
+            e
+            for e in self._events(session)[-10:]
+            if e.event_type
+            in [GameEventType.DOT_COLLECTED, GameEventType.POWER_PELLET_COLLECTED, GameEventType.GHOST_EATEN]
+        ]
+        if len(recent_events) >= 5:
+            time_span = event.timestamp - recent_events[0].timestamp
+            if time_span > 0:
+                total_score_gain = sum(e.score_after - e.score_before for e in recent_events) + (
+                    event.score_after - event.score_before
+                )
+                score_per_second = total_score_gain / time_span
+                max_reasonable_rate = self.game_rules["max_score_per_minute"] / 60
+                if score_per_second > max_reasonable_rate:
+                    response.warnings.append(
+                        f"分數增長過快: {score_per_second:.1f} 分/秒 (最大合理值: {max_reasonable_rate:.1f})"
+                    )
+
+    def _validate_timing(self, session, event, response):
+        if not self._events(session):
+            return
+        last_event = self._events(session)[-1]
+        time_diff = event.timestamp - last_event.timestamp
+        if time_diff < self.game_rules["min_time_between_events"]:
+            response.warnings.append(f"事件間隔過短: {time_diff:.3f}秒")
+        game_time_diff = last_event.game_time_remaining - event.game_time_remaining
+        if game_time_diff < 0:
+            response.is_valid = False
+            response.errors.append("遊戲時間倒退")
+        elif game_time_diff > time_diff + 2:
+            response.warnings.append(f"遊戲時間變化異常: {game_time_diff}")
+
+    def _validate_game_start(self, session, event, response):
+        if self._events(session):
+            response.warnings.append("遊戲已經開始，重複的開始事件")
+        if event.score_before != 0 or event.score_after != 0:
+            response.is_valid = False
+            response.errors.append("遊戲開始時分數應為0")
+        if event.lives_before != 3 or event.lives_after != 3:
+            response.warnings.append("遊戲開始時生命值異常")
+        if event.health_before != 100 or event.health_after != 100:
+            response.warnings.append("遊戲開始時血量異常")
+
+    def _validate_ghost_eaten(self, session, event, response):
+        recent_power_pellets = [
+            e for e in self._events(session)[-20:] if e.event_type == GameEventType.POWER_PELLET_COLLECTED
+        ]
+        if not recent_power_pellets:
+            response.warnings.append("吃鬼事件但最近沒有吃能量豆記錄")
+        else:
+            time_since_power = event.timestamp - recent_power_pellets[-1].timestamp
+            if time_since_power > 10:
+                response.warnings.append(f"吃鬼事件距離上次能量豆過久: {time_since_power:.1f}秒")
+
+    def _validate_power_pellet_collected(self, session, event, response):
+        recent_power_pellets = [
+            e for e in self._events(session)[-10:] if e.event_type == GameEventType.POWER_PELLET_COLLECTED
+        ]
+        if len(recent_power_pellets) >= 3:
+            time_span = event.timestamp - recent_power_pellets[0].timestamp
+            if time_span < 30:
+                response.warnings.append(f"能量豆收集過於頻繁: 30秒內收集{len(recent_power_pellets) + 1}個")
+
+    def _validate_final_score(self, session, state, request):
+        self._states[session.session_id] = state
+        if not self._events(session):
+            session.validation_errors.append("沒有遊戲事件記錄")
+            session.is_valid = False
+            return
+        expected_base_score = 0
+        for event in self._events(session):
+            if event.event_type == GameEventType.DOT_COLLECTED:
+                expected_base_score += self.game_rules["dot_points"]
+            elif event.event_type == GameEventType.POWER_PELLET_COLLECTED:
+                expected_base_score += self.game_rules["power_pellet_points"]
+            elif event.event_type == GameEventType.GHOST_EATEN:
+                expected_base_score += self.game_rules["ghost_points"]
+        expected_total_score = (
+            expected_base_score + request.survival_time * self.game_rules["survival_bonus_per_second"]
+        )
+        if abs(request.final_score - expected_total_score) > expected_total_score * 0.1:
+            session.validation_errors.append(
+                f"最終分數差異過大: 期望約 {expected_total_score}, 實際 {request.final_score}"
+            )
+            session.is_valid = False
+        if session.end_time:
+            game_duration_minutes = (session.end_time - session.start_time).total_seconds() / 60
+            max_possible_score = game_duration_minutes * self.game_rules["max_score_per_minute"]
+            if request.final_score > max_possible_score:
+                session.validation_errors.append(
+                    f"分數過高，超出合理範圍: {request.final_score} > {max_possible_score}"
+                )
+                session.is_valid = False
+
+
+def _random_session(rng: random.Random, count: int) -> list[GameEvent]:
+    """隨機事件序列：各類型事件、隨機間隔，並混入分數、時間、生命值違規的事件"""
+    points = {
+        GameEventType.DOT_COLLECTED: 10,
+        GameEventType.POWER_PELLET_COLLECTED: 50,
+        GameEventType.GHOST_EATEN: 150,
+    }
+    event_types = list(GameEventType)
+    weights = [1, 60, 8, 8, 2, 1, 1, 3, 2]
+    events = [GameEvent(**e) for e in generate_event_stream(1)]
+    score, timestamp, remaining = 0, 1000.0, 600
+    for _ in range(count - 1):
+        event_type = rng.choices(event_types, weights)[0]
+        timestamp += rng.choice([0.02, 0.05, 0.3, 0.5, 1.0, 3.0, 12.0])
+        remaining = max(0, remaining - rng.choice([0, 0, 1, 1, 2, 5]))
+        gain = points.get(event_type, 0) + rng.choice([0] * 12 + [5, -5, 40, -30])
+        lives_after = 2 if event_type == GameEventType.LIFE_LOST else 3
+        events.append(
+            GameEvent(
+                event_type=event_type,
+                timestamp=timestamp,
+                game_time_remaining=remaining + (5 if rng.random() < 0.03 else 0),
+                score_before=score,
+                score_after=score + gain,
+                lives_before=3 if rng.random() < 0.98 else 2,
+                lives_after=lives_after,
+                health_before=100,
+                health_after=0 if event_type == GameEventType.LIFE_LOST else 100,
+                level=1,
+                map_index=0 if rng.random() < 0.99 else 1,
+            )
+        )
+        score += gain
+    return events
+
+
+def _replay(service: GameValidationService, events: list[GameEvent], end_request: GameSessionEndRequest, start):
+    session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+    with service.store.update(session_id) as record:
+        assert record is not None
+        record.session.start_time = start
+    results = [service.validate_game_event(session_id, event).model_dump() for event in events]
+    is_valid = service.end_game_session(session_id, end_request)
+    stats = service.get_session_stats(session_id)
+    assert stats is not None
+    # 分數上限訊息含結束時間算出的浮點數，兩次執行不會完全相同，只比較前綴
+    errors = [error.split(">")[0] for error in stats["validation_errors"]]
+    return results, is_valid, errors
+
+
+def _check_equivalence(current: GameValidationService, sessions: int, events: int, seed: int) -> int:
+    rng = random.Random(seed)
+    legacy = LegacyValidationService()
+    mismatches = 0
+    for index in range(sessions):
+        stream = _random_session(rng, rng.randint(1, events))
+        score = stream[-1].score_after
+        end_request = GameSessionEndRequest(
+            session_id="",
+            victory=True,
+            final_score=score + rng.choice([0, 0, 50, score]),
+            survival_time=rng.randint(0, 60),
+            dots_collected=0,
+            ghosts_eaten=0,
+        )
+        start = datetime.now() - timedelta(minutes=rng.choice([0, 1, 10]))
+        if _replay(current, stream, end_request, start) != _replay(legacy, stream, end_request, start):
+            mismatches += 1
+            print(f"不一致: 第 {index} 個會話")
+    return mismatches
+
+
+def _time_per_event(service: GameValidationService, events: list[GameEvent]) -> float:
+    session_id = service.start_game_session(1, GameSessionStartRequest(map_index=0))
+    start = time.perf_counter()
+    service.validate_game_events(session_id, events)
+    return (time.perf_counter() - start) / len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量驗證狀態對照測試")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--events", type=int, default=400)
+    parser.add_argument("--long-session", type=int, default=20000, help="計時用的長會話事件數")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--store", choices=["memory", "sqlite"], default="memory", help="目前版本使用的會話儲存區")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as store_dir:
+
+        def current_service() -> GameValidationService:
+            return GameValidationService(store=create_session_store(args.store, store_dir, 8, 10000))
+
+        mismatches = _check_equivalence(current_service(), args.sessions, args.events, args.seed)
+        print(f"對照 {args.sessions} 個隨機會話: {'全部一致' if not mismatches else f'{mismatches} 個不一致'}")
+
+        events = [GameEvent(**e) for e in generate_event_stream(args.long_session)]
+        current = _time_per_event(current_service(), events)
+        legacy = _time_per_event(LegacyValidationService(), events)
+    print(f"每事件驗證（{args.long_session} 事件會話）: 舊版 {legacy * 1e6:.1f} µs / 增量 {current * 1e6:.1f} µs")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
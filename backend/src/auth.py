@@ -2,20 +2,35 @@
 認證相關功能 - Google OAuth 和 JWT
 """
 
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
-import httpx
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, WebSocket, WebSocketException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 
 from config import settings
-from database import db
+from database import async_db
+from google_id_token import GoogleIDTokenVerifier, GoogleKeysUnavailableError, InvalidGoogleTokenError
+from metrics import metrics
 from models import GoogleUserInfo, TokenData, UserCreate, UserInDB
+from token_cache import CachedToken, VerifiedTokenCache
 
 # JWT 相關
 security = HTTPBearer()
+# 已驗證 token 的快取（claims 與用戶資料）
+token_cache = VerifiedTokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+# Google ID token 驗證（快取的公開金鑰與共用的 HTTP client）
+google_token_verifier = GoogleIDTokenVerifier(
+    settings.GOOGLE_CLIENT_ID,
+    mode=settings.GOOGLE_TOKEN_VERIFICATION,
+    tokeninfo_fallback=settings.GOOGLE_TOKENINFO_FALLBACK,
+)
+
+# 認證指標
+TOKEN_CACHE_HITS = metrics.counter("auth_token_cache_hits_total", "命中已驗證 token 快取的次數")
+TOKEN_CACHE_MISSES = metrics.counter("auth_token_cache_misses_total", "需要完整驗證 JWT 的次數")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -35,8 +50,29 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
-    """驗證 JWT token"""
+def decode_access_token(token: str) -> TokenData:
+    """解析並驗證 JWT access token"""
+    return _verify_access_token(token).token_data
+
+
+def _verify_access_token(token: str) -> CachedToken:
+    """取得已驗證 token 的快取項目，未命中時完整驗證並放入快取"""
+    key = token_cache.key(token)
+    entry = token_cache.get(key)
+    if entry is not None:
+        TOKEN_CACHE_HITS.inc()
+        return entry
+
+    TOKEN_CACHE_MISSES.inc()
+    payload = _decode_jwt(token)
+    entry = CachedToken(TokenData(user_id=payload["sub"]), payload["exp"])
+    if entry.expires_at > time.time():
+        token_cache.put(key, entry)
+    return entry
+
+
+def _decode_jwt(token: str) -> dict:
+    """完整驗證 JWT，回傳 sub 已轉為整數、必定帶 exp 的 claims"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -44,7 +80,7 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     )
 
     try:
-        payload = jwt.decode(credentials.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id_str = payload.get("sub")
         if user_id_str is None:
             raise credentials_exception
@@ -55,50 +91,87 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
         except (ValueError, TypeError):
             raise credentials_exception
 
-        token_data = TokenData(user_id=user_id)
+        # 沒有到期時間的 token 不放進快取
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            expires_at = time.time()
     except JWTError:
         raise credentials_exception
 
-    return token_data
+    return {**payload, "sub": user_id, "exp": expires_at}
+
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
+    """驗證 JWT token"""
+    return decode_access_token(credentials.credentials)
 
 
-def get_current_user(token_data: TokenData = Depends(verify_token)) -> UserInDB:
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserInDB:
     """取得當前登入的用戶"""
-    user = db.get_user_by_id(token_data.user_id)
+    return await get_user_for_token(credentials.credentials)
+
+
+async def get_user_for_token(token: str) -> UserInDB:
+    """驗證 token 並取得對應的用戶，用戶記錄未變更時直接使用快取"""
+    entry = _verify_access_token(token)
+    user_id = entry.token_data.user_id
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # 先取版本號再讀取用戶：讀取期間若有變更，下一次請求會因版本號不同而重新讀取
+    version = async_db.user_version(user_id)
+    cached = entry.user
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    user = await async_db.get_user_by_id(user_id)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    entry.user = (version, user)
     return user
 
 
-# Google OAuth 相關
-
+async def get_websocket_user(websocket: WebSocket) -> UserInDB:
+    """WebSocket 連線認證（瀏覽器無法自訂標頭，token 可由查詢參數 token 或 Authorization 標頭提供）"""
+    token = websocket.query_params.get("token")
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
 
-async def verify_google_token(token: str) -> GoogleUserInfo:
-    """驗證 Google ID token 並取得用戶資訊"""
     try:
-        # 使用 Google 的 tokeninfo API 驗證 token
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://oauth2.googleapis.com/tokeninfo?id_token={token}")
+        if not token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        return await get_user_for_token(token)
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail) from e
 
-            if response.status_code != 200:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Google token")
 
-            token_info = response.json()
+# Google OAuth 相關
+
 
-            # 驗證 audience (client_id)
-            if token_info.get("aud") != settings.GOOGLE_CLIENT_ID:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token audience")
+async def verify_google_token(token: str) -> GoogleUserInfo:
+    """驗證 Google ID token 並取得用戶資訊"""
+    import httpx  # 只有登入需要，延遲匯入以縮短啟動時間
 
-            # 建立 GoogleUserInfo 物件
-            return GoogleUserInfo(
-                id=token_info["sub"],
-                email=token_info["email"],
-                name=token_info["name"],
-                picture=token_info.get("picture"),
-                verified_email=token_info.get("email_verified", False),
-            )
+    try:
+        # 以快取的 Google 公開金鑰在本地驗證，必要時改用 tokeninfo API
+        token_info = await google_token_verifier.verify(token)
+
+        # 建立 GoogleUserInfo 物件
+        return GoogleUserInfo(
+            id=token_info["sub"],
+            email=token_info["email"],
+            name=token_info["name"],
+            picture=token_info.get("picture"),
+            verified_email=token_info.get("email_verified", False),
+        )
 
-    except httpx.RequestError:
+    except InvalidGoogleTokenError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+    except (httpx.RequestError, GoogleKeysUnavailableError):
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Unable to verify Google token")
     except KeyError as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token format: missing {e}")
@@ -110,17 +183,17 @@ async def authenticate_google_user(google_token: str) -> UserInDB:
     google_user = await verify_google_token(google_token)
 
     # 檢查用戶是否已存在
-    user = db.get_user_by_google_id(google_user.id)
+    user = await async_db.get_user_by_google_id(google_user.id)
 
     if user is None:
         # 建立新用戶
         user_create = UserCreate(
             google_id=google_user.id, email=google_user.email, name=google_user.name, picture=google_user.picture
         )
-        user = db.create_user(user_create)
+        user = await async_db.create_user(user_create)
 
     # 更新最後登入時間
-    db.update_user_last_login(user.id)
+    await async_db.update_user_last_login(user.id)
 
     return user
 
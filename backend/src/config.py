@@ -18,14 +18,35 @@ class Settings:
     GOOGLE_CLIENT_ID: Optional[str] = os.getenv("GOOGLE_CLIENT_ID")
     GOOGLE_CLIENT_SECRET: Optional[str] = os.getenv("GOOGLE_CLIENT_SECRET")
     GOOGLE_REDIRECT_URI: str = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:8000/auth/google/callback")
+    # Google ID token 驗證方式：jwks 以快取的公開金鑰在本地驗證，tokeninfo 每次呼叫 Google API
+    GOOGLE_TOKEN_VERIFICATION: str = os.getenv("GOOGLE_TOKEN_VERIFICATION", "jwks")
+    # 無法取得公開金鑰時改用 tokeninfo API
+    GOOGLE_TOKENINFO_FALLBACK: bool = os.getenv("GOOGLE_TOKENINFO_FALLBACK", "true").lower() == "true"
 
     # JWT 設定
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 480  # 8 小時，避免遊戲中途過期
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))  # 已驗證 token 快取上限，0 表示停用
 
     # 資料庫設定 (暫時使用檔案，之後可以改為真實資料庫)
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./pac_map.db")
+    DB_FILE_PATH: Optional[str] = os.getenv("DB_FILE_PATH")  # 未設定時使用 backend/pac_map_db.json
+    DB_MAX_WORKERS: int = int(os.getenv("DB_MAX_WORKERS", "4"))  # 資料庫執行緒池大小
+    SCORE_BATCH_WINDOW_MS: float = float(os.getenv("SCORE_BATCH_WINDOW_MS", "5"))  # 分數批次寫入的收集時間窗
+    SCORE_BATCH_MAX_SIZE: int = int(os.getenv("SCORE_BATCH_MAX_SIZE", "100"))  # 單次 flush 的分數上限
+    # 最後登入時間等低價值欄位最多延遲多久落盤（秒），期間的更新合併成一次寫入；0 表示每次更新都立即寫檔
+    USER_ACTIVITY_FLUSH_SECONDS: float = float(os.getenv("USER_ACTIVITY_FLUSH_SECONDS", "30"))
+
+    # 排行榜與地圖配置的回應快取：保留的排行榜查詢數（0 表示不快取）與客戶端快取秒數（Cache-Control max-age）
+    LEADERBOARD_CACHE_SIZE: int = int(os.getenv("LEADERBOARD_CACHE_SIZE", "256"))
+    LEADERBOARD_CACHE_MAX_AGE: int = int(os.getenv("LEADERBOARD_CACHE_MAX_AGE", "5"))
+    MAP_CONFIGS_CACHE_MAX_AGE: int = int(os.getenv("MAP_CONFIGS_CACHE_MAX_AGE", "300"))
+
+    # 時間區間排行榜保留的區間數量（含目前區間），賽季以季度計算
+    LEADERBOARD_DAILY_RETENTION: int = int(os.getenv("LEADERBOARD_DAILY_RETENTION", "7"))
+    LEADERBOARD_WEEKLY_RETENTION: int = int(os.getenv("LEADERBOARD_WEEKLY_RETENTION", "4"))
+    LEADERBOARD_SEASON_RETENTION: int = int(os.getenv("LEADERBOARD_SEASON_RETENTION", "2"))
 
     # CORS 設定
     ALLOWED_ORIGINS: list[str] = [
@@ -42,9 +63,40 @@ class Settings:
         "*",
     ]
 
+    # 遊戲驗證會話設定
+    SESSION_IDLE_TTL_SECONDS: float = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "900"))  # 閒置多久視為放棄
+    SESSION_REAPER_INTERVAL_SECONDS: float = float(os.getenv("SESSION_REAPER_INTERVAL_SECONDS", "60"))
+    MAX_COMPLETED_SESSIONS: int = int(os.getenv("MAX_COMPLETED_SESSIONS", "10000"))  # 保留摘要的已完成會話上限
+    # 已完成會話的事件記錄與摘要寫入此目錄（zstd 或 zlib 壓縮，可用 src/session_replay.py 重播），未設定時不保存
+    SESSION_EVENT_LOG_DIR: Optional[str] = os.getenv("SESSION_EVENT_LOG_DIR")
+    # 會話儲存區：memory 只在單一行程內有效；以多個 worker 執行時改用 sqlite，讓所有 worker 共用會話狀態
+    SESSION_STORE: str = os.getenv("SESSION_STORE", "memory")
+    SESSION_STORE_DIR: Optional[str] = os.getenv("SESSION_STORE_DIR")  # 未設定時使用 backend/session_store
+    SESSION_STORE_SHARDS: int = int(os.getenv("SESSION_STORE_SHARDS", "8"))  # sqlite 分片數（每個分片一個檔案與寫入鎖）
+    SESSION_STORE_MAX_WORKERS: int = int(
+        os.getenv("SESSION_STORE_MAX_WORKERS", "4")
+    )  # 會話驗證與儲存區操作的執行緒池大小
+    # 會話結束管線：結束請求立即回傳，最終驗證與分數寫入由背景 worker 處理
+    SESSION_END_WORKERS: int = int(os.getenv("SESSION_END_WORKERS", "4"))  # 同時處理的結束請求數
+    SESSION_END_QUEUE_SIZE: int = int(os.getenv("SESSION_END_QUEUE_SIZE", "1000"))  # 等待處理的結束請求上限
+    WS_EVENT_QUEUE_SIZE: int = int(os.getenv("WS_EVENT_QUEUE_SIZE", "256"))  # 每條串流連線待驗證事件的上限
+    WS_MAX_EVENTS_PER_FRAME: int = int(os.getenv("WS_MAX_EVENTS_PER_FRAME", "100"))  # 單一回應訊框合併的結果上限
+    # 每 N 個事件記錄一次各驗證規則的耗時（/metrics 的 validation_rule_seconds），0 表示不記錄
+    VALIDATION_TIMING_SAMPLE_RATE: int = int(os.getenv("VALIDATION_TIMING_SAMPLE_RATE", "16"))
+
     # 應用程式設定
     APP_NAME: str = "Pac-Map Backend"
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+    # 記錄每個路由的延遲、請求數與錯誤數（/metrics）
+    REQUEST_METRICS_ENABLED: bool = os.getenv("REQUEST_METRICS_ENABLED", "true").lower() == "true"
+
+    # 效能分析（預設關閉）：設定 PROFILING_TOKEN 後開放 /admin/profile 與 /admin/spans，請求需帶 X-Profiling-Token 標頭
+    PROFILING_TOKEN: Optional[str] = os.getenv("PROFILING_TOKEN")
+    # 設定後收到 SIGUSR2 時取樣 PROFILE_SIGNAL_SECONDS 秒，將 collapsed stacks 寫入此目錄
+    PROFILE_DIR: Optional[str] = os.getenv("PROFILE_DIR")
+    PROFILE_SIGNAL_SECONDS: float = float(os.getenv("PROFILE_SIGNAL_SECONDS", "10"))
+    # 啟動時即開啟熱點方法的區段計時（span_seconds），執行期可由 /admin/spans 切換
+    SPAN_TIMERS_ENABLED: bool = os.getenv("SPAN_TIMERS_ENABLED", "false").lower() == "true"
 
 
 # 建立全域設定實例
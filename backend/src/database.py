@@ -3,139 +3,486 @@
 之後可以替換為真實的資料庫（如 PostgreSQL）
 """
 
+import asyncio
+import bisect
+import functools
 import json
 import os
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Dict, List, Literal, Optional, Sequence, Tuple, TypeVar
 
+from config import settings
+from leaderboard_rollups import LeaderboardRollups, LeaderboardWindow
+from metrics import Histogram, metrics
 from models import GameScore, GameScoreInDB, UserCreate, UserInDB
+from score_store import ScoreStore, datetime_to_micros, is_score_row, micros_to_datetime
+from spans import span
+
+T = TypeVar("T")
+
+ScoreSort = Literal["score", "recent"]
+
+# 載入檔案時每次轉入欄式儲存的分數筆數
+LOAD_CHUNK_SIZE = 10000
+
+# 資料庫指標
+DB_FLUSH_LATENCY = metrics.histogram("db_flush_latency_seconds", "資料庫檔案寫入（含 fsync）耗時")
+DB_SCORE_BATCH_SIZE = metrics.histogram(
+    "db_score_batch_size", "每次 flush 合併的分數筆數", buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+DB_SCORE_BATCH_WAIT = metrics.histogram("db_score_batch_wait_seconds", "分數從提交到落盤確認的等待時間")
+DB_DEFERRED_WRITES = metrics.counter("db_deferred_user_writes_total", "延遲落盤的用戶欄位更新次數（如最後登入時間）")
+DB_DEFERRED_PENDING = metrics.gauge("db_deferred_user_writes_pending", "尚未落盤的延遲用戶欄位更新數")
 
 
 class SimpleFileDB:
-    """簡單的檔案型資料庫"""
+    """簡單的檔案型資料庫
 
-    def __init__(self, db_path: str = "pac_map_db.json"):
-        self.db_path = db_path
-        self.data = self._load_data()
+    用戶資料保留為 dict 列表；分數以欄式的 ScoreStore 儲存。
+    lazy=True 時延後到第一次存取才載入檔案。
+    defer_user_activity=True 時，最後登入時間等低價值欄位只更新記憶體，
+    由下一次寫檔（其他寫入、定期的 flush_deferred 或關閉時）一併落盤，多次更新合併成一次寫入。
+    """
 
-    def _load_data(self) -> dict:
-        """載入資料庫檔案"""
+    def __init__(self, db_path: str = "pac_map_db.json", lazy: bool = False, defer_user_activity: bool = False):
+        self.db_path = db_path
+        self.defer_user_activity = defer_user_activity
+        # 保護 self.data 的鎖（資料操作會在執行緒池中並行執行）
+        self._lock = threading.RLock()
+        # 序列化磁碟寫入，並讓同時到達的寫入共用一次 flush（group commit）
+        self._flush_lock = threading.Lock()
+        self._write_seq = 0
+        self._flushed_seq = 0
+        # 已更新記憶體、尚未落盤的延遲欄位更新數
+        self._deferred_writes = 0
+
+        self._loaded = False
+        self.data: dict = {}
+        # 每位用戶記錄的版本號，用戶資料變更時遞增（供快取判斷是否需要重新讀取）
+        self._user_versions: Dict[int, int] = {}
+        # 排行榜內容的版本號，新增分數或排行榜顯示的用戶欄位變更時遞增（供回應快取判斷是否失效）
+        self.leaderboard_version = 0
+        self.scores = ScoreStore()
+        # 每位用戶的分數索引（皆存列號）：依時間（列號遞增）排序，以及依 (-score, id) 排序
+        self._user_score_rows: Dict[int, array] = {}
+        self._user_score_ranks: Dict[int, array] = {}
+        # 日／週／賽季排行榜彙總
+        self._rollups = self._new_rollups()
+
+        if not lazy:
+            self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        """確保資料已載入"""
+        with self._lock:
+            if self._loaded:
+                return
+            self.data, self.scores = self._load_data()
+            self._build_score_indexes()
+            self._loaded = True
+
+    @span
+    def _load_data(self) -> Tuple[dict, ScoreStore]:
+        """載入資料庫檔案，分數直接解析進欄式儲存"""
         if os.path.exists(self.db_path):
+            store = ScoreStore()
+            pending: List[dict] = []
+
+            def collect_score(obj: dict) -> Optional[dict]:
+                # 分數在解析時分批放入欄位，不保留整份 dict 列表
+                if is_score_row(obj):
+                    pending.append(obj)
+                    if len(pending) >= LOAD_CHUNK_SIZE:
+                        store.extend(pending)
+                        pending.clear()
+                    return None
+                return obj
+
             try:
                 with open(self.db_path, encoding="utf-8") as f:
-                    return json.load(f)
+                    data = json.load(f, object_hook=collect_score)
+                store.extend(pending)
+                data.pop("scores", None)
+                # 舊版檔案沒有會話與分數記錄的對應
+                data.setdefault("session_scores", {})
+                return data, store
             except (json.JSONDecodeError, FileNotFoundError):
                 pass
 
         # 如果檔案不存在或損壞，建立預設結構
-        return {"users": [], "scores": [], "next_user_id": 1, "next_score_id": 1}
+        return {"users": [], "next_user_id": 1, "next_score_id": 1, "session_scores": {}}, ScoreStore()
+
+    @staticmethod
+    def _new_rollups() -> LeaderboardRollups:
+        return LeaderboardRollups(
+            retention={
+                "daily": settings.LEADERBOARD_DAILY_RETENTION,
+                "weekly": settings.LEADERBOARD_WEEKLY_RETENTION,
+                "season": settings.LEADERBOARD_SEASON_RETENTION,
+            }
+        )
+
+    def _rank_key(self, row: int) -> Tuple[int, int]:
+        """分數排序鍵：分數高者在前，同分時較早的記錄在前"""
+        return (-self.scores.scores[row], self.scores.ids[row])
+
+    @span
+    def _build_score_indexes(self):
+        """從分數資料建立每位用戶的索引"""
+        rows_by_user: Dict[int, array] = {}
+        for row, user_id in enumerate(self.scores.user_ids):
+            rows = rows_by_user.get(user_id)
+            if rows is None:
+                rows = rows_by_user[user_id] = array("i")
+            rows.append(row)
+
+        self._user_score_rows = rows_by_user
+        # 一次排序，避免逐筆插入的成本；列號與 id 同樣遞增，穩定排序即可讓同分時較早的記錄在前
+        scores = self.scores.scores
+        self._user_score_ranks = {
+            user_id: array("i", sorted(rows, key=scores.__getitem__, reverse=True))
+            for user_id, rows in rows_by_user.items()
+        }
+
+        # 只彙總仍在保留範圍內的分數
+        self._rollups = self._new_rollups()
+        cutoff = datetime_to_micros(self._rollups.oldest_retained(datetime.now()))
+        for row, created_at in enumerate(self.scores.created_at):
+            if created_at >= cutoff:
+                self._add_to_rollups(row)
+
+    def _add_to_rollups(self, row: int):
+        """將一筆分數加入時間區間彙總（呼叫者需持有鎖）"""
+        self._rollups.add(
+            row,
+            self.scores.user_ids[row],
+            self.scores.map_indexes[row],
+            micros_to_datetime(self.scores.created_at[row]),
+            self.scores.scores,
+        )
+
+    def _index_score(self, user_id: int, row: int):
+        """將一筆分數加入索引（呼叫者需持有鎖）"""
+        if user_id not in self._user_score_rows:
+            self._user_score_rows[user_id] = array("i")
+            self._user_score_ranks[user_id] = array("i")
+        self._user_score_rows[user_id].append(row)
+        bisect.insort(self._user_score_ranks[user_id], row, key=self._rank_key)
 
     def _save_data(self):
         """儲存資料到檔案"""
-        with open(self.db_path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2, default=str)
+        with self._lock:
+            self._write_seq += 1
+            seq = self._write_seq
+        self._flush_through(seq)
+
+    def _flush_through(self, seq: int):
+        """確保序號 seq 之前的所有寫入都已落盤"""
+        with self._flush_lock:
+            # 等待期間其他執行緒的 flush 已經包含這次寫入
+            if self._flushed_seq >= seq:
+                return
+            self._write_file()
+
+    @span
+    def _write_file(self, new_scores: Sequence[dict] = (), new_sessions: Optional[Dict[str, int]] = None):
+        """將目前的資料與尚未套用到記憶體的 new_scores、new_sessions 寫入檔案（呼叫者需持有 _flush_lock）"""
+        # 鎖內只複製欄位，序列化與寫檔在鎖外進行
+        with self._lock:
+            target_seq = self._write_seq
+            users = self._dump_field(self.data["users"])
+            next_user_id = self.data["next_user_id"]
+            next_score_id = self.data["next_score_id"] + len(new_scores)
+            session_scores = self._dump_field({**self.data["session_scores"], **(new_sessions or {})})
+            scores = self.scores.copy()
+            # 用戶列表的快照已包含所有延遲的欄位更新
+            deferred, self._deferred_writes = self._deferred_writes, 0
+        for score_data in new_scores:
+            scores.append(score_data)
+
+        # 先寫入暫存檔再替換，避免寫到一半的檔案
+        start = time.perf_counter()
+        tmp_path = f"{self.db_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(f'{{\n  "users": {users},\n  "scores": [')
+                for i, line in enumerate(scores.iter_json_rows()):
+                    f.write(",\n    " if i else "\n    ")
+                    f.write(line)
+                f.write(f'\n  ],\n  "session_scores": {session_scores},')
+                f.write(f'\n  "next_user_id": {next_user_id},\n  "next_score_id": {next_score_id}\n}}\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.db_path)
+        except BaseException:
+            # 寫入失敗，延遲的更新留待下一次 flush
+            with self._lock:
+                self._deferred_writes += deferred
+            raise
+        self._flushed_seq = target_seq
+        DB_DEFERRED_PENDING.set(self._deferred_writes)
+        DB_FLUSH_LATENCY.observe(time.perf_counter() - start)
+
+    @staticmethod
+    def _dump_field(value) -> str:
+        """序列化頂層欄位，縮排與整體檔案一致"""
+        return json.dumps(value, ensure_ascii=False, indent=2, default=str).replace("\n", "\n  ")
 
     # === 用戶相關操作 ===
 
+    @span
     def get_user_by_google_id(self, google_id: str) -> Optional[UserInDB]:
         """根據 Google ID 取得用戶"""
-        for user_data in self.data["users"]:
-            if user_data["google_id"] == google_id:
-                return UserInDB(**user_data)
+        self._ensure_loaded()
+        with self._lock:
+            for user_data in self.data["users"]:
+                if user_data["google_id"] == google_id:
+                    return UserInDB(**user_data)
         return None
 
+    @span
     def get_user_by_id(self, user_id: int) -> Optional[UserInDB]:
         """根據用戶 ID 取得用戶"""
-        for user_data in self.data["users"]:
-            if user_data["id"] == user_id:
-                return UserInDB(**user_data)
+        self._ensure_loaded()
+        with self._lock:
+            for user_data in self.data["users"]:
+                if user_data["id"] == user_id:
+                    return UserInDB(**user_data)
         return None
 
+    @span
     def create_user(self, user: UserCreate) -> UserInDB:
         """建立新用戶"""
-        user_id = self.data["next_user_id"]
-        self.data["next_user_id"] += 1
-
-        user_data = {
-            "id": user_id,
-            "google_id": user.google_id,
-            "email": user.email,
-            "name": user.name,
-            "picture": user.picture,
-            "created_at": datetime.now(),
-            "last_login": None,
-            "is_active": True,
-        }
-
-        self.data["users"].append(user_data)
+        self._ensure_loaded()
+        with self._lock:
+            user_id = self.data["next_user_id"]
+            self.data["next_user_id"] += 1
+
+            user_data = {
+                "id": user_id,
+                "google_id": user.google_id,
+                "email": user.email,
+                "name": user.name,
+                "picture": user.picture,
+                "created_at": datetime.now(),
+                "last_login": None,
+                "is_active": True,
+            }
+
+            self.data["users"].append(user_data)
+            self._bump_user_version(user_id)
         self._save_data()
 
         return UserInDB(**user_data)
 
     def update_user_last_login(self, user_id: int):
         """更新用戶最後登入時間"""
-        for user_data in self.data["users"]:
-            if user_data["id"] == user_id:
-                user_data["last_login"] = datetime.now()
-                self._save_data()
-                break
-
-    # === 分數相關操作 ===
-
-    def create_score(self, user_id: int, score: GameScore) -> GameScoreInDB:
-        """建立新的分數記錄"""
-        score_id = self.data["next_score_id"]
-        self.data["next_score_id"] += 1
-
-        score_data = {
-            "id": score_id,
-            "user_id": user_id,
-            "score": score.score,
-            "level": score.level,
-            "map_index": score.map_index,
-            "survival_time": score.survival_time,
-            "dots_collected": score.dots_collected,
-            "ghosts_eaten": score.ghosts_eaten,
-            "created_at": datetime.now(),
-        }
-
-        self.data["scores"].append(score_data)
+        self.touch_user(user_id, last_login=datetime.now())
+
+    @span
+    def touch_user(self, user_id: int, **fields) -> bool:
+        """更新用戶的低價值欄位（如最後登入時間），回傳用戶是否存在
+
+        defer_user_activity 時只更新記憶體並記為待落盤，否則立即寫檔
+        """
+        self._ensure_loaded()
+        with self._lock:
+            for user_data in self.data["users"]:
+                if user_data["id"] == user_id:
+                    user_data.update(fields)
+                    self._bump_user_version(user_id)
+                    if "name" in fields or "picture" in fields:
+                        self.leaderboard_version += 1
+                    break
+            else:
+                return False
+            if self.defer_user_activity:
+                self._deferred_writes += 1
+                DB_DEFERRED_WRITES.inc()
+                DB_DEFERRED_PENDING.set(self._deferred_writes)
+                return True
         self._save_data()
+        return True
 
-        return GameScoreInDB(**score_data)
+    def flush_deferred(self) -> int:
+        """將延遲的用戶欄位更新落盤，回傳本次合併的更新數（沒有待落盤的更新時不寫檔）"""
+        with self._lock:
+            pending = self._deferred_writes
+        if pending:
+            self._save_data()
+        return pending
 
-    def get_user_scores(self, user_id: int, limit: int = 10) -> List[GameScoreInDB]:
-        """取得用戶的分數記錄"""
-        user_scores = [
-            GameScoreInDB(**score_data) for score_data in self.data["scores"] if score_data["user_id"] == user_id
-        ]
+    def user_version(self, user_id: int) -> int:
+        """用戶記錄的版本號（O(1)，不需載入或搜尋用戶列表）"""
+        return self._user_versions.get(user_id, 0)
 
-        # 按分數排序，取前 N 筆
-        user_scores.sort(key=lambda x: x.score, reverse=True)
-        return user_scores[:limit]
+    def _bump_user_version(self, user_id: int):
+        self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
 
-    def get_leaderboard(self, limit: int = 10, map_index: Optional[int] = None) -> List[dict]:
-        """取得排行榜（每個用戶只顯示最高分數）"""
-        scores = self.data["scores"]
+    # === 分數相關操作 ===
 
-        # 如果指定地圖，則過濾
-        if map_index is not None:
-            scores = [s for s in scores if s["map_index"] == map_index]
+    def create_score(self, user_id: int, score: GameScore, session_id: Optional[str] = None) -> GameScoreInDB:
+        """建立新的分數記錄，指定 session_id 時同一會話只會寫入一次"""
+        return self.create_scores([(user_id, score, session_id)])[0]
+
+    @span
+    def create_scores(self, entries: List[Tuple[int, GameScore, Optional[str]]]) -> List[GameScoreInDB]:
+        """批次建立分數記錄，整批只寫入一次檔案，回傳的記錄與 entries 順序相同
+
+        新分數先寫入檔案，落盤成功後才加入記憶體中的欄位、索引與 next_score_id；
+        寫入失敗時記憶體維持原狀，失敗的分數不會在之後的 flush 中被寫入。
+        session_id 已有分數記錄（例如會話結束的重試）時不再寫入，直接回傳既有的記錄。
+        """
+        self._ensure_loaded()
+        # 持有 _flush_lock 直到套用完成，其他寫入不會在這段期間分配相同的分數 id 或寫入同一會話
+        with self._flush_lock:
+            with self._lock:
+                created_at = datetime.now()
+                rows: List[dict] = []
+                new_sessions: Dict[str, int] = {}
+                # 每筆 entry 對應的分數 id
+                score_ids: List[int] = []
+                for user_id, score, session_id in entries:
+                    if session_id is not None:
+                        existing_id = self.data["session_scores"].get(session_id, new_sessions.get(session_id))
+                        if existing_id is not None:
+                            score_ids.append(existing_id)
+                            continue
+                    score_data = {
+                        "id": self.data["next_score_id"] + len(rows),
+                        "user_id": user_id,
+                        "score": score.score,
+                        "level": score.level,
+                        "map_index": score.map_index,
+                        "survival_time": score.survival_time,
+                        "dots_collected": score.dots_collected,
+                        "ghosts_eaten": score.ghosts_eaten,
+                        "created_at": created_at,
+                    }
+                    # 整批先檢查，任何一筆超出欄位範圍都不寫入
+                    self.scores.validate(score_data)
+                    rows.append(score_data)
+                    score_ids.append(score_data["id"])
+                    if session_id is not None:
+                        new_sessions[session_id] = score_data["id"]
+
+            if rows:
+                self._write_file(rows, new_sessions)
+
+            with self._lock:
+                for score_data in rows:
+                    row = self.scores.append(score_data)
+                    self._index_score(score_data["user_id"], row)
+                    self._add_to_rollups(row)
+                self.data["next_score_id"] += len(rows)
+                self.data["session_scores"].update(new_sessions)
+                if rows:
+                    self.leaderboard_version += 1
+                created = {score_data["id"]: GameScoreInDB(**score_data) for score_data in rows}
+                return [
+                    created.get(score_id) or GameScoreInDB(**self.scores.row(self._score_row(score_id)))
+                    for score_id in score_ids
+                ]
+
+    def _score_row(self, score_id: int) -> int:
+        """分數 id 對應的列號（id 隨列號遞增，呼叫者需持有鎖）"""
+        return bisect.bisect_left(self.scores.ids, score_id)
+
+    def get_session_score_id(self, session_id: str) -> Optional[int]:
+        """會話寫入的分數記錄 id，尚未寫入時回傳 None"""
+        self._ensure_loaded()
+        with self._lock:
+            score_id: Optional[int] = self.data["session_scores"].get(session_id)
+        return score_id
+
+    def validate_score(self, user_id: int, score: GameScore):
+        """檢查分數能否寫入，超出欄位範圍時拋出 OverflowError"""
+        self.scores.validate({**score.model_dump(), "id": 0, "user_id": user_id, "created_at": datetime.now()})
 
-        # 按用戶分組，每個用戶只保留最高分數
-        user_best_scores: dict[int, dict] = {}
-        for score_data in scores:
-            user_id = score_data["user_id"]
-            if user_id not in user_best_scores or score_data["score"] > user_best_scores[user_id]["score"]:
-                user_best_scores[user_id] = score_data
+    def get_user_scores(self, user_id: int, limit: int = 10) -> List[GameScoreInDB]:
+        """取得用戶的分數記錄"""
+        scores, _ = self.get_user_scores_page(user_id, limit=limit)
+        return scores
+
+    @span
+    def get_user_scores_page(
+        self, user_id: int, limit: int = 10, cursor: Optional[str] = None, sort: ScoreSort = "score"
+    ) -> Tuple[List[GameScoreInDB], Optional[str]]:
+        """分頁取得用戶的分數記錄，回傳 (分數列表, 下一頁 cursor)
+
+        sort="score" 依分數由高到低，sort="recent" 依時間由新到舊。
+        cursor 為上一頁回傳的 next_cursor，格式錯誤時拋出 ValueError。
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if sort == "score":
+                ranks = self._user_score_ranks.get(user_id, array("i"))
+                start = 0
+                if cursor:
+                    last_score, last_id = (int(part) for part in cursor.split(":"))
+                    start = bisect.bisect_right(ranks, (-last_score, last_id), key=self._rank_key)
+                page_rows = ranks[start : start + limit].tolist()
+                has_more = start + limit < len(ranks)
+            else:
+                rows = self._user_score_rows.get(user_id, array("i"))
+                ids = self.scores.ids
+                end = bisect.bisect_left(rows, int(cursor), key=ids.__getitem__) if cursor else len(rows)
+                page_rows = rows[max(0, end - limit) : end].tolist()[::-1]
+                has_more = end - limit > 0
+
+            page = [GameScoreInDB(**self.scores.row(row)) for row in page_rows]
+
+        next_cursor = None
+        if has_more and page:
+            last = page[-1]
+            next_cursor = f"{last.score}:{last.id}" if sort == "score" else str(last.id)
+        return page, next_cursor
+
+    @span
+    def get_leaderboard(
+        self, limit: int = 10, map_index: Optional[int] = None, window: Optional[LeaderboardWindow] = None
+    ) -> List[dict]:
+        """取得排行榜（每個用戶只顯示最高分數），window 指定日／週／賽季排行"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._build_leaderboard(limit, map_index, window)
+
+    def _build_leaderboard(
+        self, limit: int, map_index: Optional[int], window: Optional[LeaderboardWindow] = None
+    ) -> List[dict]:
+        """建立排行榜（呼叫者需持有鎖）"""
+        scores = self.scores.scores
+
+        # 按用戶分組，每個用戶只保留最高分數（列號）
+        user_best_rows: Dict[int, int]
+        if window is not None:
+            user_best_rows = self._rollups.best_rows(window, map_index, datetime.now())
+        elif map_index is None:
+            # 全地圖排行直接取每位用戶分數索引的第一筆
+            user_best_rows = {user_id: ranks[0] for user_id, ranks in self._user_score_ranks.items()}
+        else:
+            user_best_rows = {}
+            for row, (user_id, row_map_index) in enumerate(
+                zip(self.scores.user_ids, self.scores.map_indexes, strict=True)
+            ):
+                if row_map_index != map_index:
+                    continue
+                best_row = user_best_rows.get(user_id)
+                if best_row is None or scores[row] > scores[best_row]:
+                    user_best_rows[user_id] = row
 
         # 將最高分數轉換為列表並按分數排序
-        best_scores = list(user_best_scores.values())
-        best_scores.sort(key=lambda x: x["score"], reverse=True)
+        best_rows = list(user_best_rows.values())
+        best_rows.sort(key=scores.__getitem__, reverse=True)
 
         # 取前 N 筆並加上用戶資訊
         leaderboard = []
-        for i, score_data in enumerate(best_scores[:limit]):
+        for i, row in enumerate(best_rows[:limit]):
+            score_data = self.scores.row(row)
             user = self.get_user_by_id(score_data["user_id"])
             if user:
                 leaderboard.append(
@@ -158,6 +505,160 @@ class SimpleFileDB:
         return map_names[map_index] if map_index < len(map_names) else "未知地圖"
 
 
+class AsyncFileDB:
+    """SimpleFileDB 的非同步介面，將阻塞的資料庫操作移到有界執行緒池執行"""
+
+    def __init__(
+        self, sync_db: SimpleFileDB, max_workers: int = 4, batch_window: float = 0.005, max_batch_size: int = 100
+    ):
+        self.sync_db = sync_db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+        # 分數寫入批次佇列：時間窗內或達到上限的分數合併成一次 flush
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._score_queue: Optional[asyncio.Queue] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        # 每種操作的耗時直方圖（含等待執行緒池的時間）
+        self._operation_timers: Dict[str, Histogram] = {}
+
+    async def _run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在資料庫執行緒池中執行同步操作"""
+        timer = self._operation_timers.get(func.__name__)
+        if timer is None:
+            timer = self._operation_timers[func.__name__] = metrics.histogram(
+                "db_operation_seconds", "資料庫操作耗時（含等待執行緒池）", labels={"operation": func.__name__}
+            )
+        loop = asyncio.get_running_loop()
+        with timer.time():
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def warm_up(self):
+        """在執行緒池中載入資料庫檔案（啟動暖機），之後的查詢不必等待載入"""
+        await self._run(self.sync_db._ensure_loaded)
+
+    async def get_user_by_google_id(self, google_id: str) -> Optional[UserInDB]:
+        return await self._run(self.sync_db.get_user_by_google_id, google_id)
+
+    async def get_user_by_id(self, user_id: int) -> Optional[UserInDB]:
+        return await self._run(self.sync_db.get_user_by_id, user_id)
+
+    def user_version(self, user_id: int) -> int:
+        return self.sync_db.user_version(user_id)
+
+    def leaderboard_version(self) -> int:
+        return self.sync_db.leaderboard_version
+
+    async def create_user(self, user: UserCreate) -> UserInDB:
+        return await self._run(self.sync_db.create_user, user)
+
+    async def update_user_last_login(self, user_id: int):
+        await self._run(self.sync_db.update_user_last_login, user_id)
+
+    async def flush_deferred(self) -> int:
+        return await self._run(self.sync_db.flush_deferred)
+
+    async def run_deferred_flusher(self, interval: float):
+        """背景定期將延遲的用戶欄位更新落盤"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush_deferred()
+            except OSError as e:
+                print(f"延遲的用戶資料寫入失敗，下次重試: {e}")
+
+    async def create_score(self, user_id: int, score: GameScore, session_id: Optional[str] = None) -> GameScoreInDB:
+        """提交分數，等到所屬批次落盤後才回傳；指定 session_id 時同一會話只會寫入一次"""
+        # 先檢查數值範圍，避免無效的分數讓整批寫入失敗
+        self.sync_db.validate_score(user_id, score)
+        queue = self._ensure_score_batcher()
+        future: asyncio.Future[GameScoreInDB] = asyncio.get_running_loop().create_future()
+        await queue.put((user_id, score, session_id, future, time.perf_counter()))
+        return await future
+
+    def _ensure_score_batcher(self) -> asyncio.Queue:
+        """在目前的事件迴圈上啟動批次寫入工作"""
+        if self._score_queue is None or self._batch_task is None or self._batch_task.done():
+            self._score_queue = asyncio.Queue()
+            self._batch_task = asyncio.create_task(self._score_batch_worker(self._score_queue))
+        return self._score_queue
+
+    async def _score_batch_worker(self, queue: asyncio.Queue):
+        """收集分數寫入並批次落盤"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stop_after_batch = False
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    next_item = queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(queue.get(), timeout)
+                except (asyncio.QueueEmpty, TimeoutError):
+                    break
+                if next_item is None:
+                    stop_after_batch = True
+                    break
+                batch.append(next_item)
+
+            await self._flush_score_batch(batch)
+            if stop_after_batch:
+                return
+
+    async def _flush_score_batch(self, batch: list):
+        """寫入一批分數並通知所有提交者"""
+        try:
+            records = await self._run(
+                self.sync_db.create_scores, [(user_id, score, session_id) for user_id, score, session_id, _, _ in batch]
+            )
+        except Exception as e:
+            for *_, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        DB_SCORE_BATCH_SIZE.observe(len(batch))
+        now = time.perf_counter()
+        for record, (*_, future, submitted_at) in zip(records, batch, strict=True):
+            DB_SCORE_BATCH_WAIT.observe(now - submitted_at)
+            if not future.done():
+                future.set_result(record)
+
+    async def get_session_score_id(self, session_id: str) -> Optional[int]:
+        return await self._run(self.sync_db.get_session_score_id, session_id)
+
+    async def get_user_scores(self, user_id: int, limit: int = 10) -> List[GameScoreInDB]:
+        return await self._run(self.sync_db.get_user_scores, user_id, limit)
+
+    async def get_user_scores_page(
+        self, user_id: int, limit: int = 10, cursor: Optional[str] = None, sort: ScoreSort = "score"
+    ) -> Tuple[List[GameScoreInDB], Optional[str]]:
+        return await self._run(self.sync_db.get_user_scores_page, user_id, limit, cursor, sort)
+
+    async def get_leaderboard(
+        self, limit: int = 10, map_index: Optional[int] = None, window: Optional[LeaderboardWindow] = None
+    ) -> List[dict]:
+        return await self._run(self.sync_db.get_leaderboard, limit, map_index, window)
+
+    async def close(self):
+        """寫完佇列中剩餘的分數與延遲的用戶欄位更新，並關閉執行緒池"""
+        if self._score_queue is not None and self._batch_task is not None and not self._batch_task.done():
+            await self._score_queue.put(None)
+            await self._batch_task
+        await self.flush_deferred()
+        self._executor.shutdown(wait=True)
+
+
 # 建立全域資料庫實例
-db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pac_map_db.json")
-db = SimpleFileDB(db_path)
+db_path = settings.DB_FILE_PATH or os.path.join(os.path.dirname(os.path.dirname(__file__)), "pac_map_db.json")
+db = SimpleFileDB(db_path, lazy=True, defer_user_activity=settings.USER_ACTIVITY_FLUSH_SECONDS > 0)
+async_db = AsyncFileDB(
+    db,
+    max_workers=settings.DB_MAX_WORKERS,
+    batch_window=settings.SCORE_BATCH_WINDOW_MS / 1000,
+    max_batch_size=settings.SCORE_BATCH_MAX_SIZE,
+)
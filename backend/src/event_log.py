@@ -0,0 +1,273 @@
+"""
+遊戲事件的精簡儲存
+以平行的固定寬度 array 欄位保存會話的事件記錄，事件類型以整數編碼，
+取代每個事件一個 Pydantic GameEvent 物件；可壓縮後寫入磁碟（安裝 zstandard 時使用 zstd，否則使用 zlib），
+並可附帶一段 JSON 中繼資料（例如會話摘要），不需解壓事件即可讀取
+"""
+
+import json
+import math
+import struct
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union, overload
+
+from models import GameEvent, GameEventType
+
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except ImportError:  # 選用相依套件
+    HAS_ZSTD = False
+
+# 事件類型編碼（依 GameEventType 定義順序，只能在尾端新增類型）
+EVENT_TYPES = tuple(GameEventType)
+EVENT_TYPE_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+# 磁碟格式：檔頭（魔術字、版本、壓縮方式）、中繼資料長度與 JSON、壓縮過的欄位資料
+_MAGIC = b"PMEV"
+_FORMAT_VERSION = 1
+_CODEC_ZLIB = 0
+_CODEC_ZSTD = 1
+_HEADER = struct.Struct("<4sBB")
+_LENGTH = struct.Struct("<I")
+
+_NAN = float("nan")
+
+
+class EventLog:
+    """會話事件的欄式儲存，每一列對應一個收到的事件，accepted 欄標示是否通過驗證
+
+    無法放進固定寬度欄位的少數事件（座標不是 [lat, lng]、數值超出範圍）整筆另外保存；
+    additional_data 只有少數事件會帶，也另外以列號保存。
+    """
+
+    def __init__(self):
+        self.event_types = array("B")
+        self.timestamps = array("d")
+        self.game_time_remaining = array("i")
+        self.latitudes = array("d")  # 沒有座標時為 NaN
+        self.longitudes = array("d")
+        self.score_before = array("q")
+        self.score_after = array("q")
+        self.lives_before = array("i")
+        self.lives_after = array("i")
+        self.health_before = array("d")
+        self.health_after = array("d")
+        self.levels = array("i")
+        self.map_indexes = array("i")
+        self.accepted = array("B")
+        self._additional_data: Dict[int, dict] = {}
+        self._irregular: Dict[int, GameEvent] = {}
+
+    def __len__(self) -> int:
+        return len(self.event_types)
+
+    def _columns(self) -> tuple:
+        return (
+            self.event_types,
+            self.timestamps,
+            self.game_time_remaining,
+            self.latitudes,
+            self.longitudes,
+            self.score_before,
+            self.score_after,
+            self.lives_before,
+            self.lives_after,
+            self.health_before,
+            self.health_after,
+            self.levels,
+            self.map_indexes,
+            self.accepted,
+        )
+
+    def append(self, event: GameEvent, accepted: bool = True):
+        """加入一個事件"""
+        row = len(self.event_types)
+        position = event.player_position
+        if position is None:
+            latitude = longitude = _NAN
+        elif len(position) == 2:
+            latitude, longitude = position
+        else:
+            self._append_irregular(row, event, accepted)
+            return
+
+        # 逐欄寫入；任一欄數值超出範圍時回復已寫入的欄位，整筆事件另外保存
+        try:
+            self.score_before.append(event.score_before)
+            self.score_after.append(event.score_after)
+            self.game_time_remaining.append(event.game_time_remaining)
+            self.lives_before.append(event.lives_before)
+            self.lives_after.append(event.lives_after)
+            self.levels.append(event.level)
+            self.map_indexes.append(event.map_index)
+        except OverflowError:
+            for column in self._columns():
+                del column[row:]
+            self._append_irregular(row, event, accepted)
+            return
+        self.event_types.append(EVENT_TYPE_CODES[event.event_type])
+        self.timestamps.append(event.timestamp)
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+        self.health_before.append(event.health_before)
+        self.health_after.append(event.health_after)
+        self.accepted.append(accepted)
+
+        if event.additional_data is not None:
+            self._additional_data[row] = event.additional_data
+
+    def _append_irregular(self, row: int, event: GameEvent, accepted: bool):
+        """以佔位值寫入欄位（保持列號對齊），實際事件另外保存"""
+        for column in self._columns():
+            column.append(0)
+        self.event_types[row] = EVENT_TYPE_CODES[event.event_type]
+        self.timestamps[row] = event.timestamp
+        self.accepted[row] = accepted
+        self._irregular[row] = event
+
+    def event(self, row: int) -> GameEvent:
+        """還原指定列的事件（資料來自已驗證的事件，不再重新驗證）"""
+        irregular = self._irregular.get(row)
+        if irregular is not None:
+            return irregular
+
+        latitude = self.latitudes[row]
+        return GameEvent.model_construct(
+            event_type=EVENT_TYPES[self.event_types[row]],
+            timestamp=self.timestamps[row],
+            game_time_remaining=self.game_time_remaining[row],
+            player_position=None if math.isnan(latitude) else [latitude, self.longitudes[row]],
+            score_before=self.score_before[row],
+            score_after=self.score_after[row],
+            lives_before=self.lives_before[row],
+            lives_after=self.lives_after[row],
+            health_before=self.health_before[row],
+            health_after=self.health_after[row],
+            level=self.levels[row],
+            map_index=self.map_indexes[row],
+            additional_data=self._additional_data.get(row),
+        )
+
+    @overload
+    def __getitem__(self, index: int) -> GameEvent: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[GameEvent]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[GameEvent, List[GameEvent]]:
+        if isinstance(index, slice):
+            return [self.event(row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("event log index out of range")
+        return self.event(index)
+
+    def __iter__(self) -> Iterator[GameEvent]:
+        for row in range(len(self)):
+            yield self.event(row)
+
+    def accepted_events(self) -> Iterator[GameEvent]:
+        """只列出通過驗證的事件"""
+        accepted = self.accepted
+        for row in range(len(self)):
+            if accepted[row]:
+                yield self.event(row)
+
+    def nbytes(self) -> int:
+        """欄位本身佔用的位元組數（不含另外保存的少數事件）"""
+        return sum(column.itemsize * len(column) for column in self._columns())
+
+    def to_bytes(self) -> bytes:
+        """序列化為未壓縮的位元組"""
+        extras = {
+            "additional_data": {str(row): data for row, data in self._additional_data.items()},
+            "irregular": {str(row): event.model_dump(mode="json") for row, event in self._irregular.items()},
+        }
+        parts = [_LENGTH.pack(len(self))]
+        for column in self._columns():
+            parts.append(column.tobytes())
+        parts.append(json.dumps(extras, ensure_ascii=False).encode("utf-8"))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "EventLog":
+        """由 to_bytes 的輸出還原"""
+        log = cls()
+        (length,) = _LENGTH.unpack_from(data)
+        offset = _LENGTH.size
+        for column in log._columns():
+            size = column.itemsize * length
+            column.frombytes(data[offset : offset + size])
+            offset += size
+
+        extras = json.loads(data[offset:].decode("utf-8"))
+        log._additional_data = {int(row): value for row, value in extras["additional_data"].items()}
+        log._irregular = {int(row): GameEvent(**value) for row, value in extras["irregular"].items()}
+        return log
+
+
+def write_event_log(path: Union[str, Path], log: EventLog, metadata: Optional[dict] = None):
+    """壓縮並寫入事件記錄"""
+    raw = log.to_bytes()
+    if HAS_ZSTD:
+        codec, payload = _CODEC_ZSTD, zstandard.ZstdCompressor().compress(raw)
+    else:
+        codec, payload = _CODEC_ZLIB, zlib.compress(raw, 6)
+    metadata_bytes = json.dumps(metadata, ensure_ascii=False).encode("utf-8") if metadata is not None else b""
+
+    path = Path(path)
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, codec))
+        f.write(_LENGTH.pack(len(metadata_bytes)))
+        f.write(metadata_bytes)
+        f.write(payload)
+    temp_path.replace(path)
+
+
+def _read_header(f, path: Union[str, Path]) -> Tuple[int, Optional[dict]]:
+    """讀取檔頭與中繼資料，回傳 (壓縮方式, 中繼資料)"""
+    magic, version, codec = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC or version != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported event log file: {path}")
+    (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+    metadata = json.loads(f.read(length).decode("utf-8")) if length else None
+    return codec, metadata
+
+
+def read_event_log_metadata(path: Union[str, Path]) -> Optional[dict]:
+    """只讀取 write_event_log 附帶的中繼資料（不解壓事件），檔案不存在或沒有中繼資料時回傳 None"""
+    try:
+        with open(path, "rb") as f:
+            return _read_header(f, path)[1]
+    except FileNotFoundError:
+        return None
+
+
+def read_event_log_with_metadata(path: Union[str, Path]) -> Optional[Tuple[EventLog, Optional[dict]]]:
+    """讀取 write_event_log 寫出的檔案，回傳 (事件記錄, 中繼資料)，檔案不存在時回傳 None"""
+    try:
+        with open(path, "rb") as f:
+            codec, metadata = _read_header(f, path)
+            payload = f.read()
+    except FileNotFoundError:
+        return None
+
+    if codec == _CODEC_ZSTD:
+        if not HAS_ZSTD:
+            raise RuntimeError("zstandard is required to read this event log")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        raw = zlib.decompress(payload)
+    return EventLog.from_bytes(raw), metadata
+
+
+def read_event_log(path: Union[str, Path]) -> Optional[EventLog]:
+    """讀取 write_event_log 寫出的檔案，檔案不存在時回傳 None"""
+    result = read_event_log_with_metadata(path)
+    return result[0] if result is not None else None
@@ -0,0 +1,126 @@
+"""
+遊戲事件串流驗證
+透過 WebSocket 持續接收同一會話的遊戲事件，交由 GameValidationService 驗證並回傳結果
+
+協定：
+- 客戶端每個訊框送出一個 GameEvent 物件，或一個 GameEvent 陣列
+- 伺服器依序為事件編號（seq 從 0 開始），以
+  {"type": "results", "seq": 第一筆編號, "results": [GameEventValidationResponse, ...]} 回傳，
+  驗證積壓時會把多筆結果合併到同一訊框
+- 無法解析的訊框回傳 {"type": "error", "detail": ...}，不佔用事件編號
+- 會話結束或逾時後送出最後的結果並以 1000 關閉連線
+
+背壓：接收端與驗證端之間以固定容量的佇列連接，佇列滿時停止讀取 socket，
+由 TCP 流量控制讓客戶端的送出變慢，而不是在伺服器端無限堆積事件。
+"""
+
+import asyncio
+from typing import List, Union
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+from pydantic import TypeAdapter, ValidationError
+
+from game_validation_service import AsyncGameValidationService
+from metrics import metrics
+from models import GameEvent
+
+# 串流指標
+STREAM_CONNECTIONS = metrics.gauge("event_stream_connections", "進行中的事件串流連線數")
+STREAM_EVENTS = metrics.counter("event_stream_events_total", "透過串流驗證的事件數")
+STREAM_BACKPRESSURE = metrics.counter("event_stream_backpressure_total", "佇列已滿而暫停讀取的次數")
+STREAM_FRAME_SIZE = metrics.histogram(
+    "event_stream_results_per_frame", "每個回應訊框合併的結果數", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+
+_frame_adapter: TypeAdapter[Union[GameEvent, List[GameEvent]]] = TypeAdapter(Union[GameEvent, List[GameEvent]])
+
+
+async def stream_game_events(
+    websocket: WebSocket,
+    service: AsyncGameValidationService,
+    session_id: str,
+    queue_size: int = 256,
+    max_events_per_frame: int = 100,
+):
+    """處理一條已認證、已綁定會話的事件串流連線，直到客戶端斷線或會話結束"""
+    # 佇列項目：GameEvent 或無法解析的訊框錯誤訊息
+    queue: asyncio.Queue[Union[GameEvent, str]] = asyncio.Queue(maxsize=queue_size)
+
+    await websocket.accept()
+    STREAM_CONNECTIONS.inc()
+    receiver = asyncio.create_task(_receive_events(websocket, queue))
+    validator = asyncio.create_task(_validate_and_reply(websocket, service, session_id, queue, max_events_per_frame))
+    try:
+        # 任一端結束（斷線、會話結束或錯誤）就停止另一端
+        await asyncio.wait((receiver, validator), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (receiver, validator):
+            task.cancel()
+        for result in await asyncio.gather(receiver, validator, return_exceptions=True):
+            if isinstance(result, Exception) and not isinstance(result, WebSocketDisconnect):
+                print(f"事件串流錯誤: {session_id}, {result!r}")
+        STREAM_CONNECTIONS.dec()
+
+
+async def _receive_events(websocket: WebSocket, queue: asyncio.Queue):
+    """接收端：解析訊框並放入佇列，佇列滿時等待（不再讀取 socket）"""
+    while True:
+        text = await websocket.receive_text()
+        try:
+            parsed = _frame_adapter.validate_json(text)
+        except ValidationError as e:
+            await _put(queue, f"Invalid game event frame: {e.error_count()} validation error(s)")
+            continue
+
+        for event in parsed if isinstance(parsed, list) else [parsed]:
+            await _put(queue, event)
+
+
+async def _put(queue: asyncio.Queue, item):
+    if queue.full():
+        STREAM_BACKPRESSURE.inc()
+    await queue.put(item)
+
+
+async def _validate_and_reply(
+    websocket: WebSocket,
+    service: AsyncGameValidationService,
+    session_id: str,
+    queue: asyncio.Queue,
+    max_events_per_frame: int,
+):
+    """驗證端：一次取出佇列中已到達的事件批次驗證，依序回傳結果"""
+    seq = 0
+    while True:
+        items = [await queue.get()]
+        while len(items) < max_events_per_frame and not queue.empty():
+            items.append(queue.get_nowait())
+
+        events: List[GameEvent] = []
+        for item in items:
+            if isinstance(item, GameEvent):
+                events.append(item)
+                continue
+            # 先送出錯誤之前的事件結果，維持回應順序
+            seq = await _send_results(websocket, service, session_id, seq, events)
+            events = []
+            await websocket.send_json({"type": "error", "detail": item})
+        seq = await _send_results(websocket, service, session_id, seq, events)
+
+        if await service.get_active_session(session_id) is None:
+            await websocket.close(code=status.WS_1000_NORMAL_CLOSURE, reason="Game session ended")
+            return
+
+
+async def _send_results(
+    websocket: WebSocket, service: AsyncGameValidationService, session_id: str, seq: int, events: List[GameEvent]
+) -> int:
+    """驗證事件並送出結果訊框，回傳下一個事件編號"""
+    if not events:
+        return seq
+
+    results = await service.validate_game_events(session_id, events)
+    await websocket.send_json({"type": "results", "seq": seq, "results": [result.model_dump() for result in results]})
+    STREAM_EVENTS.inc(len(results))
+    STREAM_FRAME_SIZE.observe(len(results))
+    return seq + len(results)
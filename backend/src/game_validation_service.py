@@ -3,10 +3,22 @@
 負責驗證遊戲事件的合理性，防止作弊
 """
 
+import asyncio
+import functools
+import itertools
+import math
+import os
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Optional
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
 
+from config import settings
+from event_log import read_event_log, read_event_log_metadata, write_event_log
+from map_service import MapService, map_service
+from metrics import metrics
 from models import (
     GameEvent,
     GameEventType,
@@ -15,17 +27,75 @@ from models import (
     GameSessionEndRequest,
     GameSessionStartRequest,
 )
+from session_state import DOT_EVENT_TYPES, GHOST_POWER_WINDOW, SessionRecord, SessionValidationState
+from session_store import InMemorySessionStore, SessionStore, create_session_store
+from spans import span
+
+T = TypeVar("T")
+
+# 會話指標
+ACTIVE_SESSIONS = metrics.gauge("validation_active_sessions", "進行中的遊戲會話數")
+COMPLETED_SESSIONS = metrics.gauge("validation_completed_sessions", "保留摘要的已完成會話數")
+EXPIRED_SESSIONS = metrics.counter("validation_sessions_expired_total", "因閒置逾時被回收的進行中會話數")
+EVICTED_SESSIONS = metrics.counter("validation_completed_evicted_total", "因容量上限被淘汰的已完成會話摘要數")
+
+# 每條驗證規則的耗時（單一事件的規則多在微秒等級，只抽樣部分事件計時）
+VALIDATOR_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2)
+VALIDATOR_TIMERS = {
+    name: metrics.histogram(
+        "validation_rule_seconds", "每條驗證規則處理單一事件的耗時", VALIDATOR_BUCKETS, labels={"rule": name}
+    )
+    for name in (
+        "basic_constraints",
+        "score_change",
+        "timing",
+        "health_and_lives",
+        "event_specific",
+        "dot_position",
+        "movement",
+    )
+}
+
+
+class _UntimedRule:
+    """未抽樣的事件不記錄規則耗時"""
+
+    __slots__ = ()
+
+    def observe_since(self, start: float) -> float:
+        return start
+
+
+UNTIMED_VALIDATORS = dict.fromkeys(VALIDATOR_TIMERS, _UntimedRule())
 
 
 class GameValidationService:
     """遊戲驗證服務"""
 
-    def __init__(self):
-        self.active_sessions: Dict[str, GameSession] = {}
-        self.completed_sessions: Dict[str, GameSession] = {}
-
-        # 遊戲規則配置
-        self.game_rules = {
+    def __init__(
+        self,
+        session_idle_ttl: float = 900,
+        max_completed_sessions: int = 10000,
+        event_log_dir: Optional[Union[str, Path]] = None,
+        store: Optional[SessionStore] = None,
+        map_service: Optional[MapService] = None,
+        timing_sample_rate: int = 0,
+    ):
+        # 會話儲存區：預設存在行程內，多 worker 部署時改用共用的儲存區
+        self.store = store if store is not None else InMemorySessionStore(max_completed_sessions)
+        self.session_idle_ttl = session_idle_ttl
+        # 提供地圖位置索引，用來比對收集事件的位置（None 表示不檢查）
+        self.map_service = map_service
+        # 已完成會話的事件記錄（含被拒絕的事件）與摘要壓縮後寫入此目錄（None 表示不保存），可用 session_replay.py 重播
+        self.event_log_dir = Path(event_log_dir) if event_log_dir else None
+        if self.event_log_dir:
+            self.event_log_dir.mkdir(parents=True, exist_ok=True)
+        # 每 timing_sample_rate 個事件記錄一次各驗證規則的耗時（0 表示不記錄）
+        self.timing_sample_rate = timing_sample_rate
+        self._event_counter = itertools.count(1)
+
+        # 遊戲規則配置（分數為整數，速度與容許值可為小數）
+        self.game_rules: Dict[str, Any] = {
             "dot_points": 10,
             "power_pellet_points": 50,
             "ghost_points": 150,
@@ -35,8 +105,14 @@ class GameValidationService:
             "survival_bonus_per_second": 10,
             "max_score_per_minute": 5000,  # 防止異常高分
             "min_time_between_events": 0.1,  # 最小事件間隔（秒）
+            "max_dot_distance": 15,  # 收集事件位置與豆子的最大距離（公尺，前端收集半徑為 5 公尺）
+            "max_player_speed": 60,  # 玩家最大移動速度（公尺/秒，前端 PACMAN_BASE_SPEED）
+            "movement_tolerance": 1.5,  # 移動距離的容許倍數（事件時間戳與網路延遲的誤差）
+            "movement_slack": 20,  # 移動距離的固定容許值（公尺）
+            "road_snap_distance": 10,  # 座標對應到路網節點的最大距離（公尺，路段細分為 20 公尺）
         }
 
+    @span
     def start_game_session(self, user_id: int, request: GameSessionStartRequest) -> str:
         """開始新的遊戲會話"""
         session_id = str(uuid.uuid4())
@@ -46,80 +122,190 @@ class GameValidationService:
             user_id=user_id,
             map_index=request.map_index,
             start_time=datetime.now(),
-            events=[],
             is_valid=True,
             validation_errors=[],
         )
 
-        self.active_sessions[session_id] = session
+        self.store.create(SessionRecord(session, SessionValidationState(), time.time()))
+        self._update_session_gauges()
 
         print(f"開始新遊戲會話: {session_id}, 用戶: {user_id}, 地圖: {request.map_index}")
         return session_id
 
+    def get_active_session(self, session_id: str) -> Optional[GameSession]:
+        """取得進行中的會話"""
+        record = self.store.get(session_id)
+        return record.session if record is not None else None
+
     def validate_game_event(self, session_id: str, event: GameEvent) -> GameEventValidationResponse:
         """驗證遊戲事件"""
-        if session_id not in self.active_sessions:
-            return GameEventValidationResponse(is_valid=False, errors=["遊戲會話不存在或已結束"])
-
-        session = self.active_sessions[session_id]
+        return self.validate_game_events(session_id, [event])[0]
+
+    @span
+    def validate_game_events(self, session_id: str, events: List[GameEvent]) -> List[GameEventValidationResponse]:
+        """依序驗證同一會話的多個事件，結果與逐一呼叫 validate_game_event 相同"""
+        with self.store.update(session_id) as record:
+            if record is None:
+                return [GameEventValidationResponse(is_valid=False, errors=["遊戲會話不存在或已結束"]) for _ in events]
+            return [self._validate_event(record.session, record.state, event) for event in events]
+
+    @span
+    def _validate_event(
+        self, session: GameSession, state: SessionValidationState, event: GameEvent
+    ) -> GameEventValidationResponse:
+        """對單一事件執行所有驗證規則"""
         response = GameEventValidationResponse(is_valid=True, warnings=[], errors=[])
+        sampled = self.timing_sample_rate > 0 and next(self._event_counter) % self.timing_sample_rate == 0
+        timers = VALIDATOR_TIMERS if sampled else UNTIMED_VALIDATORS
+        start = time.perf_counter() if sampled else 0.0
 
         # 基本驗證
         self._validate_basic_constraints(session, event, response)
+        start = timers["basic_constraints"].observe_since(start)
 
         # 分數驗證
-        self._validate_score_change(session, event, response)
+        self._validate_score_change(state, event, response)
+        start = timers["score_change"].observe_since(start)
 
         # 時間驗證
-        self._validate_timing(session, event, response)
+        self._validate_timing(state, event, response)
+        start = timers["timing"].observe_since(start)
 
         # 生命值驗證
-        self._validate_health_and_lives(session, event, response)
+        self._validate_health_and_lives(event, response)
+        start = timers["health_and_lives"].observe_since(start)
 
         # 事件特定驗證
-        self._validate_event_specific(session, event, response)
+        self._validate_event_specific(state, event, response)
+        start = timers["event_specific"].observe_since(start)
+
+        # 收集位置驗證
+        dot = self._validate_dot_position(session, state, event, response)
+        start = timers["dot_position"].observe_since(start)
+
+        # 移動距離驗證
+        self._validate_movement(session, state, event, response)
+        timers["movement"].observe_since(start)
 
         # 如果驗證通過，添加事件到會話
         if response.is_valid:
-            session.events.append(event)
+            state.record(event, dot)
         else:
+            state.record_rejected(event)
             session.is_valid = False
             session.validation_errors.extend(response.errors)
 
         return response
 
-    def end_game_session(self, session_id: str, request: GameSessionEndRequest) -> bool:
-        """結束遊戲會話並進行最終驗證"""
-        if session_id not in self.active_sessions:
-            return False
+    @span
+    def end_game_session(
+        self, session_id: str, request: GameSessionEndRequest, end_time: Optional[datetime] = None
+    ) -> Optional[bool]:
+        """結束遊戲會話並進行最終驗證，回傳是否有效，會話不存在或已結束時回傳 None
+
+        end_time 預設為現在（重播封存的會話時使用原本的結束時間）
+        """
+        with self.store.update(session_id) as record:
+            if record is None:
+                return None
 
-        session = self.active_sessions[session_id]
-        session.end_time = datetime.now()
-        session.final_score = request.final_score
+            session = record.session
+            session.end_time = end_time or datetime.now()
+            session.final_score = request.final_score
 
-        # 最終驗證
-        self._validate_final_score(session, request)
+            # 最終驗證
+            self._validate_final_score(session, record.state, request)
+            summary = self._session_summary(session, record.state)
 
         # 移動到已完成會話
-        self.completed_sessions[session_id] = session
-        del self.active_sessions[session_id]
+        self._complete_session(session_id, summary, request)
 
         print(f"結束遊戲會話: {session_id}, 最終分數: {request.final_score}, 有效: {session.is_valid}")
         return session.is_valid
 
     def get_session_stats(self, session_id: str) -> Optional[Dict]:
         """獲取會話統計信息"""
-        session = self.active_sessions.get(session_id) or self.completed_sessions.get(session_id)
-        if not session:
+        record = self.store.get(session_id)
+        if record is not None:
+            return self._session_summary(record.session, record.state)
+        summary = self.store.get_summary(session_id)
+        if summary is None and self.event_log_dir is not None:
+            # 摘要已被淘汰時改讀封存檔
+            metadata = read_event_log_metadata(self._event_log_path(session_id))
+            summary = metadata["summary"] if metadata else None
+        return summary
+
+    def get_session_events(self, session_id: str) -> Optional[List[GameEvent]]:
+        """取得會話已接受的事件（進行中的會話，或已寫入磁碟的已完成會話），可用於重播"""
+        log = self.store.events(session_id)
+        if log is not None:
+            return list(log.accepted_events())
+
+        if self.event_log_dir is None:
             return None
+        log = read_event_log(self._event_log_path(session_id))
+        return list(log.accepted_events()) if log is not None else None
+
+    @span
+    def reap_expired_sessions(self, now: Optional[float] = None) -> int:
+        """回收閒置超過 TTL 的進行中會話，回傳回收數量"""
+        now = time.time() if now is None else now
+        expired = []
+        for session_id in self.store.idle_session_ids(now - self.session_idle_ttl):
+            with self.store.update(session_id, touch=False) as record:
+                # 取得鎖之後再確認一次：會話可能已被其他 worker 結束或剛收到事件
+                if record is None or now - record.last_activity <= self.session_idle_ttl:
+                    continue
+                record.session.is_valid = False
+                record.session.validation_errors.append("遊戲會話閒置逾時")
+                summary = self._session_summary(record.session, record.state)
+            self._complete_session(session_id, summary)
+            expired.append(session_id)
+
+        if expired:
+            EXPIRED_SESSIONS.inc(len(expired))
+            print(f"回收閒置遊戲會話: {len(expired)} 個")
+        return len(expired)
+
+    def _complete_session(self, session_id: str, summary: Dict, end_request: Optional[GameSessionEndRequest] = None):
+        """將會話移出進行中列表，只保留摘要；end_request 為 None 表示會話因閒置逾時結束"""
+        log, evicted = self.store.complete(session_id, summary)
+        if log is None:
+            # 已被其他 worker 結束
+            return
 
+        if self.event_log_dir is not None:
+            try:
+                metadata = {
+                    "summary": summary,
+                    "end_request": end_request.model_dump(mode="json") if end_request is not None else None,
+                }
+                write_event_log(self._event_log_path(session_id), log, metadata)
+            except OSError as e:
+                print(f"寫入會話事件記錄失敗: {session_id}, {e}")
+
+        if evicted:
+            EVICTED_SESSIONS.inc(evicted)
+        self._update_session_gauges()
+
+    def _update_session_gauges(self):
+        active, completed = self.store.counts()
+        ACTIVE_SESSIONS.set(active)
+        COMPLETED_SESSIONS.set(completed)
+
+    def _event_log_path(self, session_id: str) -> Path:
+        assert self.event_log_dir is not None
+        return self.event_log_dir / f"{session_id}.evlog"
+
+    def _session_summary(self, session: GameSession, state: SessionValidationState) -> Dict:
+        """會話統計摘要"""
         return {
-            "session_id": session_id,
+            "session_id": session.session_id,
             "user_id": session.user_id,
             "map_index": session.map_index,
             "start_time": session.start_time.isoformat(),
             "end_time": session.end_time.isoformat() if session.end_time else None,
-            "event_count": len(session.events),
+            "event_count": state.event_count,
             "final_score": session.final_score,
             "is_valid": session.is_valid,
             "validation_errors": session.validation_errors,
@@ -149,10 +335,12 @@ class GameValidationService:
             response.is_valid = False
             response.errors.append(f"血量異常: {event.health_after}")
 
-    def _validate_score_change(self, session: GameSession, event: GameEvent, response: GameEventValidationResponse):
+    def _validate_score_change(
+        self, state: SessionValidationState, event: GameEvent, response: GameEventValidationResponse
+    ):
         """分數變化驗證"""
         score_change = event.score_after - event.score_before
-        expected_score_change = 0
+        expected_score_change: int = 0
 
         # 根據事件類型計算期望的分數變化
         if event.event_type == GameEventType.DOT_COLLECTED:
@@ -182,32 +370,23 @@ class GameValidationService:
             response.errors.append(f"分數異常減少: {score_change}")
 
         # 檢查分數增長速度
-        self._validate_score_growth_rate(session, event, response)
+        self._validate_score_growth_rate(state, event, response)
 
         response.expected_score = event.score_before + expected_score_change
         response.score_difference = score_change - expected_score_change
 
     def _validate_score_growth_rate(
-        self, session: GameSession, event: GameEvent, response: GameEventValidationResponse
+        self, state: SessionValidationState, event: GameEvent, response: GameEventValidationResponse
     ):
         """驗證分數增長速度"""
-        if not session.events:
+        if not state.event_count:
             return
 
-        # 計算最近一段時間的分數增長
-        recent_events = [
-            e
-            for e in session.events[-10:]
-            if e.event_type
-            in [GameEventType.DOT_COLLECTED, GameEventType.POWER_PELLET_COLLECTED, GameEventType.GHOST_EATEN]
-        ]
-
-        if len(recent_events) >= 5:
-            time_span = event.timestamp - recent_events[0].timestamp
+        # 最近一段時間的分數增長（由增量狀態維護，不需掃描事件）
+        if len(state.recent_scoring) >= 5:
+            time_span = event.timestamp - state.recent_scoring[0][1]
             if time_span > 0:
-                total_score_gain = sum(e.score_after - e.score_before for e in recent_events) + (
-                    event.score_after - event.score_before
-                )
+                total_score_gain = state.recent_scoring_gain + (event.score_after - event.score_before)
 
                 score_per_second = total_score_gain / time_span
                 max_reasonable_rate = self.game_rules["max_score_per_minute"] / 60
@@ -217,27 +396,26 @@ class GameValidationService:
                         f"分數增長過快: {score_per_second:.1f} 分/秒 (最大合理值: {max_reasonable_rate:.1f})"
                     )
 
-    def _validate_timing(self, session: GameSession, event: GameEvent, response: GameEventValidationResponse):
+    def _validate_timing(self, state: SessionValidationState, event: GameEvent, response: GameEventValidationResponse):
         """時間驗證"""
-        if not session.events:
+        if not state.event_count:
             return
 
-        last_event = session.events[-1]
-        time_diff = event.timestamp - last_event.timestamp
+        time_diff = event.timestamp - state.last_timestamp
 
         # 檢查事件間隔
         if time_diff < self.game_rules["min_time_between_events"]:
             response.warnings.append(f"事件間隔過短: {time_diff:.3f}秒")
 
         # 檢查遊戲時間變化
-        game_time_diff = last_event.game_time_remaining - event.game_time_remaining
+        game_time_diff = state.last_game_time_remaining - event.game_time_remaining
         if game_time_diff < 0:
             response.is_valid = False
             response.errors.append("遊戲時間倒退")
         elif game_time_diff > time_diff + 2:  # 允許2秒誤差
             response.warnings.append(f"遊戲時間變化異常: {game_time_diff}")
 
-    def _validate_health_and_lives(self, session: GameSession, event: GameEvent, response: GameEventValidationResponse):
+    def _validate_health_and_lives(self, event: GameEvent, response: GameEventValidationResponse):
         """生命值和血量驗證"""
         lives_change = event.lives_after - event.lives_before
         health_change = event.health_after - event.health_before
@@ -263,20 +441,111 @@ class GameValidationService:
             if abs(health_change) < 0.1:
                 response.warnings.append("血量變化事件但變化量很小")
 
-    def _validate_event_specific(self, session: GameSession, event: GameEvent, response: GameEventValidationResponse):
+    def _validate_event_specific(
+        self, state: SessionValidationState, event: GameEvent, response: GameEventValidationResponse
+    ):
         """事件特定驗證"""
         if event.event_type == GameEventType.GAME_START:
-            self._validate_game_start(session, event, response)
+            self._validate_game_start(state, event, response)
         elif event.event_type == GameEventType.LEVEL_COMPLETED:
-            self._validate_level_completion(session, event, response)
+            self._validate_level_completion(event, response)
         elif event.event_type == GameEventType.GHOST_EATEN:
-            self._validate_ghost_eaten(session, event, response)
+            self._validate_ghost_eaten(state, event, response)
         elif event.event_type == GameEventType.POWER_PELLET_COLLECTED:
-            self._validate_power_pellet_collected(session, event, response)
+            self._validate_power_pellet_collected(state, event, response)
+
+    def _validate_dot_position(
+        self,
+        session: GameSession,
+        state: SessionValidationState,
+        event: GameEvent,
+        response: GameEventValidationResponse,
+    ) -> Optional[int]:
+        """將收集事件的位置對應到地圖上尚未被收集的豆子，回傳該位置的索引"""
+        if event.event_type not in DOT_EVENT_TYPES or self.map_service is None:
+            return None
+        position_index = self.map_service.get_position_index(session.map_index)
+        if position_index is None:
+            # 地圖尚未載入到此行程，無法比對
+            return None
 
-    def _validate_game_start(self, session: GameSession, event: GameEvent, response: GameEventValidationResponse):
+        if event.player_position is None or len(event.player_position) != 2:
+            response.is_valid = False
+            response.errors.append("收集事件缺少玩家位置")
+            return None
+
+        max_distance = self.game_rules["max_dot_distance"]
+        candidates = position_index.within(event.player_position, max_distance)
+        for _, dot in candidates:
+            if dot not in state.consumed_dots:
+                return dot
+
+        response.is_valid = False
+        if candidates:
+            response.errors.append("重複收集同一位置的豆子")
+        else:
+            response.errors.append(f"收集位置附近 {max_distance} 公尺內沒有豆子")
+        return None
+
+    def _validate_movement(
+        self,
+        session: GameSession,
+        state: SessionValidationState,
+        event: GameEvent,
+        response: GameEventValidationResponse,
+    ):
+        """檢查與上一個座標之間沿道路的距離是否超過玩家最大速度可移動的距離"""
+        if state.last_position is None or event.player_position is None or len(event.player_position) != 2:
+            return
+        if self.map_service is None:
+            return
+        road_graph = self.map_service.get_road_graph(session.map_index)
+        if road_graph is None:
+            return
+
+        last_lat, last_lng, last_timestamp = state.last_position
+        elapsed = max(0.0, event.timestamp - last_timestamp)
+        allowed = (
+            self.game_rules["max_player_speed"] * elapsed * self.game_rules["movement_tolerance"]
+            + self.game_rules["movement_slack"]
+        )
+
+        # 直線距離是道路距離的下限，超過時不需搜尋路網
+        distance = self._straight_distance(last_lat, last_lng, event.player_position)
+        if distance <= allowed:
+            snap_distance = self.game_rules["road_snap_distance"]
+            source = road_graph.nearest_node((last_lat, last_lng), snap_distance)
+            target = road_graph.nearest_node(event.player_position, snap_distance)
+            if source is None or target is None:
+                # 座標不在路網上，只能以直線距離判斷
+                return
+            # 座標到節點的偏移最多讓道路距離縮短兩段偏移的長度
+            offset = source[0] + target[0]
+            road_distance = road_graph.distance(source[1], target[1], allowed + offset)
+            if road_distance is None or road_distance - offset <= allowed:
+                return
+            distance = road_distance - offset
+
+        response.is_valid = False
+        if math.isinf(distance):
+            response.errors.append(f"移動距離異常: {elapsed:.2f} 秒內無法沿道路抵達 (上限 {allowed:.0f} 公尺)")
+        else:
+            response.errors.append(
+                f"移動距離異常: {elapsed:.2f} 秒內移動 {distance:.0f} 公尺 (上限 {allowed:.0f} 公尺)"
+            )
+
+    @staticmethod
+    def _straight_distance(lat: float, lng: float, position: List[float]) -> float:
+        """兩點間的直線距離（公尺），與 MapService._calculate_distance 相同的近似"""
+        lat_meters = (position[0] - lat) * 111000
+        lng_meters = (position[1] - lng) * 111000 * math.cos(math.radians(lat))
+        return math.hypot(lat_meters, lng_meters)
+
+    def _validate_game_start(
+        self, state: SessionValidationState, event: GameEvent, response: GameEventValidationResponse
+    ):
         """驗證遊戲開始事件"""
-        if session.events:
+        if state.event_count:
             response.warnings.append("遊戲已經開始，重複的開始事件")
 
         if event.score_before != 0 or event.score_after != 0:
@@ -289,7 +558,7 @@ class GameValidationService:
         if event.health_before != 100 or event.health_after != 100:
             response.warnings.append("遊戲開始時血量異常")
 
-    def _validate_level_completion(self, session: GameSession, event: GameEvent, response: GameEventValidationResponse):
+    def _validate_level_completion(self, event: GameEvent, response: GameEventValidationResponse):
         """驗證關卡完成事件"""
         if event.additional_data:
             dots_remaining = event.additional_data.get("dots_remaining", 0)
@@ -301,47 +570,47 @@ class GameValidationService:
             if dots_collected_this_level < 10:
                 response.warnings.append(f"關卡完成但收集豆子數量過少: {dots_collected_this_level}")
 
-    def _validate_ghost_eaten(self, session: GameSession, event: GameEvent, response: GameEventValidationResponse):
+    def _validate_ghost_eaten(
+        self, state: SessionValidationState, event: GameEvent, response: GameEventValidationResponse
+    ):
         """驗證吃鬼事件"""
         # 檢查是否在能量模式中
-        recent_power_pellets = [e for e in session.events[-20:] if e.event_type == GameEventType.POWER_PELLET_COLLECTED]
+        last_power_pellet_time = state.power_pellet_within(GHOST_POWER_WINDOW)
 
-        if not recent_power_pellets:
+        if last_power_pellet_time is None:
             response.warnings.append("吃鬼事件但最近沒有吃能量豆記錄")
         else:
-            last_power_pellet = recent_power_pellets[-1]
-            time_since_power = event.timestamp - last_power_pellet.timestamp
+            time_since_power = event.timestamp - last_power_pellet_time
             if time_since_power > 10:  # 能量模式通常持續10秒
                 response.warnings.append(f"吃鬼事件距離上次能量豆過久: {time_since_power:.1f}秒")
 
     def _validate_power_pellet_collected(
-        self, session: GameSession, event: GameEvent, response: GameEventValidationResponse
+        self, state: SessionValidationState, event: GameEvent, response: GameEventValidationResponse
     ):
         """驗證能量豆收集事件"""
         # 檢查能量豆收集頻率
-        recent_power_pellets = [e for e in session.events[-10:] if e.event_type == GameEventType.POWER_PELLET_COLLECTED]
+        recent_power_pellets = state.recent_power_pellets
 
         if len(recent_power_pellets) >= 3:
-            time_span = event.timestamp - recent_power_pellets[0].timestamp
+            time_span = event.timestamp - recent_power_pellets[0][1]
             if time_span < 30:  # 30秒內收集3個能量豆可能異常
                 response.warnings.append(f"能量豆收集過於頻繁: 30秒內收集{len(recent_power_pellets) + 1}個")
 
-    def _validate_final_score(self, session: GameSession, request: GameSessionEndRequest):
+    def _validate_final_score(
+        self, session: GameSession, state: SessionValidationState, request: GameSessionEndRequest
+    ):
         """最終分數驗證"""
-        if not session.events:
+        if not state.event_count:
             session.validation_errors.append("沒有遊戲事件記錄")
             session.is_valid = False
             return
 
-        # 計算基於事件的期望分數
-        expected_base_score = 0
-        for event in session.events:
-            if event.event_type == GameEventType.DOT_COLLECTED:
-                expected_base_score += self.game_rules["dot_points"]
-            elif event.event_type == GameEventType.POWER_PELLET_COLLECTED:
-                expected_base_score += self.game_rules["power_pellet_points"]
-            elif event.event_type == GameEventType.GHOST_EATEN:
-                expected_base_score += self.game_rules["ghost_points"]
+        # 計算基於事件的期望分數（依各類型事件數量）
+        expected_base_score = (
+            state.type_counts[GameEventType.DOT_COLLECTED] * self.game_rules["dot_points"]
+            + state.type_counts[GameEventType.POWER_PELLET_COLLECTED] * self.game_rules["power_pellet_points"]
+            + state.type_counts[GameEventType.GHOST_EATEN] * self.game_rules["ghost_points"]
+        )
 
         # 計算生存獎勵
         survival_bonus = request.survival_time * self.game_rules["survival_bonus_per_second"]
@@ -366,5 +635,70 @@ class GameValidationService:
                 session.is_valid = False
 
 
+class AsyncGameValidationService:
+    """GameValidationService 的非同步介面，將讀寫會話儲存區的操作移到有界執行緒池執行
+
+    SQLite 儲存區的每次更新都要取得分片的寫入鎖（可能等待其他 worker 行程）並序列化整個驗證狀態，
+    不能在事件迴圈上執行
+    """
+
+    def __init__(self, service: GameValidationService, max_workers: int = 4):
+        self.service = service
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session")
+
+    async def _run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在執行緒池中執行同步操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def start_game_session(self, user_id: int, request: GameSessionStartRequest) -> str:
+        return await self._run(self.service.start_game_session, user_id, request)
+
+    async def get_active_session(self, session_id: str) -> Optional[GameSession]:
+        return await self._run(self.service.get_active_session, session_id)
+
+    async def validate_game_event(self, session_id: str, event: GameEvent) -> GameEventValidationResponse:
+        return await self._run(self.service.validate_game_event, session_id, event)
+
+    async def validate_game_events(self, session_id: str, events: List[GameEvent]) -> List[GameEventValidationResponse]:
+        return await self._run(self.service.validate_game_events, session_id, events)
+
+    async def end_game_session(self, session_id: str, request: GameSessionEndRequest) -> Optional[bool]:
+        return await self._run(self.service.end_game_session, session_id, request)
+
+    async def get_session_stats(self, session_id: str) -> Optional[Dict]:
+        return await self._run(self.service.get_session_stats, session_id)
+
+    async def reap_expired_sessions(self) -> int:
+        return await self._run(self.service.reap_expired_sessions)
+
+    async def run_reaper(self, interval: float = 60):
+        """背景定期回收閒置會話"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reap_expired_sessions()
+            except Exception as e:
+                print(f"回收閒置遊戲會話失敗，下次重試: {e!r}")
+
+    async def close(self):
+        """等待執行中的操作完成並關閉執行緒池"""
+        self._executor.shutdown(wait=True)
+
+
 # 全域實例
-game_validation_service = GameValidationService()
+game_validation_service = GameValidationService(
+    session_idle_ttl=settings.SESSION_IDLE_TTL_SECONDS,
+    event_log_dir=settings.SESSION_EVENT_LOG_DIR,
+    map_service=map_service,
+    timing_sample_rate=settings.VALIDATION_TIMING_SAMPLE_RATE,
+    store=create_session_store(
+        settings.SESSION_STORE,
+        settings.SESSION_STORE_DIR or os.path.join(os.path.dirname(os.path.dirname(__file__)), "session_store"),
+        shards=settings.SESSION_STORE_SHARDS,
+        max_completed_sessions=settings.MAX_COMPLETED_SESSIONS,
+    ),
+)
+async_game_validation_service = AsyncGameValidationService(
+    game_validation_service, max_workers=settings.SESSION_STORE_MAX_WORKERS
+)
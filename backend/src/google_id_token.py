@@ -0,0 +1,189 @@
+"""
+Google ID token 驗證
+以快取的 Google 公開金鑰（JWKS）在本地驗證 ID token 的簽章與 claims，登入不需要每次往返 Google。
+金鑰依回應的 Cache-Control max-age 快取；遇到未知的 kid（金鑰輪替）時提前重新取得，
+但同一段時間內最多重新取得一次，避免偽造的 kid 造成大量請求。
+取得金鑰失敗且沒有可用的舊金鑰時，可改用 tokeninfo API 驗證。所有請求共用一個有連線池的 HTTP client。
+httpx 在第一次需要連線時才匯入，縮短伺服器啟動時間。
+"""
+
+import asyncio
+import re
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+
+from metrics import metrics
+
+if TYPE_CHECKING:
+    import httpx
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_TOKENINFO_URL = "https://oauth2.googleapis.com/tokeninfo"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+# 驗證指標
+GOOGLE_VERIFICATIONS = metrics.counter("google_token_verifications_total", "Google ID token 驗證次數")
+GOOGLE_TOKENINFO_CALLS = metrics.counter("google_tokeninfo_requests_total", "改用 tokeninfo API 驗證的次數")
+GOOGLE_JWKS_FETCHES = metrics.counter("google_jwks_fetches_total", "取得 Google 公開金鑰的次數")
+
+
+class InvalidGoogleTokenError(ValueError):
+    """token 無效（簽章、audience、issuer 或到期時間不符）"""
+
+
+class GoogleKeysUnavailableError(RuntimeError):
+    """無法取得 Google 公開金鑰"""
+
+
+class GoogleIDTokenVerifier:
+    """Google ID token 驗證器"""
+
+    def __init__(
+        self,
+        client_id: Optional[str],
+        mode: str = "jwks",
+        tokeninfo_fallback: bool = True,
+        certs_url: str = GOOGLE_CERTS_URL,
+        tokeninfo_url: str = GOOGLE_TOKENINFO_URL,
+        http_client: Optional["httpx.AsyncClient"] = None,
+        default_max_age: float = 300,
+        min_refresh_interval: float = 30,
+    ):
+        self.client_id = client_id
+        self.mode = mode  # jwks：本地驗證；tokeninfo：每次呼叫 Google 的 tokeninfo API
+        self.tokeninfo_fallback = tokeninfo_fallback
+        self.certs_url = certs_url
+        self.tokeninfo_url = tokeninfo_url
+        self.default_max_age = default_max_age  # 回應沒有 max-age 時的快取時間
+        self.min_refresh_interval = min_refresh_interval  # 因未知 kid 提前重新取得金鑰的最短間隔
+        self._http_client = http_client
+        self._keys: Dict[str, Key] = {}
+        self._keys_expire_at = 0.0
+        self._last_fetch = -float("inf")
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    def _client(self) -> "httpx.AsyncClient":
+        """共用的 HTTP client（第一次使用時建立）"""
+        if self._http_client is None:
+            import httpx
+
+            self._http_client = httpx.AsyncClient(
+                timeout=10, limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._http_client
+
+    async def close(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def verify(self, token: str) -> dict:
+        """驗證 ID token 並回傳 claims（sub、email、name、picture、email_verified 等）"""
+        GOOGLE_VERIFICATIONS.inc()
+        if self.mode == "tokeninfo":
+            return await self._verify_with_tokeninfo(token)
+        try:
+            return await self._verify_locally(token)
+        except GoogleKeysUnavailableError:
+            if not self.tokeninfo_fallback:
+                raise
+            return await self._verify_with_tokeninfo(token)
+
+    async def _verify_locally(self, token: str) -> dict:
+        # 未設定 client_id 時 jose 不檢查 audience，直接拒絕
+        if not self.client_id:
+            raise InvalidGoogleTokenError("Invalid token audience")
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except JWTError as e:
+            raise InvalidGoogleTokenError("Malformed token") from e
+
+        key = await self._get_key(kid)
+        if key is None:
+            raise InvalidGoogleTokenError("Unknown signing key")
+        try:
+            claims: Dict[str, Any] = jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=self.client_id,
+                issuer=GOOGLE_ISSUERS,
+                options={"verify_at_hash": False},
+            )
+        except JWTError as e:
+            raise InvalidGoogleTokenError(str(e)) from e
+        return claims
+
+    async def _get_key(self, kid: Optional[str]) -> Optional[Key]:
+        """取得 kid 對應的金鑰，快取過期或遇到未知的 kid 時重新取得"""
+        now = time.monotonic()
+        key = self._keys.get(kid) if kid else None
+        if key is not None and now < self._keys_expire_at:
+            return key
+        # 快取仍有效、只是 kid 未知：距離上次取得不到 min_refresh_interval 時不重新取得
+        if now < self._keys_expire_at and now - self._last_fetch < self.min_refresh_interval:
+            return None
+
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            # 等待鎖的期間可能已由其他請求更新
+            if self._last_fetch <= now:
+                await self._refresh_keys()
+        return self._keys.get(kid) if kid else None
+
+    async def _refresh_keys(self):
+        """取得 JWKS；失敗時保留舊金鑰（沒有舊金鑰才拋出 GoogleKeysUnavailableError）"""
+        import httpx
+
+        try:
+            response = await self._client().get(self.certs_url)
+            response.raise_for_status()
+            keys = {item["kid"]: jwk.construct(item, item.get("alg", "RS256")) for item in response.json()["keys"]}
+        except (httpx.HTTPError, ValueError, KeyError, JWTError) as e:
+            self._last_fetch = time.monotonic()
+            if not self._keys:
+                raise GoogleKeysUnavailableError(f"Unable to fetch Google certs: {e!r}") from e
+            print(f"更新 Google 公開金鑰失敗，繼續使用舊金鑰: {e!r}")
+            self._keys_expire_at = self._last_fetch + self.min_refresh_interval
+            return
+
+        GOOGLE_JWKS_FETCHES.inc()
+        self._last_fetch = time.monotonic()
+        self._keys = keys
+        self._keys_expire_at = self._last_fetch + self._max_age(response)
+
+    def _max_age(self, response: "httpx.Response") -> float:
+        """依 Cache-Control max-age（扣除 Age）計算快取時間，至少快取 min_refresh_interval
+
+        no-cache／no-store 或已過期的回應同樣快取 min_refresh_interval，否則每次登入都會重新取得金鑰；
+        金鑰輪替時由未知 kid 觸發提前更新
+        """
+        cache_control = response.headers.get("cache-control", "")
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return self.min_refresh_interval
+        match = _MAX_AGE.search(cache_control)
+        if match is None:
+            return self.default_max_age
+        try:
+            age = float(response.headers.get("age", 0))
+        except ValueError:
+            age = 0.0
+        return max(self.min_refresh_interval, int(match.group(1)) - age)
+
+    async def _verify_with_tokeninfo(self, token: str) -> dict:
+        """以 Google 的 tokeninfo API 驗證"""
+        GOOGLE_TOKENINFO_CALLS.inc()
+        response = await self._client().get(self.tokeninfo_url, params={"id_token": token})
+        if response.status_code != 200:
+            raise InvalidGoogleTokenError("Invalid Google token")
+
+        token_info: Dict[str, Any] = response.json()
+        if token_info.get("aud") != self.client_id:
+            raise InvalidGoogleTokenError("Invalid token audience")
+        return token_info
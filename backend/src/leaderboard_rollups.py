@@ -0,0 +1,88 @@
+"""
+時間區間排行榜彙總
+依日、ISO 週、賽季（季度）分桶，寫入分數時增量更新每位用戶的最佳記錄
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Literal, Optional, Tuple
+
+LeaderboardWindow = Literal["daily", "weekly", "season"]
+WINDOWS: Tuple[LeaderboardWindow, ...] = ("daily", "weekly", "season")
+
+
+def period_key(window: LeaderboardWindow, moment: datetime) -> str:
+    """取得時間所屬的區間鍵，字串排序即為時間順序"""
+    if window == "daily":
+        return moment.strftime("%Y-%m-%d")
+    if window == "weekly":
+        iso_year, iso_week, _ = moment.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    return f"{moment.year}-Q{(moment.month - 1) // 3 + 1}"
+
+
+def period_start(window: LeaderboardWindow, moment: datetime, periods_back: int = 0) -> datetime:
+    """取得往前數 periods_back 個區間的起始時間"""
+    day = moment.date()
+    if window == "daily":
+        start = day - timedelta(days=periods_back)
+    elif window == "weekly":
+        start = day - timedelta(days=day.weekday() + 7 * periods_back)
+    else:
+        quarter_index = day.year * 4 + (day.month - 1) // 3 - periods_back
+        start = date(quarter_index // 4, (quarter_index % 4) * 3 + 1, 1)
+    return datetime.combine(start, datetime.min.time())
+
+
+class LeaderboardRollups:
+    """時間區間排行榜的增量彙總
+
+    每個 (區間類型, 區間鍵) 桶保存「地圖 -> 用戶 -> 最佳分數列號」，
+    地圖 None 代表全部地圖。每種區間只保留最近 retention 個桶。
+    """
+
+    def __init__(self, retention: Dict[LeaderboardWindow, int]):
+        self.retention = retention
+        self._buckets: Dict[Tuple[LeaderboardWindow, str], Dict[Optional[int], Dict[int, int]]] = {}
+        self._periods: Dict[LeaderboardWindow, List[str]] = {window: [] for window in WINDOWS}
+
+    def oldest_retained(self, now: datetime) -> datetime:
+        """所有區間中最早仍需保留的時間點"""
+        return min(period_start(window, now, self.retention[window] - 1) for window in WINDOWS)
+
+    def add(self, row: int, user_id: int, map_index: int, created_at: datetime, scores):
+        """加入一筆分數；scores 為分數欄位，用來比較同一用戶的最佳記錄"""
+        for window in WINDOWS:
+            bucket = self._get_bucket(window, period_key(window, created_at))
+            if bucket is None:
+                continue
+            for key in (None, map_index):
+                user_best = bucket.setdefault(key, {})
+                best_row = user_best.get(user_id)
+                if best_row is None or scores[row] > scores[best_row]:
+                    user_best[user_id] = row
+
+    def best_rows(self, window: LeaderboardWindow, map_index: Optional[int], now: datetime) -> Dict[int, int]:
+        """取得目前區間中每位用戶的最佳分數列號"""
+        bucket = self._buckets.get((window, period_key(window, now)), {})
+        return bucket.get(map_index, {})
+
+    def bucket_count(self) -> int:
+        return len(self._buckets)
+
+    def _get_bucket(self, window: LeaderboardWindow, key: str) -> Optional[Dict[Optional[int], Dict[int, int]]]:
+        """取得或建立區間桶，建立新桶時淘汰超出保留數量的舊桶"""
+        bucket = self._buckets.get((window, key))
+        if bucket is not None:
+            return bucket
+
+        periods = self._periods[window]
+        if len(periods) >= self.retention[window] and key < periods[0]:
+            # 比所有保留中的桶都舊，不需要彙總
+            return None
+
+        bucket = self._buckets[(window, key)] = {}
+        periods.append(key)
+        periods.sort()
+        while len(periods) > self.retention[window]:
+            del self._buckets[(window, periods.pop(0))]
+        return bucket
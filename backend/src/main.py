@@ -3,34 +3,123 @@ Pac-Map 後端 API
 提供 Google 登入、排行榜、用戶管理等功能
 """
 
-from datetime import timedelta
+import asyncio
+import json
+import secrets
+import time
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
 from typing import Optional
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketException,
+    status,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
-from auth import authenticate_google_user, create_access_token, generate_google_auth_url, get_current_user
+from auth import (
+    authenticate_google_user,
+    create_access_token,
+    generate_google_auth_url,
+    get_current_user,
+    get_websocket_user,
+    google_token_verifier,
+)
 from config import settings
-from database import db
-from game_validation_service import game_validation_service
+from database import ScoreSort, async_db
+from game_event_stream import stream_game_events
+from game_validation_service import async_game_validation_service
+from leaderboard_rollups import LeaderboardWindow, period_key
 from map_service import map_service
+from metrics import metrics
 from models import (
     APIResponse,
+    GameEventBatchValidationRequest,
+    GameEventBatchValidationResponse,
     GameEventValidationRequest,
     GameEventValidationResponse,
     GameScore,
     GameSessionEndRequest,
+    GameSessionEndStatus,
     GameSessionStartRequest,
     LeaderboardEntry,
     LeaderboardResponse,
     ProcessedMapData,
     Token,
     User,
+    UserInDB,
 )
+from profiler import ProfileMode, ProfilerBusyError, capture_profile, install_profile_signal_handler
+from request_metrics import RequestMetricsMiddleware
+from response_cache import ResponseCache
+from session_finalizer import session_finalizer
+from spans import set_spans_enabled, span_names, spans_enabled
+
+# 排行榜與地圖配置的回應快取（預先序列化的 JSON）
+leaderboard_cache = ResponseCache("leaderboard", settings.LEADERBOARD_CACHE_SIZE)
+map_configs_cache = ResponseCache("map_configs", 1)
+
+STARTUP_WARM_UP_SECONDS = metrics.gauge("startup_warm_up_seconds", "啟動時載入資料庫與地圖快取的耗時")
+
+
+async def warm_up_services(app_state):
+    """並行載入資料庫與地圖快取，完成後標記為就緒（/ready）
+
+    在背景執行，伺服器不必等待即可接受請求；需要資料的請求會等到資料庫載入完成
+    """
+    start = time.perf_counter()
+    try:
+        _, maps = await asyncio.gather(async_db.warm_up(), map_service.preload_cache())
+    except Exception as e:
+        # 暖機失敗時由之後的請求各自載入
+        print(f"⚠️ 啟動暖機失敗: {e!r}")
+        return
+    STARTUP_WARM_UP_SECONDS.set(time.perf_counter() - start)
+    app_state.ready = True
+    print(f"✅ 暖機完成：資料庫與 {maps} 張地圖快取已載入（{time.perf_counter() - start:.2f} 秒）")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """應用程式生命週期：在背景暖機（載入資料庫與地圖快取），啟動會話回收與延遲寫入工作，
+    關閉時處理完待結束的會話、寫完待處理的資料庫批次與延遲的用戶欄位更新，並關閉共用的 HTTP client
+    """
+    app.state.ready = False
+    tasks = [
+        asyncio.create_task(warm_up_services(app.state)),
+        asyncio.create_task(async_game_validation_service.run_reaper(settings.SESSION_REAPER_INTERVAL_SECONDS)),
+    ]
+    if settings.USER_ACTIVITY_FLUSH_SECONDS > 0:
+        tasks.append(asyncio.create_task(async_db.run_deferred_flusher(settings.USER_ACTIVITY_FLUSH_SECONDS)))
+    if settings.PROFILE_DIR and install_profile_signal_handler(settings.PROFILE_DIR, settings.PROFILE_SIGNAL_SECONDS):
+        print(f"📈 收到 SIGUSR2 時將效能分析寫入 {settings.PROFILE_DIR}")
+    yield
+    for task in tasks:
+        task.cancel()
+    await session_finalizer.close()
+    await async_game_validation_service.close()
+    await async_db.close()
+    await google_token_verifier.close()
+
 
 # 建立 FastAPI 應用程式
-app = FastAPI(title=settings.APP_NAME, description="Pac-Map 遊戲後端 API", version="1.0.0", debug=settings.DEBUG)
+app = FastAPI(
+    title=settings.APP_NAME,
+    description="Pac-Map 遊戲後端 API",
+    version="1.0.0",
+    debug=settings.DEBUG,
+    lifespan=lifespan,
+)
 
 # 設定 CORS
 app.add_middleware(
@@ -41,6 +130,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 記錄每個路由的延遲、請求數與錯誤數（輸出於 /metrics）
+if settings.REQUEST_METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware)
+
+if settings.SPAN_TIMERS_ENABLED:
+    set_spans_enabled(True)
+
 # === 請求模型 ===
 
 
@@ -73,7 +169,69 @@ async def root():
 @app.get("/health")
 async def health_check():
     """健康檢查"""
-    return {"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"}
+    return {"status": "healthy", "timestamp": datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """就緒檢查：啟動暖機完成前回傳 503，供負載平衡器與自動擴展判斷何時導入流量"""
+    ready = getattr(app.state, "ready", False)
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if ready else "warming_up"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """取得執行期指標（Prometheus 文字格式）"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/metrics/json")
+async def get_metrics_json():
+    """取得執行期指標（JSON 快照）"""
+    return metrics.snapshot()
+
+
+# === 效能分析（設定 PROFILING_TOKEN 才開放） ===
+
+
+def require_profiling_token(x_profiling_token: Optional[str] = Header(None)):
+    """未設定 PROFILING_TOKEN 時效能分析路由視同不存在"""
+    if not settings.PROFILING_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_profiling_token is None or not secrets.compare_digest(x_profiling_token, settings.PROFILING_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+
+
+@app.post("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(require_profiling_token)])
+async def capture_process_profile(
+    seconds: float = Query(10, gt=0, le=120, description="分析秒數"),
+    mode: ProfileMode = Query("sampling", description="sampling 回傳 collapsed stacks，cprofile 回傳 pstats 表格"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="取樣間隔（毫秒）"),
+    include_idle: bool = Query(False, description="是否計入閒置等待中的執行緒"),
+):
+    """分析執行中的行程一段時間，期間照常處理其他請求
+
+    sampling 的輸出可直接交給 flamegraph.pl 或 speedscope 產生火焰圖
+    """
+    try:
+        return PlainTextResponse(await capture_profile(seconds, mode, interval_ms / 1000, include_idle))
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e)) from e
+
+
+@app.get("/admin/spans", dependencies=[Depends(require_profiling_token)])
+async def get_span_timers():
+    """區段計時的狀態與可計時的方法（耗時見 /metrics 的 span_seconds）"""
+    return {"enabled": spans_enabled(), "spans": span_names()}
+
+
+@app.put("/admin/spans", dependencies=[Depends(require_profiling_token)])
+async def toggle_span_timers(enabled: bool):
+    """執行期開啟或關閉區段計時"""
+    set_spans_enabled(enabled)
+    return {"enabled": spans_enabled(), "spans": span_names()}
 
 
 # === 認證相關路由 ===
@@ -131,57 +289,88 @@ async def submit_score(request: SubmitScoreRequest, current_user: User = Depends
         )
 
         # 儲存分數到資料庫
-        score_record = db.create_score(current_user.id, game_score)
+        score_record = await async_db.create_score(current_user.id, game_score)
 
         return APIResponse(success=True, message="Score submitted successfully", data={"score_id": score_record.id})
 
+    except (OverflowError, ValueError) as e:
+        # 數值超出分數欄位的範圍
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid score values: {e!s}"
+        ) from e
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to submit score: {e!s}")
 
 
 @app.get("/game/leaderboard", response_model=LeaderboardResponse)
-async def get_leaderboard(limit: Optional[int] = None, map_index: Optional[int] = None):
-    """取得排行榜"""
+async def get_leaderboard(
+    request: Request,
+    limit: Optional[int] = None,
+    map_index: Optional[int] = None,
+    window: Optional[LeaderboardWindow] = None,
+):
+    """取得排行榜（window=daily|weekly|season 取得目前日／週／賽季排行，未指定為總排行）
+
+    回應快取到有新分數為止（時間區間排行另以目前的區間為鍵，換日／週／季後自動重建）
+    """
+    # 如果沒有指定 limit，則顯示所有玩家
+    actual_limit = limit if limit is not None else 1000  # 設定一個合理的上限
+    key = (actual_limit, map_index, window, period_key(window, datetime.now()) if window is not None else None)
     try:
-        # 如果沒有指定 limit，則顯示所有玩家
-        actual_limit = limit if limit is not None else 1000  # 設定一個合理的上限
-        leaderboard_data = db.get_leaderboard(limit=actual_limit, map_index=map_index)
-
-        leaderboard_entries = []
-        for entry in leaderboard_data:
-            # 處理 created_at 欄位 - 如果是字串則轉換為 datetime
-            created_at = entry["created_at"]
-            if isinstance(created_at, str):
-                from datetime import datetime
-
-                created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-
-            leaderboard_entries.append(
-                LeaderboardEntry(
-                    rank=entry["rank"],
-                    user_name=entry["user_name"],
-                    user_picture=entry["user_picture"],
-                    score=entry["score"],
-                    level=entry["level"],
-                    map_name=entry["map_name"],  # 直接使用資料庫返回的 map_name
-                    created_at=created_at,
-                )
-            )
-
-        return LeaderboardResponse(success=True, data=leaderboard_entries, total_count=len(leaderboard_entries))
-
+        entry = await leaderboard_cache.get_or_build(
+            key,
+            async_db.leaderboard_version(),
+            lambda: _build_leaderboard_body(actual_limit, map_index, window),
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get leaderboard: {e!s}"
+        ) from e
+    return leaderboard_cache.response(request, entry, settings.LEADERBOARD_CACHE_MAX_AGE)
+
+
+async def _build_leaderboard_body(limit: int, map_index: Optional[int], window: Optional[LeaderboardWindow]) -> bytes:
+    """查詢排行榜並序列化為 JSON"""
+    leaderboard_data = await async_db.get_leaderboard(limit=limit, map_index=map_index, window=window)
+
+    leaderboard_entries = []
+    for entry in leaderboard_data:
+        # 處理 created_at 欄位 - 如果是字串則轉換為 datetime
+        created_at = entry["created_at"]
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+
+        leaderboard_entries.append(
+            LeaderboardEntry(
+                rank=entry["rank"],
+                user_name=entry["user_name"],
+                user_picture=entry["user_picture"],
+                score=entry["score"],
+                level=entry["level"],
+                map_name=entry["map_name"],  # 直接使用資料庫返回的 map_name
+                created_at=created_at,
+            )
         )
 
+    response = LeaderboardResponse(success=True, data=leaderboard_entries, total_count=len(leaderboard_entries))
+    return response.model_dump_json().encode()
+
 
 @app.get("/game/my-scores")
-async def get_my_scores(limit: int = 10, current_user: User = Depends(get_current_user)):
-    """取得我的分數記錄"""
+async def get_my_scores(
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    sort: ScoreSort = "score",
+    current_user: User = Depends(get_current_user),
+):
+    """取得我的分數記錄（以 cursor 分頁，sort=score 依分數、sort=recent 依時間）"""
     try:
-        scores = db.get_user_scores(current_user.id, limit=limit)
-        return {"success": True, "data": [score.dict() for score in scores]}
+        scores, next_cursor = await async_db.get_user_scores_page(
+            current_user.id, limit=limit, cursor=cursor, sort=sort
+        )
+        return {"success": True, "data": [score.dict() for score in scores], "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {cursor}") from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get user scores: {e!s}"
@@ -192,33 +381,42 @@ async def get_my_scores(limit: int = 10, current_user: User = Depends(get_curren
 
 
 @app.get("/maps/configs")
-async def get_map_configs():
-    """取得所有地圖配置"""
+async def get_map_configs(request: Request):
+    """取得所有地圖配置（配置在執行期間不變，只序列化一次）"""
     try:
-        configs = [
-            {"index": i, "name": config.name, "center": config.center, "zoom": config.zoom}
-            for i, config in enumerate(map_service.map_configs)
-        ]
-        return {"success": True, "data": configs}
+        entry = await map_configs_cache.get_or_build(None, 0, _build_map_configs_body)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get map configs: {e!s}"
         ) from e
+    return map_configs_cache.response(request, entry, settings.MAP_CONFIGS_CACHE_MAX_AGE)
+
+
+async def _build_map_configs_body() -> bytes:
+    configs = [
+        {"index": i, "name": config.name, "center": config.center, "zoom": config.zoom}
+        for i, config in enumerate(map_service.map_configs)
+    ]
+    return json.dumps({"success": True, "data": configs}, ensure_ascii=False, separators=(",", ":")).encode()
 
 
 @app.get("/maps/{map_index}/data", response_model=ProcessedMapData)
 async def get_map_data(map_index: int, force_refresh: bool = False):
-    """取得處理後的地圖數據"""
+    """取得處理後的地圖數據
+
+    直接回傳預先序列化的 JSON：地圖數據已在建置或載入時驗證，不再經過 response_model 的驗證與編碼
+    （response_model 仍用於 OpenAPI 文件）
+    """
     try:
-        map_data = await map_service.get_processed_map_data(map_index, force_refresh)
+        body = await map_service.get_processed_map_json(map_index, force_refresh)
 
-        if not map_data:
+        if body is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Map with index {map_index} not found or failed to process",
             )
 
-        return map_data
+        return Response(content=body, media_type="application/json")
 
     except HTTPException:
         raise
@@ -261,7 +459,10 @@ async def refresh_map_data(map_index: int):
 async def start_game_session(request: GameSessionStartRequest, current_user: User = Depends(get_current_user)):
     """開始新的遊戲會話"""
     try:
-        session_id = game_validation_service.start_game_session(current_user.id, request)
+        # 將已快取的地圖載入到此行程，收集事件才能比對豆子位置與移動路徑（前端開始遊戲前已取得地圖，通常直接命中快取）；
+        # 不在這裡建置地圖，沒有快取時該會話略過這兩項檢查
+        await map_service.load_cached_map_data(request.map_index)
+        session_id = await async_game_validation_service.start_game_session(current_user.id, request)
         return {"success": True, "session_id": session_id}
     except Exception as e:
         raise HTTPException(
@@ -273,7 +474,7 @@ async def start_game_session(request: GameSessionStartRequest, current_user: Use
 async def start_game_session_test(request: GameSessionStartRequest):
     """開始新的遊戲會話（測試用，無需認證）"""
     try:
-        session_id = game_validation_service.start_game_session(999, request)  # 使用測試用戶ID
+        session_id = await async_game_validation_service.start_game_session(999, request)  # 使用測試用戶ID
         return {"success": True, "session_id": session_id}
     except Exception as e:
         raise HTTPException(
@@ -285,7 +486,7 @@ async def start_game_session_test(request: GameSessionStartRequest):
 async def validate_game_event(request: GameEventValidationRequest, current_user: User = Depends(get_current_user)):
     """驗證遊戲事件"""
     try:
-        response = game_validation_service.validate_game_event(request.session_id, request.event)
+        response = await async_game_validation_service.validate_game_event(request.session_id, request.event)
         return response
     except Exception as e:
         raise HTTPException(
@@ -293,44 +494,98 @@ async def validate_game_event(request: GameEventValidationRequest, current_user:
         ) from e
 
 
+@app.post("/game/events/validate-batch", response_model=GameEventBatchValidationResponse)
+async def validate_game_events_batch(
+    request: GameEventBatchValidationRequest, current_user: User = Depends(get_current_user)
+):
+    """批次驗證遊戲事件（同一會話，依發生順序）"""
+    try:
+        results = await async_game_validation_service.validate_game_events(request.session_id, request.events)
+        accepted_count = sum(1 for result in results if result.is_valid)
+        return GameEventBatchValidationResponse(
+            is_valid=accepted_count == len(results), accepted_count=accepted_count, results=results
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to validate game events: {e!s}"
+        ) from e
+
+
+@app.websocket("/game/session/{session_id}/stream")
+async def stream_game_session_events(
+    websocket: WebSocket, session_id: str, current_user: UserInDB = Depends(get_websocket_user)
+):
+    """以 WebSocket 串流驗證遊戲事件（連線時認證一次並綁定會話，協定見 game_event_stream）"""
+    session = await async_game_validation_service.get_active_session(session_id)
+    if session is None or session.user_id != current_user.id:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Game session not found")
+
+    await stream_game_events(
+        websocket,
+        async_game_validation_service,
+        session_id,
+        queue_size=settings.WS_EVENT_QUEUE_SIZE,
+        max_events_per_frame=settings.WS_MAX_EVENTS_PER_FRAME,
+    )
+
+
 @app.post("/game/session/end")
-async def end_game_session(request: GameSessionEndRequest, current_user: User = Depends(get_current_user)):
-    """結束遊戲會話"""
+async def end_game_session(
+    request: GameSessionEndRequest,
+    response: Response,
+    wait: float = Query(0, ge=0, le=30, description="最多等待判定完成的秒數，0 表示立即回傳"),
+    current_user: User = Depends(get_current_user),
+):
+    """結束遊戲會話：立即回傳處理票證（202），最終驗證與分數寫入在背景完成；重送同一會話會取得同一張票證"""
     try:
-        is_valid = game_validation_service.end_game_session(request.session_id, request)
-
-        # 如果驗證通過，創建分數記錄
-        if is_valid:
-            game_score = GameScore(
-                score=request.final_score,
-                level=1,  # 可以從會話中獲取
-                map_index=0,  # 可以從會話中獲取
-                survival_time=request.survival_time,
-                dots_collected=request.dots_collected,
-                ghosts_eaten=request.ghosts_eaten,
-            )
-            score_record = db.create_score(current_user.id, game_score)
+        ticket = await session_finalizer.submit(current_user.id, request)
+        if ticket is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game session not found")
+        if wait > 0:
+            ticket = await session_finalizer.get_result(request.session_id, current_user.id, wait) or ticket
 
-            return {
-                "success": True,
-                "is_valid": is_valid,
-                "score_id": score_record.id,
-                "message": "遊戲會話結束，分數已記錄",
-            }
-        else:
-            return {"success": True, "is_valid": is_valid, "message": "遊戲會話結束，但驗證失敗，分數未記錄"}
+        if ticket.status == GameSessionEndStatus.PENDING:
+            response.status_code = status.HTTP_202_ACCEPTED
+        return {"success": True, **ticket.model_dump(mode="json")}
 
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied") from e
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to end game session: {e!s}"
         ) from e
 
 
+@app.get("/game/session/{session_id}/result")
+async def get_session_result(
+    session_id: str,
+    wait: float = Query(0, ge=0, le=30, description="最多等待判定完成的秒數（長輪詢），0 表示立即回傳"),
+    current_user: User = Depends(get_current_user),
+):
+    """取得遊戲會話結束的判定結果"""
+    try:
+        ticket = await session_finalizer.get_result(session_id, current_user.id, wait)
+        if ticket is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game session not found")
+        return {"success": True, **ticket.model_dump(mode="json")}
+
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied") from e
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get session result: {e!s}"
+        ) from e
+
+
 @app.get("/game/session/{session_id}/stats")
 async def get_session_stats(session_id: str, current_user: User = Depends(get_current_user)):
     """獲取遊戲會話統計"""
     try:
-        stats = game_validation_service.get_session_stats(session_id)
+        stats = await async_game_validation_service.get_session_stats(session_id)
         if not stats:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game session not found")
 
@@ -4,16 +4,29 @@
 """
 
 import asyncio
-import json
 import math
 import os
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-
-import aiohttp
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, cast
 
+from metrics import metrics
 from models import MapBounds, MapConfig, POIData, ProcessedMapData, RoadSegment
+from position_index import PositionIndex
+from road_graph import RoadGraph
+from spans import span
+
+T = TypeVar("T")
+
+# 地圖建置各階段耗時：取得 OSM 數據、解析、細分路段、建立鄰接表、序列化到磁碟快取
+MAP_BUILD_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAP_BUILD_STAGES = {
+    stage: metrics.histogram(
+        "map_build_stage_seconds", "地圖建置各階段耗時", MAP_BUILD_BUCKETS, labels={"stage": stage}
+    )
+    for stage in ("fetch", "parse", "subdivide", "adjacency", "serialize")
+}
 
 
 class MapService:
@@ -21,11 +34,10 @@ class MapService:
 
     def __init__(self):
         self.cache: Dict[int, ProcessedMapData] = {}
+        # 由快取中的地圖數據衍生的結構（位置索引、路網圖），地圖數據更新後重建
+        self._derived: Dict[Tuple[str, int], Tuple[ProcessedMapData, Any]] = {}
         self.cache_dir = Path("cache/maps")
         self.cache_expiry_hours = 24  # 快取過期時間（小時）
-
-        # 確保快取目錄存在
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.map_configs = [
             MapConfig(
                 name="台北市中心",
@@ -47,20 +59,16 @@ class MapService:
             ),
         ]
 
+    @span
     async def get_processed_map_data(self, map_index: int, force_refresh: bool = False) -> Optional[ProcessedMapData]:
         """獲取處理後的地圖數據"""
         if map_index < 0 or map_index >= len(self.map_configs):
             return None
 
-        # 檢查記憶體快取
-        if not force_refresh and map_index in self.cache:
-            return self.cache[map_index]
-
-        # 檢查磁碟快取
+        # 檢查記憶體與磁碟快取
         if not force_refresh:
-            cached_data = await self._load_from_cache(map_index)
+            cached_data = await self.load_cached_map_data(map_index)
             if cached_data:
-                self.cache[map_index] = cached_data
                 return cached_data
 
         # 處理地圖數據
@@ -74,8 +82,71 @@ class MapService:
 
         return processed_data
 
+    async def load_cached_map_data(self, map_index: int) -> Optional[ProcessedMapData]:
+        """只從記憶體或磁碟快取取得地圖數據（不取得 OSM 數據、不建置地圖），沒有快取時回傳 None"""
+        if map_index in self.cache:
+            return self.cache[map_index]
+        cached_data = await self._load_from_cache(map_index)
+        if cached_data:
+            self.cache[map_index] = cached_data
+        return cached_data
+
+    async def get_processed_map_json(self, map_index: int, force_refresh: bool = False) -> Optional[bytes]:
+        """獲取處理後的地圖數據序列化後的 JSON（每份地圖數據只序列化一次）"""
+        data = await self.get_processed_map_data(map_index, force_refresh)
+        if data is None:
+            return None
+        return self._get_derived("json", map_index, lambda data: data.model_dump_json().encode(), data)
+
+    async def preload_cache(self) -> int:
+        """將未過期的磁碟快取並行載入記憶體，並預先建立位置索引與路網圖（啟動暖機），回傳載入的地圖數"""
+
+        async def preload(map_index: int) -> bool:
+            if map_index not in self.cache:
+                data = await self._load_from_cache(map_index)
+                if data is None:
+                    return False
+                self.cache.setdefault(map_index, data)
+            await asyncio.to_thread(self.get_position_index, map_index)
+            await asyncio.to_thread(self.get_road_graph, map_index)
+            return True
+
+        loaded = await asyncio.gather(*(preload(map_index) for map_index in range(len(self.map_configs))))
+        return sum(loaded)
+
+    def get_position_index(self, map_index: int) -> Optional[PositionIndex]:
+        """取得已載入地圖的有效位置索引，地圖尚未載入到記憶體時回傳 None"""
+        return self._get_derived("position_index", map_index, lambda data: PositionIndex(data.valid_positions))
+
+    def get_road_graph(self, map_index: int) -> Optional[RoadGraph]:
+        """取得已載入地圖的路網圖，地圖尚未載入到記憶體時回傳 None"""
+        return self._get_derived("road_graph", map_index, lambda data: RoadGraph(data.adjacency_list))
+
+    def _get_derived(
+        self,
+        kind: str,
+        map_index: int,
+        build: Callable[[ProcessedMapData], T],
+        data: Optional[ProcessedMapData] = None,
+    ) -> Optional[T]:
+        if data is None:
+            data = self.cache.get(map_index)
+            if data is None:
+                return None
+
+        cached = self._derived.get((kind, map_index))
+        if cached is not None and cached[0] is data:
+            return cast(T, cached[1])
+        derived = build(data)
+        self._derived[(kind, map_index)] = (data, derived)
+        return derived
+
+    @span
     async def _load_from_cache(self, map_index: int) -> Optional[ProcessedMapData]:
-        """從磁碟快取載入地圖數據"""
+        """從磁碟快取載入地圖數據（在執行緒中讀取與解析，不阻塞事件迴圈）"""
+        return await asyncio.to_thread(self._read_cache_file, map_index)
+
+    def _read_cache_file(self, map_index: int) -> Optional[ProcessedMapData]:
         cache_file = self.cache_dir / f"map_{map_index}.json"
 
         if not cache_file.exists():
@@ -89,10 +160,9 @@ class MapService:
                 os.remove(cache_file)
                 return None
 
-            # 載入快取數據
-            with open(cache_file, encoding="utf-8") as f:
-                data = json.load(f)
-                return ProcessedMapData(**data)
+            # 載入快取數據（直接由 JSON bytes 驗證，不經過中間的字典）
+            with open(cache_file, "rb") as f:
+                return ProcessedMapData.model_validate_json(f.read())
 
         except Exception as e:
             print(f"載入快取失敗: {e}")
@@ -101,25 +171,29 @@ class MapService:
                 os.remove(cache_file)
             return None
 
+    @span
     async def _save_to_cache(self, map_index: int, data: ProcessedMapData) -> None:
         """保存地圖數據到磁碟快取"""
         cache_file = self.cache_dir / f"map_{map_index}.json"
 
         try:
-            with open(cache_file, "w", encoding="utf-8") as f:
-                # 將 ProcessedMapData 轉換為字典並序列化
-                json.dump(data.model_dump(), f, ensure_ascii=False, indent=2, default=str)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with MAP_BUILD_STAGES["serialize"].time(), open(cache_file, "wb") as f:
+                # 以 Pydantic 的序列化器直接輸出精簡的 JSON（舊的縮排格式仍可載入）
+                f.write(data.model_dump_json().encode())
 
         except Exception as e:
             print(f"保存快取失敗: {e}")
 
+    @span
     async def _process_map_data(self, map_index: int, config: MapConfig) -> Optional[ProcessedMapData]:
         """處理地圖數據"""
         try:
             # 並行獲取道路和 POI 數據
-            road_data, poi_data = await asyncio.gather(
-                self._fetch_road_data(config.bounds), self._fetch_poi_data(config.bounds)
-            )
+            with MAP_BUILD_STAGES["fetch"].time():
+                road_data, poi_data = await asyncio.gather(
+                    self._fetch_road_data(config.bounds), self._fetch_poi_data(config.bounds)
+                )
 
             if not road_data:
                 return None
@@ -170,6 +244,8 @@ class MapService:
         url = "https://overpass-api.de/api/interpreter"
 
         try:
+            import aiohttp  # 只有建置地圖時需要，延遲匯入以縮短啟動時間
+
             async with aiohttp.ClientSession() as session:
                 async with session.post(url, data={"data": query}) as response:
                     if response.status == 200:
@@ -202,6 +278,8 @@ class MapService:
         url = "https://overpass-api.de/api/interpreter"
 
         try:
+            import aiohttp
+
             async with aiohttp.ClientSession() as session:
                 async with session.post(url, data={"data": query}) as response:
                     if response.status == 200:
@@ -213,6 +291,7 @@ class MapService:
             print(f"獲取 POI 數據時發生錯誤: {e}")
             return None
 
+    @span
     def _generate_road_network(
         self, osm_data: dict, max_segment_length: float = 20.0
     ) -> Tuple[List[RoadSegment], List[List[float]], Dict[str, List[List[float]]]]:
@@ -220,6 +299,8 @@ class MapService:
         if not osm_data or "elements" not in osm_data:
             return [], [], {}
 
+        start = time.perf_counter()
+
         # 解析節點和路徑
         nodes = {}
         ways = []
@@ -246,6 +327,8 @@ class MapService:
                 for i in range(len(way_points) - 1):
                     initial_segments.append([way_points[i], way_points[i + 1]])
 
+        start = MAP_BUILD_STAGES["parse"].observe_since(start)
+
         # 細分長路段
         road_segments = []
         valid_positions = []
@@ -261,8 +344,11 @@ class MapService:
                 if s[1] not in valid_positions:
                     valid_positions.append(s[1])
 
+        start = MAP_BUILD_STAGES["subdivide"].observe_since(start)
+
         # 生成鄰接表
         adjacency_list = self._build_adjacency_list(road_segments, valid_positions)
+        MAP_BUILD_STAGES["adjacency"].observe_since(start)
 
         return road_segments, valid_positions, adjacency_list
 
@@ -300,6 +386,7 @@ class MapService:
 
         return math.sqrt(lat_meters**2 + lng_meters**2)
 
+    @span
     def _build_adjacency_list(
         self, road_segments: List[RoadSegment], valid_positions: List[List[float]]
     ) -> Dict[str, List[List[float]]]:
@@ -0,0 +1,217 @@
+"""
+執行期指標 - 簡單的計數器、量表與直方圖
+同名的指標可以帶不同的標籤（如路由、驗證規則），以 Prometheus 文字格式或 JSON 快照輸出
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar, Union, cast
+
+# 預設的直方圖區間（秒）
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items())) if labels else ()
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = ((key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for key, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """只增不減的計數器"""
+
+    def __init__(self, name: str, description: str, labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "value": self.value}
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        return [(self.name, self.labels, self.value)]
+
+
+class Gauge:
+    """可增可減的量表"""
+
+    def __init__(self, name: str, description: str, labels: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def snapshot(self) -> dict:
+        return {"type": "gauge", "value": self.value}
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        return [(self.name, self.labels, self.value)]
+
+
+class Timer:
+    """計時的 context manager，離開時將耗時記錄到直方圖"""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram:
+    """累積區間直方圖"""
+
+    def __init__(
+        self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS, labels: Labels = ()
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts: List[int] = [0] * (len(self.buckets) + 1)  # 最後一格為 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def observe_since(self, start: float) -> float:
+        """記錄從 start（perf_counter）到現在的耗時，回傳現在的時間，方便串接連續的階段"""
+        now = time.perf_counter()
+        self.observe(now - start)
+        return now
+
+    def time(self) -> Timer:
+        return Timer(self)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative: List[list] = []
+            running = 0
+            for upper, bucket_count in zip((*self.buckets, "+Inf"), self.bucket_counts, strict=True):
+                running += bucket_count
+                cumulative.append([upper, running])
+            return {"type": "histogram", "count": self.count, "sum": self.sum, "buckets": cumulative}
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        snapshot = self.snapshot()
+        samples = [
+            (f"{self.name}_bucket", (*self.labels, ("le", _format_value(upper) if upper != "+Inf" else upper)), count)
+            for upper, count in snapshot["buckets"]
+        ]
+        samples.append((f"{self.name}_sum", self.labels, snapshot["sum"]))
+        samples.append((f"{self.name}_count", self.labels, snapshot["count"]))
+        return samples
+
+
+Metric = Union[Counter, Gauge, Histogram]
+MetricT = TypeVar("MetricT", Counter, Gauge, Histogram)
+
+
+class MetricsRegistry:
+    """指標註冊表，同名不同標籤的指標各自計數"""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Labels], Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, labels: Labels, factory: Callable[[], MetricT]) -> MetricT:
+        with self._lock:
+            metric = self._metrics.get((name, labels))
+            if metric is None:
+                metric = factory()
+                self._metrics[(name, labels)] = metric
+            return cast(MetricT, metric)
+
+    def counter(self, name: str, description: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        key = _label_key(labels)
+        return self._get_or_create(name, key, lambda: Counter(name, description, key))
+
+    def gauge(self, name: str, description: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+        key = _label_key(labels)
+        return self._get_or_create(name, key, lambda: Gauge(name, description, key))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        buckets: Optional[Tuple[float, ...]] = None,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> Histogram:
+        key = _label_key(labels)
+        return self._get_or_create(
+            name, key, lambda: Histogram(name, description, buckets or DEFAULT_LATENCY_BUCKETS, key)
+        )
+
+    def snapshot(self) -> Dict[str, dict]:
+        """取得所有指標的目前數值，帶標籤的指標以 name{key="value"} 為鍵"""
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {f"{name}{_format_labels(labels)}": metric.snapshot() for (name, labels), metric in metrics}
+
+    def render_prometheus(self) -> str:
+        """以 Prometheus 文字格式（0.0.4）輸出所有指標，同名的指標歸為一組"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        families: Dict[str, List[Metric]] = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+
+        lines: List[str] = []
+        for name, family in families.items():
+            first = family[0]
+            description = first.description.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {first.snapshot()['type']}")
+            for metric in family:
+                for sample_name, labels, value in metric.samples():
+                    lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 全域實例
+metrics = MetricsRegistry()
@@ -6,7 +6,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Dict, List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 # === 用戶相關模型 ===
 
@@ -128,7 +128,6 @@ class GameSession(BaseModel):
     map_index: int
     start_time: datetime
     end_time: Optional[datetime] = None
-    events: List[GameEvent] = []
     final_score: Optional[int] = None
     is_valid: bool = True
     validation_errors: List[str] = []
@@ -151,6 +150,21 @@ class GameEventValidationResponse(BaseModel):
     errors: List[str] = []
 
 
+class GameEventBatchValidationRequest(BaseModel):
+    """批次遊戲事件驗證請求（同一會話、依發生順序排列）"""
+
+    session_id: str
+    events: List[GameEvent] = Field(min_length=1, max_length=500)
+
+
+class GameEventBatchValidationResponse(BaseModel):
+    """批次遊戲事件驗證回應"""
+
+    is_valid: bool
+    accepted_count: int
+    results: List[GameEventValidationResponse]
+
+
 class GameSessionStartRequest(BaseModel):
     """遊戲會話開始請求"""
 
@@ -169,6 +183,24 @@ class GameSessionEndRequest(BaseModel):
     ghosts_eaten: int
 
 
+class GameSessionEndStatus(str, Enum):
+    """遊戲會話結束的處理狀態"""
+
+    PENDING = "pending"  # 等待背景驗證與寫入分數
+    COMPLETED = "completed"
+    FAILED = "failed"  # 驗證已完成但分數寫入失敗，重送結束請求會重試寫入
+
+
+class GameSessionEndTicket(BaseModel):
+    """遊戲會話結束的處理結果（結束請求立即回傳，驗證與分數寫入在背景完成）"""
+
+    session_id: str
+    status: GameSessionEndStatus
+    is_valid: Optional[bool] = None
+    score_id: Optional[int] = None
+    message: str = ""
+
+
 # === 地圖相關模型 ===
 
 
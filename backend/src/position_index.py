@@ -0,0 +1,59 @@
+"""
+地圖位置的空間索引
+將路網上的有效位置（豆子與能量豆只會放在這些位置上）以等距投影換算為公尺後放入均勻格網，
+查詢某點半徑內的位置只需檢查固定數量的格子，成本與地圖大小無關
+"""
+
+import math
+from array import array
+from typing import Dict, List, Sequence, Tuple
+
+METERS_PER_DEGREE = 111000  # 與 MapService._calculate_distance 相同的近似值
+
+
+class PositionIndex:
+    """有效位置的格網索引，位置以在 valid_positions 中的索引表示"""
+
+    def __init__(self, positions: Sequence[Sequence[float]], cell_size: float = 20.0):
+        self.cell_size = cell_size
+        # 以第一個位置的緯度計算經度的公尺換算（地圖範圍只有數公里，誤差可忽略）
+        reference_latitude = positions[0][0] if positions else 0.0
+        self._lng_scale = METERS_PER_DEGREE * math.cos(math.radians(reference_latitude))
+        self._xs = array("d")
+        self._ys = array("d")
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+
+        for index, (lat, lng) in enumerate(positions):
+            x, y = self._project(lat, lng)
+            self._xs.append(x)
+            self._ys.append(y)
+            self._cells.setdefault(self._cell(x, y), []).append(index)
+
+    def __len__(self) -> int:
+        return len(self._xs)
+
+    def _project(self, lat: float, lng: float) -> Tuple[float, float]:
+        return lng * self._lng_scale, lat * METERS_PER_DEGREE
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def within(self, position: Sequence[float], radius: float) -> List[Tuple[float, int]]:
+        """半徑（公尺）內的位置，回傳依距離排序的 (距離, 位置索引)"""
+        x, y = self._project(position[0], position[1])
+        size = self.cell_size
+        xs, ys, cells = self._xs, self._ys, self._cells
+        radius_squared = radius * radius
+
+        found = []
+        # 只檢查與查詢圓的外接正方形重疊的格子
+        for cx in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            for cy in range(int((y - radius) // size), int((y + radius) // size) + 1):
+                for index in cells.get((cx, cy), ()):
+                    dx = xs[index] - x
+                    dy = ys[index] - y
+                    distance_squared = dx * dx + dy * dy
+                    if distance_squared <= radius_squared:
+                        found.append((math.sqrt(distance_squared), index))
+        found.sort()
+        return found
@@ -0,0 +1,185 @@
+"""
+執行中行程的效能分析
+- sampling：背景執行緒定時讀取所有執行緒的呼叫堆疊（sys._current_frames），不需修改或重啟行程，
+  輸出 flamegraph.pl／speedscope 可直接讀取的 collapsed stacks（每行「執行緒;外層函式;...;內層函式 次數」）
+- cprofile：以 cProfile 記錄期間的每次函式呼叫，輸出依累計時間排序的 pstats 表格（額外成本較高）
+
+同一時間只允許一個分析；可由 /admin/profile 觸發，或在事件迴圈被佔滿時以 SIGUSR2 觸發並寫入檔案
+"""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from types import CodeType, FrameType
+from typing import Dict, Literal, Optional, Set
+
+ProfileMode = Literal["sampling", "cprofile"]
+
+# 閒置的執行緒（等待鎖、佇列或 I/O 事件）停在這些函式，預設不計入取樣
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """已有其他分析正在執行"""
+
+
+class SamplingProfiler:
+    """以固定間隔取樣所有執行緒的呼叫堆疊"""
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.excluded_threads: Set[int] = set()  # 不取樣的執行緒（如等待分析結束的執行緒）
+        self._labels: Dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """collapsed stacks 格式，最常出現的堆疊在前"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        self.excluded_threads.add(threading.get_ident())
+        thread_names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self.excluded_threads:
+                    continue
+                if not self.include_idle and self._is_idle(frame):
+                    continue
+                name = thread_names.get(thread_id)
+                if name is None:
+                    thread_names = {
+                        thread.ident: thread.name for thread in threading.enumerate() if thread.ident is not None
+                    }
+                    name = thread_names.get(thread_id, str(thread_id))
+                self.stacks[self._collapse(name, frame)] += 1
+            self.samples += 1
+
+    def _collapse(self, thread_name: str, frame: Optional[FrameType]) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name.replace(";", ":"))
+        return ";".join(reversed(labels))
+
+    @staticmethod
+    def _is_idle(frame: FrameType) -> bool:
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _frame_label(code: CodeType) -> str:
+    # collapsed stacks 以分號分隔堆疊、以最後一個空白分隔次數
+    label = f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label.replace(";", ":")
+
+
+async def capture_profile(
+    seconds: float, mode: ProfileMode = "sampling", interval: float = 0.005, include_idle: bool = False
+) -> str:
+    """分析目前行程 seconds 秒（期間事件迴圈照常處理其他請求），回傳 collapsed stacks 或 pstats 表格"""
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already being captured")
+    try:
+        if mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:  # 已有其他分析工具（如除錯器）在使用
+                raise ProfilerBusyError(str(e)) from e
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+            output = io.StringIO()
+            pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(80)
+            return output.getvalue()
+
+        profiler = SamplingProfiler(interval, include_idle)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        return profiler.collapsed()
+    finally:
+        _profile_lock.release()
+
+
+def capture_sampling_profile(seconds: float, interval: float = 0.005, include_idle: bool = False) -> str:
+    """在目前執行緒等待 seconds 秒並取樣（不經過事件迴圈），回傳 collapsed stacks"""
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already being captured")
+    try:
+        profiler = SamplingProfiler(interval, include_idle)
+        profiler.excluded_threads.add(threading.get_ident())
+        profiler.start()
+        try:
+            time.sleep(seconds)
+        finally:
+            profiler.stop()
+        return profiler.collapsed()
+    finally:
+        _profile_lock.release()
+
+
+def install_profile_signal_handler(directory: str, seconds: float, interval: float = 0.005) -> bool:
+    """收到 SIGUSR2 時在背景取樣 seconds 秒，將 collapsed stacks 寫入 directory
+
+    Python 的訊號處理函式在主執行緒的位元組碼之間執行，事件迴圈被同步程式碼佔滿時仍能觸發。
+    只能在主執行緒呼叫；平台不支援 SIGUSR2 或不在主執行緒時回傳 False
+    """
+    signum = getattr(signal, "SIGUSR2", None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def write_profile():
+        try:
+            collapsed = capture_sampling_profile(seconds, interval)
+        except ProfilerBusyError:
+            print("⚠️ 已有分析正在執行，略過 SIGUSR2")
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile-{os.getpid()}-{datetime.now():%Y%m%d-%H%M%S}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(collapsed)
+        print(f"📈 效能分析已寫入 {path}")
+
+    def handle_signal(_signum, _frame):
+        threading.Thread(target=write_profile, name="profile-signal", daemon=True).start()
+
+    signal.signal(signum, handle_signal)
+    return True
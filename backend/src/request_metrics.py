@@ -0,0 +1,74 @@
+"""
+HTTP 請求指標
+以 ASGI 中介層記錄每個路由的延遲直方圖、請求數（依狀態碼）與錯誤數，以及進行中的請求數。
+路由以 FastAPI 的路徑樣板（如 /game/session/{session_id}/result）為標籤，避免路徑參數造成標籤數量失控。
+"""
+
+import time
+from typing import Dict, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import Counter, Histogram, metrics
+
+HTTP_IN_FLIGHT = metrics.gauge("http_requests_in_flight", "進行中的 HTTP 請求數")
+
+# 沒有對應路由的請求（404 等）共用同一個標籤
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """記錄 HTTP 請求延遲、狀態碼與錯誤數的 ASGI 中介層（WebSocket 連線直接略過）"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # 每個 (method, route) 的指標，避免每個請求都經過註冊表的鎖
+        self._latency: Dict[Tuple[str, str], Histogram] = {}
+        self._errors: Dict[Tuple[str, str], Counter] = {}
+        self._requests: Dict[Tuple[str, str, int], Counter] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # 路由比對完成後 FastAPI 會將匹配的路由放入 scope
+            route = scope.get("route")
+            self._record(scope["method"], getattr(route, "path", UNMATCHED_ROUTE), status_code, start)
+
+    def _record(self, method: str, route: str, status_code: int, start: float):
+        key = (method, route)
+        latency = self._latency.get(key)
+        if latency is None:
+            labels = {"method": method, "route": route}
+            latency = self._latency[key] = metrics.histogram(
+                "http_request_duration_seconds", "HTTP 請求處理時間", labels=labels
+            )
+            self._errors[key] = metrics.counter("http_request_errors_total", "回應 5xx 或未處理例外的請求數", labels)
+        latency.observe(time.perf_counter() - start)
+
+        requests = self._requests.get((method, route, status_code))
+        if requests is None:
+            requests = self._requests[(method, route, status_code)] = metrics.counter(
+                "http_requests_total", "HTTP 請求數", {"method": method, "route": route, "status": str(status_code)}
+            )
+        requests.inc()
+        if status_code >= 500:
+            self._errors[key].inc()
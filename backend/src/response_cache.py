@@ -0,0 +1,111 @@
+"""
+回應快取
+讀多寫少的回應（排行榜、地圖配置）快取預先序列化的 JSON bytes，命中時不必重新查詢、建立 Pydantic 物件與序列化。
+快取項目記錄建立時資料的版本號，資料變更後版本號遞增，舊項目在下次讀取時重建；
+同一個鍵同時未命中的請求共用一次重建。回應帶 ETag 與短暫的 Cache-Control max-age，
+客戶端以 If-None-Match 重新驗證且內容未變時回傳 304（不含內容）。
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from metrics import metrics
+
+
+class CachedResponse:
+    """一個快取的回應內容"""
+
+    __slots__ = ("body", "etag", "version")
+
+    def __init__(self, body: bytes, version: int):
+        self.body = body
+        self.version = version
+        self.etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+class ResponseCache:
+    """以鍵與資料版本號查詢的 LRU 回應快取（只在事件迴圈中存取），max_size 為 0 時不保存"""
+
+    def __init__(self, name: str, max_size: int = 256):
+        self.name = name
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._pending: Dict[Tuple[Hashable, int], asyncio.Future] = {}
+        labels = {"cache": name}
+        self._hits = metrics.counter("response_cache_hits_total", "回應快取命中次數", labels)
+        self._misses = metrics.counter("response_cache_misses_total", "回應快取未命中而重建的次數", labels)
+        self._not_modified = metrics.counter("response_cache_not_modified_total", "回傳 304 的次數", labels)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: int) -> Optional[CachedResponse]:
+        """取得版本號相符的項目"""
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, version: int, body: bytes) -> CachedResponse:
+        entry = CachedResponse(body, version)
+        if self.max_size <= 0:
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_build(self, key: Hashable, version: int, build: Callable[[], Awaitable[bytes]]) -> CachedResponse:
+        """取得快取的回應，沒有或版本不符時以 build 重建（同時到達的請求共用一次重建）"""
+        entry = self.get(key, version)
+        if entry is not None:
+            self._hits.inc()
+            return entry
+
+        pending = self._pending.get((key, version))
+        if pending is not None:
+            self._hits.inc()
+            return await asyncio.shield(pending)
+
+        self._misses.inc()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[(key, version)] = future
+        try:
+            entry = self.put(key, version, await build())
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()  # 沒有其他等待者時不要警告例外未被取出
+            else:
+                future.cancel()
+            raise
+        finally:
+            del self._pending[(key, version)]
+        future.set_result(entry)
+        return entry
+
+    def response(self, request: Request, entry: CachedResponse, max_age: int) -> Response:
+        """建立 JSON 回應；If-None-Match 與 ETag 相符時回傳 304"""
+        headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={max_age}"}
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self._not_modified.inc()
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 以弱比較判斷（W/ 前綴視為相同），* 符合任何內容"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
@@ -0,0 +1,110 @@
+"""
+路網圖
+由 MapService 產生的鄰接表建立帶權重（公尺）的路網圖，提供兩點間沿道路的距離查詢：
+查詢以 A* 搜尋（直線距離為啟發值）並以距離上限截斷，只展開可能在上限內抵達終點的節點，
+並以 LRU 快取保存最近查詢過的節點對
+"""
+
+import heapq
+import math
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from position_index import METERS_PER_DEGREE, PositionIndex
+
+
+def _node_key(position: Sequence[float]) -> str:
+    """與 MapService._build_adjacency_list 相同的節點鍵"""
+    return f"{position[0]:.6f},{position[1]:.6f}"
+
+
+class RoadGraph:
+    """帶權重的路網圖，節點以整數編號"""
+
+    def __init__(self, adjacency_list: Dict[str, List[List[float]]], cache_size: int = 4096, max_expanded: int = 5000):
+        self.cache_size = cache_size
+        self.max_expanded = max_expanded  # 單次查詢最多展開的節點數，超過時放棄查詢
+        self._ids: Dict[str, int] = {}
+        positions: List[Tuple[float, float]] = []
+        for key in adjacency_list:
+            lat, lng = key.split(",")
+            self._ids[key] = len(positions)
+            positions.append((float(lat), float(lng)))
+
+        # 節點的平面座標（公尺），用於邊長與 A* 的直線距離啟發值
+        reference_latitude = positions[0][0] if positions else 0.0
+        lng_scale = METERS_PER_DEGREE * math.cos(math.radians(reference_latitude))
+        self._xs = [lng * lng_scale for _, lng in positions]
+        self._ys = [lat * METERS_PER_DEGREE for lat, _ in positions]
+        self._neighbors: List[List[Tuple[int, float]]] = [[] for _ in positions]
+        for key, neighbors in adjacency_list.items():
+            node = self._ids[key]
+            for neighbor_position in neighbors:
+                neighbor = self._ids.get(_node_key(neighbor_position))
+                if neighbor is not None:
+                    self._neighbors[node].append((neighbor, self._straight(node, neighbor)))
+
+        self.positions = positions
+        self.index = PositionIndex(positions)
+        # (起點, 終點) -> (距離, 是否為精確值)；非精確值表示實際距離大於此值
+        self._cache: OrderedDict[Tuple[int, int], Tuple[float, bool]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def nearest_node(self, position: Sequence[float], radius: float) -> Optional[Tuple[float, int]]:
+        """半徑（公尺）內最近的節點 (距離, 節點)，沒有則為 None"""
+        candidates = self.index.within(position, radius)
+        return candidates[0] if candidates else None
+
+    def distance(self, source: int, target: int, limit: float) -> Optional[float]:
+        """兩節點間沿道路的最短距離；超過 limit 時回傳 math.inf，展開節點數超過上限時回傳 None（無法判定）"""
+        if source == target:
+            return 0.0
+        key = (source, target) if source < target else (target, source)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            distance, exact = cached
+            if exact:
+                return distance if distance <= limit else math.inf
+            if distance >= limit:
+                return math.inf
+
+        distance = self._bounded_search(source, target, limit)
+        if distance is None:
+            return None
+        self._cache[key] = (distance, True) if distance <= limit else (limit, False)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return distance
+
+    def _straight(self, a: int, b: int) -> float:
+        return math.hypot(self._xs[a] - self._xs[b], self._ys[a] - self._ys[b])
+
+    def _bounded_search(self, source: int, target: int, limit: float) -> Optional[float]:
+        """A* 搜尋，剪除「已走距離 + 到終點直線距離」超過 limit 的節點"""
+        target_x, target_y = self._xs[target], self._ys[target]
+        xs, ys = self._xs, self._ys
+        best = {source: 0.0}
+        heap = [(self._straight(source, target), 0.0, source)]
+        expanded = 0
+        while heap:
+            _, distance, node = heapq.heappop(heap)
+            if node == target:
+                return distance
+            if distance > best[node]:
+                continue
+            expanded += 1
+            if expanded > self.max_expanded:
+                return None
+            for neighbor, length in self._neighbors[node]:
+                candidate = distance + length
+                if candidate >= best.get(neighbor, math.inf):
+                    continue
+                estimate = candidate + math.hypot(xs[neighbor] - target_x, ys[neighbor] - target_y)
+                if estimate <= limit:
+                    best[neighbor] = candidate
+                    heapq.heappush(heap, (estimate, candidate, neighbor))
+        return math.inf
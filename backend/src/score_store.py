@@ -0,0 +1,164 @@
+"""
+分數資料的欄式儲存
+以平行的 array 欄位取代每筆分數一個 dict，降低常駐記憶體用量
+"""
+
+from array import array
+from datetime import UTC, datetime, timedelta
+from typing import Iterator, List, Union
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# JSON 檔案中每筆分數的輸出格式
+_ROW_TEMPLATE = (
+    '{"id": %d, "user_id": %d, "score": %d, "level": %d, "map_index": %d, '
+    '"survival_time": %d, "dots_collected": %d, "ghosts_eaten": %d, "created_at": "%s"}'
+)
+
+
+def datetime_to_micros(value: Union[datetime, str]) -> int:
+    """將時間轉換為自 1970-01-01 起的微秒數（不做時區換算，帶時區者轉為 UTC）"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return (value - EPOCH) // ONE_MICROSECOND
+
+
+def micros_to_datetime(micros: int) -> datetime:
+    """將微秒數轉換回時間"""
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def is_score_row(obj: dict) -> bool:
+    """判斷 JSON 物件是否為分數記錄"""
+    return "user_id" in obj and "score" in obj and "map_index" in obj
+
+
+class ScoreStore:
+    """分數欄式儲存，每一列（row）對應一筆分數
+
+    分數記錄沒有文字欄位（created_at 以微秒整數儲存），因此不需要字串表。
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.user_ids = array("i")
+        self.scores = array("q")
+        self.levels = array("i")
+        self.map_indexes = array("i")
+        self.survival_times = array("i")
+        self.dots_collected = array("i")
+        self.ghosts_eaten = array("i")
+        self.created_at = array("q")  # 微秒
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _columns(self) -> tuple:
+        return (
+            self.ids,
+            self.user_ids,
+            self.scores,
+            self.levels,
+            self.map_indexes,
+            self.survival_times,
+            self.dots_collected,
+            self.ghosts_eaten,
+            self.created_at,
+        )
+
+    @staticmethod
+    def _row_values(score_data: dict) -> tuple:
+        return (
+            score_data["id"],
+            score_data["user_id"],
+            score_data["score"],
+            score_data["level"],
+            score_data["map_index"],
+            score_data["survival_time"],
+            score_data["dots_collected"],
+            score_data["ghosts_eaten"],
+            datetime_to_micros(score_data["created_at"]),
+        )
+
+    def _check_values(self, values: tuple):
+        for column, value in zip(self._columns(), values, strict=True):
+            array(column.typecode, (value,))
+
+    def validate(self, score_data: dict):
+        """檢查數值是否能放入欄位，超出範圍時拋出 OverflowError"""
+        self._check_values(self._row_values(score_data))
+
+    def append(self, score_data: dict) -> int:
+        """新增一筆分數，回傳列號"""
+        # 先檢查所有欄位，避免部分欄位寫入後失敗造成欄位長度不一致
+        self._check_values(self._row_values(score_data))
+        self.ids.append(score_data["id"])
+        self.user_ids.append(score_data["user_id"])
+        self.scores.append(score_data["score"])
+        self.levels.append(score_data["level"])
+        self.map_indexes.append(score_data["map_index"])
+        self.survival_times.append(score_data["survival_time"])
+        self.dots_collected.append(score_data["dots_collected"])
+        self.ghosts_eaten.append(score_data["ghosts_eaten"])
+        self.created_at.append(datetime_to_micros(score_data["created_at"]))
+        return len(self.ids) - 1
+
+    def extend(self, rows: List[dict]):
+        """批次新增多筆分數（用於載入檔案）
+
+        先將每個欄位轉成 array 並檢查範圍，全部成功後才附加，任何一筆超出範圍時所有欄位都維持原狀
+        """
+        new_columns = [
+            array(column.typecode, values)
+            for column, values in zip(
+                self._columns(),
+                (
+                    [r["id"] for r in rows],
+                    [r["user_id"] for r in rows],
+                    [r["score"] for r in rows],
+                    [r["level"] for r in rows],
+                    [r["map_index"] for r in rows],
+                    [r["survival_time"] for r in rows],
+                    [r["dots_collected"] for r in rows],
+                    [r["ghosts_eaten"] for r in rows],
+                    [datetime_to_micros(r["created_at"]) for r in rows],
+                ),
+                strict=True,
+            )
+        ]
+        for column, values in zip(self._columns(), new_columns, strict=True):
+            column.extend(values)
+
+    def row(self, row: int) -> dict:
+        """取得一列的 dict 表示"""
+        return {
+            "id": self.ids[row],
+            "user_id": self.user_ids[row],
+            "score": self.scores[row],
+            "level": self.levels[row],
+            "map_index": self.map_indexes[row],
+            "survival_time": self.survival_times[row],
+            "dots_collected": self.dots_collected[row],
+            "ghosts_eaten": self.ghosts_eaten[row],
+            "created_at": micros_to_datetime(self.created_at[row]),
+        }
+
+    def rows(self) -> Iterator[dict]:
+        """依序產生所有列"""
+        for row in range(len(self)):
+            yield self.row(row)
+
+    def copy(self) -> "ScoreStore":
+        """複製所有欄位（用於在鎖外寫檔）"""
+        store = ScoreStore()
+        for target, source in zip(store._columns(), self._columns(), strict=True):
+            target.extend(source)
+        return store
+
+    def iter_json_rows(self) -> Iterator[str]:
+        """產生每一列的 JSON 字串"""
+        for values in zip(*self._columns(), strict=True):
+            yield _ROW_TEMPLATE % (*values[:-1], micros_to_datetime(values[-1]))
@@ -0,0 +1,238 @@
+"""
+遊戲會話結束管線
+結束請求只登記一張待處理的票證並立即回傳，最終驗證（GameValidationService.end_game_session）
+與分數寫入（AsyncFileDB.create_score）由固定數量的背景 worker 從有界佇列中取出處理，
+客戶端以輪詢或長輪詢（等到有結果或逾時才回應）取得判定結果。
+
+票證以 session_id 為鍵：重送同一會話的結束請求會取得同一張票證，不會重複驗證；
+分數寫入失敗的票證在重送時只重試寫入。分數寫入也以 session_id 為鍵，重試時若前一次其實已落盤，
+資料庫回傳既有的分數記錄而不會再寫入一筆。票證保存在處理它的行程內，其他 worker 行程由會話狀態回答：
+會話仍在進行或結束中時為等待中，已完成時由摘要與已寫入的分數記錄回答。
+"""
+
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from config import settings
+from database import AsyncFileDB, async_db
+from game_validation_service import AsyncGameValidationService, async_game_validation_service
+from metrics import metrics
+from models import GameScore, GameSessionEndRequest, GameSessionEndStatus, GameSessionEndTicket
+
+# 管線指標
+END_QUEUE_DEPTH = metrics.gauge("session_end_queue_depth", "等待背景處理的會話結束請求數")
+END_PROCESSED = metrics.counter("session_end_processed_total", "背景處理完成的會話結束請求數")
+END_FAILED = metrics.counter("session_end_failed_total", "處理失敗的會話結束請求數")
+END_RETRIES = metrics.counter("session_end_retries_total", "重送的會話結束請求數")
+END_LATENCY = metrics.histogram("session_end_latency_seconds", "會話結束從受理到判定完成的時間")
+
+
+class _Ticket:
+    """一個會話結束請求的處理狀態"""
+
+    __slots__ = ("done", "request", "result", "submitted_at", "user_id")
+
+    def __init__(self, user_id: int, request: GameSessionEndRequest):
+        self.user_id = user_id
+        self.request = request
+        self.result = GameSessionEndTicket(
+            session_id=request.session_id, status=GameSessionEndStatus.PENDING, message="遊戲會話結束，等待驗證"
+        )
+        self.done = asyncio.Event()
+        self.submitted_at = time.perf_counter()
+
+
+class SessionFinalizer:
+    """以有界佇列與固定數量的背景 worker 處理遊戲會話結束"""
+
+    def __init__(
+        self,
+        service: AsyncGameValidationService,
+        database: AsyncFileDB,
+        workers: int = 4,
+        queue_size: int = 1000,
+        max_tickets: int = 10000,
+    ):
+        self.service = service
+        self.database = database
+        self.workers = workers
+        self.queue_size = queue_size  # 佇列滿時結束請求等待空位，而不是無限堆積
+        self.max_tickets = max_tickets  # 保留的票證上限，超過時淘汰最舊的已完成票證
+        self._tickets: OrderedDict[str, _Ticket] = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    async def submit(self, user_id: int, request: GameSessionEndRequest) -> Optional[GameSessionEndTicket]:
+        """受理結束請求並回傳目前的票證，會話不存在時回傳 None，會話屬於其他用戶時拋出 PermissionError"""
+        ticket = self._tickets.get(request.session_id)
+        if ticket is not None:
+            return await self._join(ticket, user_id)
+
+        session = await self.service.get_active_session(request.session_id)
+        # 等待期間同一會話的另一個結束請求可能已建立票證
+        ticket = self._tickets.get(request.session_id)
+        if ticket is not None:
+            return await self._join(ticket, user_id)
+        if session is None:
+            # 已結束（票證已淘汰，或由其他 worker 行程處理）
+            return await self._untracked_ticket(request.session_id, user_id)
+        if session.user_id != user_id:
+            raise PermissionError("Access denied")
+
+        ticket = _Ticket(user_id, request)
+        self._tickets[request.session_id] = ticket
+        self._evict_tickets()
+        await self._enqueue(ticket)
+        return ticket.result
+
+    async def _join(self, ticket: _Ticket, user_id: int) -> GameSessionEndTicket:
+        """重送的結束請求沿用既有的票證，處理失敗的票證重新排入佇列"""
+        if ticket.user_id != user_id:
+            raise PermissionError("Access denied")
+        END_RETRIES.inc()
+        if ticket.result.status == GameSessionEndStatus.FAILED:
+            ticket.result = ticket.result.model_copy(
+                update={"status": GameSessionEndStatus.PENDING, "message": "重試中"}
+            )
+            ticket.done.clear()
+            await self._enqueue(ticket)
+        return ticket.result
+
+    async def get_result(self, session_id: str, user_id: int, wait: float = 0) -> Optional[GameSessionEndTicket]:
+        """取得票證目前的狀態，wait > 0 時最多等待 wait 秒直到判定完成（長輪詢）"""
+        ticket = self._tickets.get(session_id)
+        if ticket is None:
+            return await self._untracked_ticket(session_id, user_id)
+        if ticket.user_id != user_id:
+            raise PermissionError("Access denied")
+
+        if wait > 0 and not ticket.done.is_set():
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(ticket.done.wait(), wait)
+        return ticket.result
+
+    async def _untracked_ticket(self, session_id: str, user_id: int) -> Optional[GameSessionEndTicket]:
+        """本行程沒有票證時（已淘汰，或由其他 worker 行程受理）由會話狀態回答，會話不存在時回傳 None"""
+        session = await self.service.get_active_session(session_id)
+        if session is not None:
+            # 會話仍在進行，或其他 worker 行程正在結束它
+            if session.user_id != user_id:
+                raise PermissionError("Access denied")
+            return GameSessionEndTicket(
+                session_id=session_id, status=GameSessionEndStatus.PENDING, message="遊戲會話結束，等待驗證"
+            )
+
+        summary = await self.service.get_session_stats(session_id)
+        if summary is None:
+            return None
+        if summary["user_id"] != user_id:
+            raise PermissionError("Access denied")
+        # 分數可能仍在其他 worker 行程寫入中，此時沒有分數記錄編號
+        score_id = await self.database.get_session_score_id(session_id) if summary["is_valid"] else None
+        return GameSessionEndTicket(
+            session_id=session_id,
+            status=GameSessionEndStatus.COMPLETED,
+            is_valid=summary["is_valid"],
+            score_id=score_id,
+            message="遊戲會話已結束",
+        )
+
+    def _evict_tickets(self):
+        while len(self._tickets) > self.max_tickets:
+            oldest = next(iter(self._tickets.values()))
+            if not oldest.done.is_set():
+                break
+            self._tickets.popitem(last=False)
+
+    async def _enqueue(self, ticket: _Ticket):
+        queue = self._ensure_workers()
+        await queue.put(ticket)
+        END_QUEUE_DEPTH.set(queue.qsize())
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        """在目前的事件迴圈上啟動背景 worker"""
+        if self._queue is None or all(task.done() for task in self._worker_tasks):
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._worker_tasks = [asyncio.create_task(self._worker(self._queue)) for _ in range(self.workers)]
+        return self._queue
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            ticket = await queue.get()
+            END_QUEUE_DEPTH.set(queue.qsize())
+            if ticket is None:
+                return
+            await self._process(ticket)
+
+    async def _process(self, ticket: _Ticket):
+        """最終驗證（重試時略過）並寫入分數"""
+        request = ticket.request
+        result = ticket.result
+        try:
+            if result.is_valid is None:
+                is_valid = await self.service.end_game_session(request.session_id, request)
+                result = result.model_copy(update={"is_valid": is_valid})
+
+            if result.is_valid is None:
+                # 會話已由其他 worker 行程結束：由其摘要與已寫入的分數記錄回答，而不是判定為無效
+                untracked = await self._untracked_ticket(request.session_id, ticket.user_id)
+                if untracked is None:
+                    raise LookupError("遊戲會話不存在或已結束")
+                result = untracked
+                # 分數可能仍在寫入中，之後的輪詢改由會話狀態回答，不保留這次的結果
+                if self._tickets.get(request.session_id) is ticket:
+                    del self._tickets[request.session_id]
+            elif result.is_valid:
+                game_score = GameScore(
+                    score=request.final_score,
+                    level=1,  # 可以從會話中獲取
+                    map_index=0,  # 可以從會話中獲取
+                    survival_time=request.survival_time,
+                    dots_collected=request.dots_collected,
+                    ghosts_eaten=request.ghosts_eaten,
+                )
+                # 以 session_id 為鍵寫入，前一次寫入其實已落盤時取得既有的記錄
+                score_record = await self.database.create_score(ticket.user_id, game_score, request.session_id)
+                result = result.model_copy(
+                    update={
+                        "status": GameSessionEndStatus.COMPLETED,
+                        "score_id": score_record.id,
+                        "message": "遊戲會話結束，分數已記錄",
+                    }
+                )
+            else:
+                result = result.model_copy(
+                    update={"status": GameSessionEndStatus.COMPLETED, "message": "遊戲會話結束，但驗證失敗，分數未記錄"}
+                )
+        except Exception as e:
+            END_FAILED.inc()
+            print(f"處理遊戲會話結束失敗: {request.session_id}, {e!r}")
+            result = result.model_copy(
+                update={"status": GameSessionEndStatus.FAILED, "message": f"Failed to end game session: {e!s}"}
+            )
+
+        ticket.result = result
+        ticket.done.set()
+        END_PROCESSED.inc()
+        END_LATENCY.observe(time.perf_counter() - ticket.submitted_at)
+
+    async def close(self):
+        """處理完佇列中剩餘的請求後停止 worker"""
+        running = [task for task in self._worker_tasks if not task.done()]
+        if self._queue is not None and running:
+            for _ in running:
+                await self._queue.put(None)
+            await asyncio.gather(*running)
+
+
+# 全域實例
+session_finalizer = SessionFinalizer(
+    async_game_validation_service,
+    async_db,
+    workers=settings.SESSION_END_WORKERS,
+    queue_size=settings.SESSION_END_QUEUE_SIZE,
+    max_tickets=settings.MAX_COMPLETED_SESSIONS,
+)
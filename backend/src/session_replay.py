@@ -0,0 +1,174 @@
+"""
+封存會話重播
+讀取 GameValidationService 寫入 SESSION_EVENT_LOG_DIR 的會話封存檔（完整事件記錄與摘要），
+以目前（或以 --rule 覆寫）的驗證規則在多個行程中平行重播，列出判定結果改變的會話：
+原本有效、重播後無效，以及原本無效、重播後有效，並回報每秒重播的會話數
+
+用法:
+    uv run src/session_replay.py session_logs
+    uv run src/session_replay.py session_logs --rule max_dot_distance=10 --workers 4 --output diff.jsonl
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from event_log import read_event_log_metadata, read_event_log_with_metadata
+from game_validation_service import GameValidationService
+from map_service import MapService
+from models import GameSessionEndRequest, GameSessionStartRequest, ProcessedMapData
+
+# 每個 worker 行程各自的驗證服務
+_service: Optional[GameValidationService] = None
+
+
+def _init_worker(maps: Optional[Dict[int, ProcessedMapData]], rules: Dict[str, float]):
+    """worker 行程初始化：載入地圖資料並套用覆寫的規則"""
+    global _service
+    worker_map_service = None
+    if maps is not None:
+        worker_map_service = MapService()
+        worker_map_service.cache.update(maps)
+    _service = GameValidationService(map_service=worker_map_service)
+    _service.game_rules.update(rules)
+
+
+def replay_session(service: GameValidationService, path: Path) -> Optional[Dict]:
+    """以 service 的規則重播一個封存檔，檔案不存在或沒有摘要時回傳 None"""
+    archive = read_event_log_with_metadata(path)
+    if archive is None:
+        return None
+    log, metadata = archive
+    if metadata is None:
+        return None
+    summary = metadata["summary"]
+    end_request = metadata["end_request"]
+
+    session_id = service.start_game_session(summary["user_id"], GameSessionStartRequest(map_index=summary["map_index"]))
+    with service.store.update(session_id) as record:
+        assert record is not None
+        record.session.start_time = datetime.fromisoformat(summary["start_time"])
+    service.validate_game_events(session_id, list(log))
+
+    if end_request is not None:
+        end_time = datetime.fromisoformat(summary["end_time"]) if summary["end_time"] else None
+        request = GameSessionEndRequest(**{**end_request, "session_id": session_id})
+        service.end_game_session(session_id, request, end_time=end_time)
+    else:
+        # 原本因閒置逾時被回收
+        service.reap_expired_sessions(now=math.inf)
+
+    replayed = service.get_session_stats(session_id) or {}
+    return {
+        "session_id": summary["session_id"],
+        "user_id": summary["user_id"],
+        "map_index": summary["map_index"],
+        "events": len(log),
+        "was_valid": summary["is_valid"],
+        "is_valid": replayed.get("is_valid", False),
+        "original_errors": summary["validation_errors"],
+        "errors": replayed.get("validation_errors", []),
+    }
+
+
+def _replay_path(path: Path) -> Optional[Dict]:
+    assert _service is not None
+    # 每個重播的會話都會印出開始與結束訊息
+    with contextlib.redirect_stdout(io.StringIO()):
+        return replay_session(_service, path)
+
+
+def _parse_rules(values: List[str]) -> Dict[str, float]:
+    """解析 --rule key=value，只接受既有的規則名稱"""
+    known = GameValidationService().game_rules
+    rules = {}
+    for value in values:
+        key, sep, raw = value.partition("=")
+        if not sep or key not in known:
+            raise SystemExit(f"未知的規則: {value}（可用: {', '.join(known)}）")
+        rules[key] = json.loads(raw)
+    return rules
+
+
+async def _load_maps(map_indexes: List[int]) -> Dict[int, ProcessedMapData]:
+    """在主行程載入一次地圖資料（與伺服器相同：記憶體、磁碟快取，最後才向 OSM 取得）"""
+    service = MapService()
+    maps = {}
+    for map_index in map_indexes:
+        data = await service.get_processed_map_data(map_index)
+        if data is None:
+            print(f"無法載入地圖 {map_index}，該地圖的會話不檢查收集位置與移動距離")
+        else:
+            maps[map_index] = data
+    return maps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以目前或覆寫的驗證規則重播封存的遊戲會話")
+    parser.add_argument("directory", help="會話封存目錄（SESSION_EVENT_LOG_DIR）")
+    parser.add_argument("--rule", action="append", default=[], help="覆寫驗證規則，例如 max_dot_distance=10，可重複")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="重播的行程數")
+    parser.add_argument("--no-maps", action="store_true", help="不載入地圖（不檢查收集位置與移動距離）")
+    parser.add_argument("--output", help="將判定改變的會話寫入此 JSONL 檔")
+    parser.add_argument("--show", type=int, default=10, help="每一類最多列出的會話數")
+    args = parser.parse_args()
+
+    rules = _parse_rules(args.rule)
+    paths = []
+    map_indexes = set()
+    skipped = 0
+    for path in sorted(Path(args.directory).glob("*.evlog")):
+        metadata = read_event_log_metadata(path)
+        if metadata is None:
+            skipped += 1
+            continue
+        paths.append(path)
+        map_indexes.add(metadata["summary"]["map_index"])
+    if not paths:
+        print(f"{args.directory} 中沒有可重播的會話封存檔（跳過 {skipped} 個沒有摘要的檔案）")
+        return
+
+    maps = None if args.no_maps else asyncio.run(_load_maps(sorted(map_indexes)))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(maps, rules)) as executor:
+        chunksize = max(1, len(paths) // (args.workers * 8))
+        results = [result for result in executor.map(_replay_path, paths, chunksize=chunksize) if result is not None]
+    elapsed = time.perf_counter() - start
+
+    newly_invalid = [result for result in results if result["was_valid"] and not result["is_valid"]]
+    newly_valid = [result for result in results if not result["was_valid"] and result["is_valid"]]
+
+    print(f"規則覆寫: {rules or '無'}")
+    print(
+        f"重播 {len(results)} 個會話（{sum(result['events'] for result in results)} 個事件），"
+        f"{args.workers} 個行程，{elapsed:.2f} 秒，{len(results) / elapsed:.1f} 會話/秒"
+    )
+    if skipped:
+        print(f"跳過 {skipped} 個沒有摘要的封存檔")
+    print(f"原本有效、重播後無效: {len(newly_invalid)}")
+    for result in newly_invalid[: args.show]:
+        print(f"  {result['session_id']}  用戶 {result['user_id']}  {result['errors'][0] if result['errors'] else ''}")
+    print(f"原本無效、重播後有效: {len(newly_valid)}")
+    for result in newly_valid[: args.show]:
+        original = result["original_errors"][0] if result["original_errors"] else ""
+        print(f"  {result['session_id']}  用戶 {result['user_id']}  原本: {original}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in newly_invalid + newly_valid:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        print(f"已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
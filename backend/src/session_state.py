@@ -0,0 +1,152 @@
+"""
+進行中遊戲會話的驗證狀態
+"""
+
+from collections import Counter, deque
+from typing import Deque, Optional, Set, Tuple
+
+from event_log import EventLog
+from models import GameEvent, GameEventType, GameSession
+
+# 滾動視窗大小（以已接受的事件數計算）
+SCORE_RATE_WINDOW = 10  # 分數增長速度：最近 10 個事件中的得分事件
+GHOST_POWER_WINDOW = 20  # 吃鬼：最近 20 個事件內需有能量豆
+POWER_PELLET_WINDOW = 10  # 能量豆頻率：最近 10 個事件中的能量豆
+
+SCORING_EVENT_TYPES = (GameEventType.DOT_COLLECTED, GameEventType.POWER_PELLET_COLLECTED, GameEventType.GHOST_EATEN)
+# 會消耗地圖上一個位置的收集事件（豆子與能量豆都放在路網的有效位置上）
+DOT_EVENT_TYPES = (GameEventType.DOT_COLLECTED, GameEventType.POWER_PELLET_COLLECTED)
+# 之後玩家會被放回起點的事件，下一個座標不與之前的座標比較移動距離
+POSITION_RESET_EVENT_TYPES = (GameEventType.LIFE_LOST, GameEventType.LEVEL_COMPLETED)
+
+
+class SessionValidationState:
+    """會話的增量驗證狀態
+
+    每個已接受的事件都會更新這些統計，讓逐事件檢查與最終驗證都是 O(1)，不需要回頭掃描事件列表。
+    視窗內的項目以事件序號記錄，序號落出視窗時從左側移除。事件本身保存在精簡的 EventLog 中，
+    被拒絕的事件也會記錄（標示為未接受，不影響統計），讓封存的會話可以用新的規則重播；
+    由跨行程的會話儲存區載入時，events 只包含本次更新新增、尚未寫回的事件。
+    """
+
+    __slots__ = (
+        "consumed_dots",
+        "event_count",
+        "events",
+        "last_game_time_remaining",
+        "last_position",
+        "last_power_pellet",
+        "last_timestamp",
+        "logged_count",
+        "recent_power_pellets",
+        "recent_scoring",
+        "recent_scoring_gain",
+        "type_counts",
+    )
+
+    def __init__(self):
+        self.events = EventLog()
+        self.event_count = 0  # 已接受的事件數
+        self.logged_count = 0  # 事件記錄的總列數（含被拒絕的事件）
+        self.last_timestamp = 0.0
+        self.last_game_time_remaining = 0
+        # 最近 SCORE_RATE_WINDOW 個事件中的得分事件 (序號, 時間戳, 分數變化) 與分數變化總和
+        self.recent_scoring: Deque[Tuple[int, float, int]] = deque()
+        self.recent_scoring_gain = 0
+        # 最近 POWER_PELLET_WINDOW 個事件中的能量豆 (序號, 時間戳)
+        self.recent_power_pellets: Deque[Tuple[int, float]] = deque()
+        self.last_power_pellet: Optional[Tuple[int, float]] = None
+        self.type_counts: Counter[GameEventType] = Counter()
+        # 最後一個帶座標事件的 (緯度, 經度, 時間戳)；失去生命或過關後玩家回到起點，重新開始追蹤
+        self.last_position: Optional[Tuple[float, float, float]] = None
+        # 本關已被收集的地圖位置（valid_positions 的索引），過關後重新佈置豆子時清空
+        self.consumed_dots: Set[int] = set()
+
+    def record(self, event: GameEvent, dot: Optional[int] = None):
+        """記錄一個已接受的事件，dot 為收集事件對應到的地圖位置"""
+        self.events.append(event)
+        self.logged_count += 1
+        index = self.event_count
+        self.event_count += 1
+        self.last_timestamp = event.timestamp
+        self.last_game_time_remaining = event.game_time_remaining
+        self.type_counts[event.event_type] += 1
+
+        if event.event_type in SCORING_EVENT_TYPES:
+            score_change = event.score_after - event.score_before
+            self.recent_scoring.append((index, event.timestamp, score_change))
+            self.recent_scoring_gain += score_change
+        if event.event_type == GameEventType.POWER_PELLET_COLLECTED:
+            self.recent_power_pellets.append((index, event.timestamp))
+            self.last_power_pellet = (index, event.timestamp)
+        if dot is not None:
+            self.consumed_dots.add(dot)
+        elif event.event_type == GameEventType.LEVEL_COMPLETED:
+            self.consumed_dots.clear()
+
+        if event.event_type in POSITION_RESET_EVENT_TYPES:
+            self.last_position = None
+        elif event.player_position is not None and len(event.player_position) == 2:
+            self.last_position = (event.player_position[0], event.player_position[1], event.timestamp)
+
+        while self.recent_scoring and self.recent_scoring[0][0] < self.event_count - SCORE_RATE_WINDOW:
+            self.recent_scoring_gain -= self.recent_scoring.popleft()[2]
+        while self.recent_power_pellets and self.recent_power_pellets[0][0] < self.event_count - POWER_PELLET_WINDOW:
+            self.recent_power_pellets.popleft()
+
+    def record_rejected(self, event: GameEvent):
+        """記錄一個被拒絕的事件（只寫入事件記錄）"""
+        self.events.append(event, accepted=False)
+        self.logged_count += 1
+
+    def power_pellet_within(self, window: int) -> Optional[float]:
+        """最近 window 個事件內最後一次吃能量豆的時間戳，沒有則為 None"""
+        if self.last_power_pellet is None or self.last_power_pellet[0] < self.event_count - window:
+            return None
+        return self.last_power_pellet[1]
+
+    def dump(self) -> dict:
+        """序列化為 JSON 相容的 dict（不含事件記錄）"""
+        return {
+            "event_count": self.event_count,
+            "logged_count": self.logged_count,
+            "last_timestamp": self.last_timestamp,
+            "last_game_time_remaining": self.last_game_time_remaining,
+            "recent_scoring": list(self.recent_scoring),
+            "recent_scoring_gain": self.recent_scoring_gain,
+            "recent_power_pellets": list(self.recent_power_pellets),
+            "last_power_pellet": self.last_power_pellet,
+            "type_counts": {event_type.value: count for event_type, count in self.type_counts.items()},
+            "consumed_dots": sorted(self.consumed_dots),
+            "last_position": self.last_position,
+        }
+
+    @classmethod
+    def load(cls, data: dict) -> "SessionValidationState":
+        """由 dump 的輸出還原，事件記錄為空"""
+        state = cls()
+        state.event_count = data["event_count"]
+        state.logged_count = data["logged_count"]
+        state.last_timestamp = data["last_timestamp"]
+        state.last_game_time_remaining = data["last_game_time_remaining"]
+        state.recent_scoring = deque(tuple(item) for item in data["recent_scoring"])
+        state.recent_scoring_gain = data["recent_scoring_gain"]
+        state.recent_power_pellets = deque(tuple(item) for item in data["recent_power_pellets"])
+        last_power_pellet = data["last_power_pellet"]
+        state.last_power_pellet = tuple(last_power_pellet) if last_power_pellet else None
+        state.type_counts = Counter({GameEventType(key): count for key, count in data["type_counts"].items()})
+        state.consumed_dots = set(data["consumed_dots"])
+        last_position = data["last_position"]
+        state.last_position = tuple(last_position) if last_position else None
+        return state
+
+
+class SessionRecord:
+    """進行中會話在儲存區中的一筆記錄"""
+
+    __slots__ = ("last_activity", "session", "state")
+
+    def __init__(self, session: GameSession, state: SessionValidationState, last_activity: float):
+        self.session = session
+        self.state = state
+        self.last_activity = last_activity  # time.time()，跨行程共用
@@ -0,0 +1,359 @@
+"""
+遊戲會話儲存區
+GameValidationService 透過此介面存取進行中的會話與已完成會話的摘要：
+- InMemorySessionStore：單一行程內的 dict，預設使用
+- SQLiteSessionStore：多個 worker 行程共用的 SQLite 檔案，依 session_id 分片，
+  每次更新在所屬分片上取得寫入鎖，同一會話的事件即使落在不同 worker 也會依序驗證
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple, Union
+
+from event_log import EventLog
+from models import GameEvent, GameSession
+from session_state import SessionRecord, SessionValidationState
+
+
+class SessionStore(ABC):
+    """會話儲存區介面"""
+
+    def __init__(self, max_completed_sessions: int = 10000):
+        self.max_completed_sessions = max_completed_sessions
+
+    @abstractmethod
+    def create(self, record: SessionRecord):
+        """新增進行中的會話"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        """讀取進行中會話的快照（修改不會寫回）"""
+
+    @abstractmethod
+    def update(self, session_id: str, touch: bool = True) -> ContextManager[Optional[SessionRecord]]:
+        """鎖定進行中的會話供修改（context manager），離開時寫回；touch 時一併更新最後活動時間，會話不存在時得到 None"""
+
+    @abstractmethod
+    def complete(self, session_id: str, summary: Dict) -> Tuple[Optional[EventLog], int]:
+        """將會話移出進行中列表並保存摘要，回傳 (完整事件記錄, 因容量上限淘汰的摘要數)；會話已不存在時回傳 (None, 0)"""
+
+    @abstractmethod
+    def events(self, session_id: str) -> Optional[EventLog]:
+        """取得進行中會話的完整事件記錄"""
+
+    @abstractmethod
+    def get_summary(self, session_id: str) -> Optional[Dict]:
+        """取得已完成會話的摘要（並標記為最近使用）"""
+
+    @abstractmethod
+    def idle_session_ids(self, last_activity_before: float) -> List[str]:
+        """最後活動時間早於指定時間的進行中會話"""
+
+    @abstractmethod
+    def counts(self) -> Tuple[int, int]:
+        """(進行中會話數, 已完成會話摘要數)"""
+
+
+class InMemorySessionStore(SessionStore):
+    """單一行程內的會話儲存區"""
+
+    def __init__(self, max_completed_sessions: int = 10000):
+        super().__init__(max_completed_sessions)
+        self._active: Dict[str, SessionRecord] = {}
+        # 已完成的會話只保留統計摘要（不含事件列表），依最近使用順序淘汰
+        self._completed: OrderedDict[str, Dict] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def create(self, record: SessionRecord):
+        with self._lock:
+            self._active[record.session.session_id] = record
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        return self._active.get(session_id)
+
+    @contextmanager
+    def update(self, session_id: str, touch: bool = True) -> Iterator[Optional[SessionRecord]]:
+        with self._lock:
+            record = self._active.get(session_id)
+            yield record
+            if record is not None and touch:
+                record.last_activity = time.time()
+
+    def complete(self, session_id: str, summary: Dict) -> Tuple[Optional[EventLog], int]:
+        with self._lock:
+            record = self._active.pop(session_id, None)
+            if record is None:
+                return None, 0
+
+            self._completed[session_id] = summary
+            self._completed.move_to_end(session_id)
+            evicted = 0
+            while len(self._completed) > self.max_completed_sessions:
+                self._completed.popitem(last=False)
+                evicted += 1
+            return record.state.events, evicted
+
+    def events(self, session_id: str) -> Optional[EventLog]:
+        record = self._active.get(session_id)
+        return record.state.events if record is not None else None
+
+    def get_summary(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            summary = self._completed.get(session_id)
+            if summary is None:
+                return None
+            self._completed.move_to_end(session_id)
+            return dict(summary)
+
+    def idle_session_ids(self, last_activity_before: float) -> List[str]:
+        with self._lock:
+            return [
+                session_id for session_id, record in self._active.items() if record.last_activity < last_activity_before
+            ]
+
+    def counts(self) -> Tuple[int, int]:
+        return len(self._active), len(self._completed)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS active_sessions (
+    session_id TEXT PRIMARY KEY,
+    last_activity REAL NOT NULL,
+    session TEXT NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS active_sessions_last_activity ON active_sessions (last_activity);
+CREATE TABLE IF NOT EXISTS session_events (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    accepted INTEGER NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS completed_sessions (
+    session_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completed_sessions_last_access ON completed_sessions (last_access);
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """以 SQLite 檔案在多個 worker 行程間共用的會話儲存區
+
+    會話依 session_id 的 CRC32 分散到 shards 個資料庫檔案，每次更新以 BEGIN IMMEDIATE
+    取得該分片的寫入鎖，因此鎖的範圍是分片而非整個儲存區。會話狀態只在遊戲進行期間有用，
+    使用 WAL 與 synchronous=NORMAL，不在每次提交時 fsync。
+    """
+
+    def __init__(self, directory: Union[str, Path], shards: int = 8, max_completed_sessions: int = 10000):
+        super().__init__(max_completed_sessions)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.shards = shards
+        # 每個分片保留的已完成摘要上限
+        self._completed_per_shard = max(1, max_completed_sessions // shards)
+        self._connections: Dict[int, sqlite3.Connection] = {}
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._pid = os.getpid()
+
+    def _shard(self, session_id: str) -> int:
+        return zlib.crc32(session_id.encode()) % self.shards
+
+    def _connection(self, shard: int) -> sqlite3.Connection:
+        """取得分片連線（連線不跨行程共用，fork 後重新開啟）"""
+        if self._pid != os.getpid():
+            self._connections = {}
+            self._pid = os.getpid()
+
+        connection = self._connections.get(shard)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.directory / f"sessions-{shard}.db",
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connections[shard] = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self, session_id: str) -> Iterator[sqlite3.Connection]:
+        """在會話所屬分片上開啟寫入交易"""
+        shard = self._shard(session_id)
+        with self._locks[shard]:
+            connection = self._connection(shard)
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    @staticmethod
+    def _load_record(row) -> SessionRecord:
+        session_json, state_json, last_activity = row
+        return SessionRecord(
+            GameSession.model_validate_json(session_json),
+            SessionValidationState.load(json.loads(state_json)),
+            last_activity,
+        )
+
+    def create(self, record: SessionRecord):
+        with self._transaction(record.session.session_id) as connection:
+            connection.execute(
+                "INSERT INTO active_sessions (session_id, last_activity, session, state) VALUES (?, ?, ?, ?)",
+                (
+                    record.session.session_id,
+                    record.last_activity,
+                    record.session.model_dump_json(),
+                    json.dumps(record.state.dump()),
+                ),
+            )
+            self._insert_events(connection, record.session.session_id, 0, record.state.events)
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        shard = self._shard(session_id)
+        with self._locks[shard]:
+            row = (
+                self._connection(shard)
+                .execute(
+                    "SELECT session, state, last_activity FROM active_sessions WHERE session_id = ?", (session_id,)
+                )
+                .fetchone()
+            )
+        return self._load_record(row) if row is not None else None
+
+    @contextmanager
+    def update(self, session_id: str, touch: bool = True) -> Iterator[Optional[SessionRecord]]:
+        with self._transaction(session_id) as connection:
+            row = connection.execute(
+                "SELECT session, state, last_activity FROM active_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                yield None
+                return
+
+            record = self._load_record(row)
+            first_seq = record.state.logged_count
+            yield record
+
+            # 載入時事件記錄為空，其中的事件都是這次新增的
+            self._insert_events(connection, session_id, first_seq, record.state.events)
+            if touch:
+                record.last_activity = time.time()
+            connection.execute(
+                "UPDATE active_sessions SET last_activity = ?, session = ?, state = ? WHERE session_id = ?",
+                (
+                    record.last_activity,
+                    record.session.model_dump_json(),
+                    json.dumps(record.state.dump()),
+                    session_id,
+                ),
+            )
+
+    @staticmethod
+    def _insert_events(connection: sqlite3.Connection, session_id: str, first_seq: int, events: EventLog):
+        if len(events):
+            connection.executemany(
+                "INSERT INTO session_events (session_id, seq, event, accepted) VALUES (?, ?, ?, ?)",
+                [
+                    (session_id, first_seq + row, events.event(row).model_dump_json(), events.accepted[row])
+                    for row in range(len(events))
+                ],
+            )
+
+    def complete(self, session_id: str, summary: Dict) -> Tuple[Optional[EventLog], int]:
+        with self._transaction(session_id) as connection:
+            deleted = connection.execute("DELETE FROM active_sessions WHERE session_id = ?", (session_id,))
+            if deleted.rowcount == 0:
+                return None, 0
+
+            log = self._read_events(connection, session_id)
+            connection.execute("DELETE FROM session_events WHERE session_id = ?", (session_id,))
+            connection.execute(
+                "INSERT OR REPLACE INTO completed_sessions (session_id, last_access, summary) VALUES (?, ?, ?)",
+                (session_id, time.time(), json.dumps(summary, ensure_ascii=False)),
+            )
+
+            (completed,) = connection.execute("SELECT COUNT(*) FROM completed_sessions").fetchone()
+            evicted = max(0, completed - self._completed_per_shard)
+            if evicted:
+                connection.execute(
+                    "DELETE FROM completed_sessions WHERE session_id IN "
+                    "(SELECT session_id FROM completed_sessions ORDER BY last_access LIMIT ?)",
+                    (evicted,),
+                )
+            return log, evicted
+
+    @staticmethod
+    def _read_events(connection: sqlite3.Connection, session_id: str) -> EventLog:
+        log = EventLog()
+        for event_json, accepted in connection.execute(
+            "SELECT event, accepted FROM session_events WHERE session_id = ? ORDER BY seq", (session_id,)
+        ):
+            log.append(GameEvent.model_validate_json(event_json), accepted=bool(accepted))
+        return log
+
+    def events(self, session_id: str) -> Optional[EventLog]:
+        shard = self._shard(session_id)
+        with self._locks[shard]:
+            connection = self._connection(shard)
+            exists = connection.execute("SELECT 1 FROM active_sessions WHERE session_id = ?", (session_id,)).fetchone()
+            return self._read_events(connection, session_id) if exists else None
+
+    def get_summary(self, session_id: str) -> Optional[Dict]:
+        with self._transaction(session_id) as connection:
+            row = connection.execute(
+                "SELECT summary FROM completed_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE completed_sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id)
+            )
+            summary: Dict = json.loads(row[0])
+            return summary
+
+    def idle_session_ids(self, last_activity_before: float) -> List[str]:
+        session_ids: List[str] = []
+        for shard in range(self.shards):
+            with self._locks[shard]:
+                rows = self._connection(shard).execute(
+                    "SELECT session_id FROM active_sessions WHERE last_activity < ?", (last_activity_before,)
+                )
+                session_ids.extend(session_id for (session_id,) in rows)
+        return session_ids
+
+    def counts(self) -> Tuple[int, int]:
+        active = completed = 0
+        for shard in range(self.shards):
+            with self._locks[shard]:
+                connection = self._connection(shard)
+                active += connection.execute("SELECT COUNT(*) FROM active_sessions").fetchone()[0]
+                completed += connection.execute("SELECT COUNT(*) FROM completed_sessions").fetchone()[0]
+        return active, completed
+
+
+def create_session_store(
+    backend: str, directory: Union[str, Path], shards: int, max_completed_sessions: int
+) -> SessionStore:
+    """依設定建立會話儲存區（backend 為 memory 或 sqlite）"""
+    if backend == "sqlite":
+        return SQLiteSessionStore(directory, shards=shards, max_completed_sessions=max_completed_sessions)
+    if backend == "memory":
+        return InMemorySessionStore(max_completed_sessions=max_completed_sessions)
+    raise ValueError(f"Unknown session store backend: {backend}")
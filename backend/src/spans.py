@@ -0,0 +1,106 @@
+"""
+區段計時（span timers）
+以 @span 標記熱點方法；預設不包裝任何東西，被標記的方法就是原本的函式，沒有額外成本。
+執行期呼叫 enable_spans() 時才將類別上的方法換成計時版本，disable_spans() 換回原本的函式。
+耗時記錄於 /metrics 的 span_seconds{span="類別.方法"}
+
+只適用於類別上的方法：已先取出的綁定方法（如 functools.partial(db.get_leaderboard)）不受切換影響
+"""
+
+import functools
+import inspect
+import sys
+import threading
+import time
+from typing import Callable, List
+
+from metrics import metrics
+
+# 區段耗時區間（秒）：涵蓋微秒等級的查詢到數秒的地圖建置
+SPAN_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# 各模組的 @span 於匯入時註冊
+_spans: List[Callable] = []
+_lock = threading.Lock()
+_enabled = False
+
+
+def span[F: Callable](func: F) -> F:
+    """標記一般方法為可計時的區段，原樣回傳函式（不支援 staticmethod／classmethod）"""
+    _spans.append(func)
+    return func
+
+
+def spans_enabled() -> bool:
+    return _enabled
+
+
+def span_names() -> List[str]:
+    return [func.__qualname__ for func in _spans]
+
+
+def enable_spans():
+    """將所有標記的方法換成計時版本"""
+    global _enabled
+    with _lock:
+        if _enabled:
+            return
+        for func in _spans:
+            owner, name = _resolve_owner(func)
+            setattr(owner, name, _timed(func))
+        _enabled = True
+
+
+def disable_spans():
+    """換回原本的方法"""
+    global _enabled
+    with _lock:
+        if not _enabled:
+            return
+        for func in _spans:
+            owner, name = _resolve_owner(func)
+            setattr(owner, name, func)
+        _enabled = False
+
+
+def set_spans_enabled(enabled: bool):
+    if enabled:
+        enable_spans()
+    else:
+        disable_spans()
+
+
+def _resolve_owner(func: Callable):
+    """由 __qualname__ 找出定義方法的類別（巢狀類別亦可）"""
+    *path, name = func.__qualname__.split(".")
+    owner = sys.modules[func.__module__]
+    for part in path:
+        owner = getattr(owner, part)
+    return owner, name
+
+
+def _timed(func: Callable) -> Callable:
+    histogram = metrics.histogram("span_seconds", "標記區段的耗時", SPAN_BUCKETS, labels={"span": func.__qualname__})
+    observe = histogram.observe
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - start)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            observe(time.perf_counter() - start)
+
+    return wrapper
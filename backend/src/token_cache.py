@@ -0,0 +1,69 @@
+"""
+已驗證 JWT 的快取
+同一個 access token 在一場遊戲中會被送上數百次，每次都完整驗證簽章、解析 JSON 再線性搜尋用戶並不必要。
+快取以 token 的 SHA-256 雜湊為鍵（不保存 token 本身），保存解析後的 claims 與對應的用戶資料：
+項目在 token 的 exp 到期時失效，用戶資料則以資料庫的用戶版本號比對，用戶記錄變更後重新讀取。
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from models import TokenData, UserInDB
+
+
+class CachedToken:
+    """一個已驗證 token 的快取項目"""
+
+    __slots__ = ("expires_at", "token_data", "user")
+
+    def __init__(self, token_data: TokenData, expires_at: float):
+        self.token_data = token_data
+        self.expires_at = expires_at  # token 的 exp（Unix 秒）
+        # (用戶版本號, 用戶)，整個 tuple 一次替換，並行的請求不會讀到不一致的組合
+        self.user: Optional[Tuple[int, UserInDB]] = None
+
+
+class VerifiedTokenCache:
+    """以 token 雜湊為鍵的 LRU 快取，max_size 為 0 時停用"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, CachedToken] = OrderedDict()
+        # 同步的相依函式在執行緒池中執行，存取需要加鎖
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key: bytes, now: Optional[float] = None) -> Optional[CachedToken]:
+        """取得未過期的項目"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: bytes, entry: CachedToken):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -7,6 +7,9 @@ import { authenticatedFetch } from './auth.js';
 // 後端 API 基礎 URL
 const API_BASE_URL = 'http://localhost:8000';
 
+// 批次驗證每個請求的事件上限（與後端一致）
+const MAX_EVENTS_PER_BATCH = 500;
+
 // 遊戲事件類型
 export const GameEventType = {
     GAME_START: "game_start",
@@ -99,7 +102,12 @@ class GameValidationService {
 
             const result = await response.json();
             console.log('✅ 遊戲驗證會話已結束:', result);
-            
+
+            // 最終驗證與分數寫入在背景進行，不阻擋結算畫面
+            if (result.status === 'pending') {
+                this.waitForSessionResult(this.currentSessionId);
+            }
+
             this.currentSessionId = null;
             return result;
         } catch (error) {
@@ -108,6 +116,31 @@ class GameValidationService {
         }
     }
 
+    /**
+     * 等待會話結束的判定結果（長輪詢，最多重試數次）
+     */
+    async waitForSessionResult(sessionId, attempts = 5) {
+        for (let attempt = 0; attempt < attempts; attempt++) {
+            try {
+                const response = await authenticatedFetch(
+                    `${API_BASE_URL}/game/session/${encodeURIComponent(sessionId)}/result?wait=10`
+                );
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+                }
+
+                const result = await response.json();
+                if (result.status !== 'pending') {
+                    console.log('✅ 遊戲會話判定結果:', result);
+                    return result;
+                }
+            } catch (error) {
+                console.warn('⚠️ 取得遊戲會話判定結果失敗:', error);
+            }
+        }
+        return null;
+    }
+
     /**
      * 報告遊戲事件
      */
@@ -165,9 +198,9 @@ class GameValidationService {
             this.eventBuffer = [];
 
             try {
-                // 批量發送事件
-                for (const event of eventsToProcess) {
-                    await this._sendEventToBackend(event);
+                // 批量發送事件（每個請求最多 MAX_EVENTS_PER_BATCH 個）
+                for (let i = 0; i < eventsToProcess.length; i += MAX_EVENTS_PER_BATCH) {
+                    await this._sendEventsToBackend(eventsToProcess.slice(i, i + MAX_EVENTS_PER_BATCH));
                 }
             } catch (error) {
                 console.error('批量處理事件失敗:', error);
@@ -178,18 +211,18 @@ class GameValidationService {
     }
 
     /**
-     * 發送事件到後端
+     * 批次發送事件到後端
      */
-    async _sendEventToBackend(event) {
+    async _sendEventsToBackend(events) {
         try {
-            const response = await authenticatedFetch(`${API_BASE_URL}/game/event/validate`, {
+            const response = await authenticatedFetch(`${API_BASE_URL}/game/events/validate-batch`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
                 body: JSON.stringify({
                     session_id: this.currentSessionId,
-                    event: event
+                    events: events
                 })
             });
 
@@ -198,14 +231,16 @@ class GameValidationService {
             }
 
             const result = await response.json();
-            
-            // 處理驗證結果
-            if (!result.is_valid) {
-                console.warn('⚠️ 遊戲事件驗證失敗:', result.errors);
-            }
-            
-            if (result.warnings && result.warnings.length > 0) {
-                console.warn('⚠️ 遊戲事件警告:', result.warnings);
+
+            // 處理每個事件的驗證結果
+            for (const eventResult of result.results) {
+                if (!eventResult.is_valid) {
+                    console.warn('⚠️ 遊戲事件驗證失敗:', eventResult.errors);
+                }
+
+                if (eventResult.warnings && eventResult.warnings.length > 0) {
+                    console.warn('⚠️ 遊戲事件警告:', eventResult.warnings);
+                }
             }
 
             return result;
@@ -215,10 +250,10 @@ class GameValidationService {
             // 如果是登入過期錯誤，不要阻止遊戲繼續
             if (error.message.includes('登入已過期')) {
                 console.warn('⚠️ 登入過期，但允許遊戲繼續進行');
-                return { is_valid: true, warnings: ['登入已過期，事件未驗證'] };
+                return { is_valid: true, results: [], warnings: ['登入已過期，事件未驗證'] };
             }
 
-            return { is_valid: false, errors: [error.message] };
+            return { is_valid: false, results: [], errors: [error.message] };
         }
     }
 